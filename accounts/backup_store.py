@@ -0,0 +1,267 @@
+"""
+Content-addressed, chunked backup store.
+
+Database dumps are split into content-defined chunks with a gear rolling hash,
+so an insert or update only changes the chunks around it. Every unique chunk is
+stored once (zlib-compressed, named by its SHA-256) and each backup is a small
+JSON manifest listing its chunks in order:
+
+    <root>/chunks/ab/abcdef....z
+    <root>/manifests/db_backup_20250101_020000.json
+
+Restoring streams the chunks back in manifest order and verifies every chunk
+checksum plus the checksum of the whole dump.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+
+MANIFEST_VERSION = 1
+
+# Chunk size bounds in bytes. The average is driven by the number of mask bits.
+MIN_CHUNK_SIZE = 256 * 1024
+AVG_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+READ_SIZE = 1024 * 1024
+
+_MASK64 = (1 << 64) - 1
+
+# Fixed gear table: one pseudo-random 64-bit value per byte value. Derived from
+# SHA-256 so chunk boundaries are identical across machines and Python versions.
+_GEAR = tuple(
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big')
+    for i in range(256)
+)
+
+
+class BackupStoreError(Exception):
+    """Raised when a manifest or chunk is missing or fails verification"""
+
+
+class ContentDefinedChunker:
+    """Split a byte stream into content-defined chunks using a gear hash"""
+
+    def __init__(self, min_size=MIN_CHUNK_SIZE, avg_size=AVG_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE):
+        if not (0 < min_size <= avg_size <= max_size):
+            raise ValueError('Chunk sizes must satisfy 0 < min_size <= avg_size <= max_size')
+        self.min_size = min_size
+        self.max_size = max_size
+        bits = max(1, (avg_size - min_size).bit_length() - 1)
+        # Use the high bits of the hash: they depend on the last ~64 bytes,
+        # the low bits only on the last few.
+        self.mask = ((1 << bits) - 1) << (64 - bits)
+
+    def _cut_point(self, data):
+        """Return the length of the next chunk at the start of data"""
+        size = len(data)
+        if size <= self.min_size:
+            return size
+        end = min(size, self.max_size)
+        mask = self.mask
+        gear = _GEAR
+        h = 0
+        for i in range(self.min_size, end):
+            h = ((h << 1) + gear[data[i]]) & _MASK64
+            if not h & mask:
+                return i + 1
+        return end
+
+    def chunks(self, stream):
+        """Yield chunks (bytes) read from a binary file-like object"""
+        buffer = bytearray()
+        eof = False
+        while True:
+            while not eof and len(buffer) < self.max_size:
+                block = stream.read(READ_SIZE)
+                if not block:
+                    eof = True
+                    break
+                buffer += block
+            if not buffer:
+                return
+            if eof and len(buffer) <= self.min_size:
+                yield bytes(buffer)
+                return
+            cut = self._cut_point(buffer)
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+
+
+class BackupStore:
+    """Deduplicated backup store rooted at a directory"""
+
+    def __init__(self, root, chunker=None, compress_level=6):
+        self.root = Path(root)
+        self.chunk_dir = self.root / 'chunks'
+        self.manifest_dir = self.root / 'manifests'
+        self.chunker = chunker or ContentDefinedChunker()
+        self.compress_level = compress_level
+
+    def _ensure_dirs(self):
+        self.chunk_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_dir.mkdir(parents=True, exist_ok=True)
+
+    def _chunk_path(self, digest):
+        return self.chunk_dir / digest[:2] / f'{digest}.z'
+
+    def _manifest_path(self, name):
+        if not name or '/' in name or '\\' in name or name.startswith('.'):
+            raise BackupStoreError(f'Invalid manifest name: {name}')
+        return self.manifest_dir / f'{name}.json'
+
+    @staticmethod
+    def _atomic_write(path, data, mode='wb'):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, mode) as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_chunk(self, data):
+        """Store a chunk if it is not present yet. Returns (digest, stored_bytes)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        if path.exists():
+            return digest, 0
+        compressed = zlib.compress(data, self.compress_level)
+        self._atomic_write(path, compressed)
+        return digest, len(compressed)
+
+    def get_chunk(self, digest, size=None):
+        """Read, decompress and verify a chunk"""
+        path = self._chunk_path(digest)
+        try:
+            compressed = path.read_bytes()
+        except FileNotFoundError:
+            raise BackupStoreError(f'Missing chunk {digest}')
+        try:
+            data = zlib.decompress(compressed)
+        except zlib.error as e:
+            raise BackupStoreError(f'Corrupt chunk {digest}: {e}')
+        if hashlib.sha256(data).hexdigest() != digest or (size is not None and len(data) != size):
+            raise BackupStoreError(f'Checksum mismatch for chunk {digest}')
+        return data
+
+    def backup_stream(self, stream, name, engine='', source_name=''):
+        """Chunk a dump stream into the store and write its manifest"""
+        self._ensure_dirs()
+        total = hashlib.sha256()
+        chunks = []
+        size = 0
+        new_chunks = 0
+        stored_bytes = 0
+
+        for data in self.chunker.chunks(stream):
+            total.update(data)
+            size += len(data)
+            digest, written = self.put_chunk(data)
+            if written:
+                new_chunks += 1
+                stored_bytes += written
+            chunks.append([digest, len(data)])
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'name': name,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'engine': engine,
+            'source_name': source_name,
+            'size': size,
+            'sha256': total.hexdigest(),
+            'chunks': chunks,
+            'new_chunks': new_chunks,
+            'stored_bytes': stored_bytes,
+        }
+        self._atomic_write(self._manifest_path(name), json.dumps(manifest, indent=1), mode='w')
+        return manifest
+
+    def manifest_names(self):
+        """Manifest names, oldest first (names embed a sortable timestamp)"""
+        if not self.manifest_dir.exists():
+            return []
+        return sorted(p.stem for p in self.manifest_dir.glob('*.json'))
+
+    def load_manifest(self, name=None):
+        """Load a manifest by name, or the latest one when name is None/'latest'"""
+        if name in (None, '', 'latest'):
+            names = self.manifest_names()
+            if not names:
+                raise BackupStoreError(f'No backups found in {self.root}')
+            name = names[-1]
+        path = self._manifest_path(name)
+        if not path.exists():
+            raise BackupStoreError(f'Backup manifest not found: {name}')
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise BackupStoreError(f'Unsupported manifest version in {name}')
+        return manifest
+
+    def delete_manifest(self, name):
+        """Remove a manifest; its chunks are reclaimed by the next prune()"""
+        self._manifest_path(name).unlink(missing_ok=True)
+
+    def iter_restore(self, manifest):
+        """Yield the verified bytes of a backup, chunk by chunk"""
+        total = hashlib.sha256()
+        size = 0
+        for digest, chunk_size in manifest['chunks']:
+            data = self.get_chunk(digest, chunk_size)
+            total.update(data)
+            size += len(data)
+            yield data
+        if size != manifest['size'] or total.hexdigest() != manifest['sha256']:
+            raise BackupStoreError(f"Checksum mismatch for backup {manifest['name']}")
+
+    def restore_to(self, manifest, output):
+        """Stream a backup into a binary file-like object. Returns bytes written"""
+        written = 0
+        for data in self.iter_restore(manifest):
+            output.write(data)
+            written += len(data)
+        return written
+
+    def restore_to_path(self, manifest, path):
+        """Restore into a file; the target is only replaced once fully verified"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.restore-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                written = self.restore_to(manifest, tmp)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written
+
+    def prune(self, keep_count):
+        """Keep the newest manifests and delete chunks no longer referenced"""
+        names = self.manifest_names()
+        removed = names[:-keep_count] if keep_count > 0 else names
+        for name in removed:
+            self.delete_manifest(name)
+
+        referenced = set()
+        for name in self.manifest_names():
+            referenced.update(digest for digest, _ in self.load_manifest(name)['chunks'])
+
+        freed_chunks = 0
+        if self.chunk_dir.exists():
+            for path in self.chunk_dir.glob('*/*.z'):
+                if path.stem not in referenced:
+                    path.unlink()
+                    freed_chunks += 1
+        return removed, freed_chunks
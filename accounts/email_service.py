@@ -1,21 +1,35 @@
-import mailtrap as mt
+"""
+Outgoing email: the Mailtrap API client and asend_mail for async views.
+
+The mailtrap SDK (and pydantic underneath it) costs more import time than the
+rest of the project, so it is imported on first use rather than at startup.
+"""
+from email.utils import parseaddr
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.urls import reverse
 
+from beauty_clinic_django.async_http import async_client
+
 
 class MailtrapEmailService:
     """Email service using Mailtrap API for sending emails"""
     
     def __init__(self):
+        import mailtrap as mt
+
         self.api_token = settings.MAILTRAP_API_TOKEN
         self.client = mt.MailtrapClient(token=self.api_token)
     
     def send_password_reset_email(self, user, reset_url):
         """Send password reset email using Mailtrap API"""
+        import mailtrap as mt
         
         # Render the email template
         html_content = render_to_string('accounts/password_reset_email.html', {
@@ -61,6 +75,7 @@ class MailtrapEmailService:
     
     def send_test_email(self, to_email, to_name="Test User"):
         """Send a test email to verify Mailtrap setup"""
+        import mailtrap as mt
         
         mail = mt.Mail(
             sender=mt.Address(
@@ -87,3 +102,50 @@ class MailtrapEmailService:
                 'error': str(e),
                 'message': 'Failed to send test email'
             }
+
+
+class EmailSendError(Exception):
+    """The email API rejected a message"""
+
+
+def _address(value):
+    import mailtrap as mt
+
+    name, email = parseaddr(value)
+    return mt.Address(email=email, name=name or None)
+
+
+async def asend_mail(subject, message, from_email, recipient_list, html_message=None, category=None):
+    """
+    Async send_mail for async views.
+
+    With MAILTRAP_API_URL set, the message is posted to the Mailtrap HTTP API
+    (sending or sandbox inbox URL) with the shared httpx client; otherwise it
+    goes through EMAIL_BACKEND in a worker thread, so the event loop is never
+    blocked. Raises on failure, like send_mail(fail_silently=False).
+    """
+    api_url = getattr(settings, 'MAILTRAP_API_URL', '')
+    if not api_url:
+        return await sync_to_async(send_mail, thread_sensitive=False)(
+            subject, message, from_email, recipient_list,
+            fail_silently=False, html_message=html_message,
+        )
+
+    import mailtrap as mt
+
+    mail = mt.Mail(
+        sender=_address(from_email or settings.DEFAULT_FROM_EMAIL),
+        to=[_address(recipient) for recipient in recipient_list],
+        subject=subject,
+        text=message,
+        html=html_message,
+        category=category,
+    )
+    response = await async_client().post(
+        api_url,
+        headers={'Authorization': f'Bearer {settings.MAILTRAP_API_TOKEN}'},
+        json=mail.api_data,
+    )
+    if response.status_code != 200:
+        raise EmailSendError(f'Mailtrap API error {response.status_code}: {response.text}')
+    return len(recipient_list)
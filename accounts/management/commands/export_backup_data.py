@@ -0,0 +1,71 @@
+import os
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from beauty_clinic_django.db_routers import read_replica_alias
+from accounts.portable_backup import DEFAULT_CHUNK_SIZE, export_ndjson, open_backup
+
+
+class Command(BaseCommand):
+    help = 'Export all data as a portable NDJSON backup (loadable into SQLite or PostgreSQL with load_backup_data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Output file; a .gz suffix enables gzip (default: backups/db_backup_<timestamp>.ndjson.gz)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Rows per NDJSON line / cursor fetch (default: {DEFAULT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--database',
+            default=None,
+            help='Database alias to export from (default: the read replica when configured and reachable, else default)',
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if not output:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            output = os.path.join('backups', f'db_backup_{timestamp}.ndjson.gz')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        database = options['database'] or read_replica_alias()
+
+        output_dir = os.path.dirname(output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        def progress(label, count):
+            self.stdout.write(f'  {label}: {count} rows')
+
+        # Write to a temp name so an interrupted export never looks complete
+        tmp_output = f'{output}.partial'
+        if output.endswith('.gz'):
+            tmp_output = f'{output[:-3]}.partial.gz'
+        try:
+            with open_backup(tmp_output, 'w') as out:
+                counts = export_ndjson(
+                    out,
+                    using=database,
+                    chunk_size=options['chunk_size'],
+                    progress=progress,
+                )
+            os.replace(tmp_output, output)
+        except BaseException:
+            if os.path.exists(tmp_output):
+                os.remove(tmp_output)
+            raise
+
+        size_mb = os.path.getsize(output) / (1024 * 1024)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ Exported {sum(counts.values())} rows from {len(counts)} tables\n'
+                f'  Backup file: {output}\n'
+                f'  File size: {size_mb:.2f} MB'
+            )
+        )
@@ -0,0 +1,70 @@
+import os
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.synthetic_data import SYNTHETIC_PASSWORD, generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Bulk-insert a large synthetic dataset (patients, appointments, packages, feedback) for load tests and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=10000, help='Number of patients (default: 10000)')
+        parser.add_argument('--appointments', type=int, default=100000, help='Number of appointments (default: 100000)')
+        parser.add_argument('--years', type=float, default=2, help='Years of history to spread bookings over (default: 2)')
+        parser.add_argument('--attendants', type=int, default=10, help='Number of synthetic attendants (default: 10)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; same seed and end date give the same data')
+        parser.add_argument(
+            '--end-date',
+            type=date.fromisoformat,
+            default=None,
+            help='Last day of history, YYYY-MM-DD (default: today)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help=f'Worker processes for inserting blocks in parallel, PostgreSQL only (CPU count here: {os.cpu_count()})',
+        )
+
+    def handle(self, *args, **options):
+        if options['patients'] < 0 or options['appointments'] < 0:
+            raise CommandError('--patients and --appointments must not be negative')
+        if options['attendants'] < 1:
+            raise CommandError('--attendants must be at least 1')
+        if options['years'] <= 0:
+            raise CommandError('--years must be positive')
+
+        self.stdout.write(
+            f"Generating {options['patients']} patients and {options['appointments']} appointments "
+            f"over {options['years']} year(s) (seed {options['seed']})..."
+        )
+        started = time.monotonic()
+        totals = {}
+
+        def progress(kind, result):
+            count = result[0] if isinstance(result, tuple) else result
+            totals[kind] = totals.get(kind, 0) + count
+            self.stdout.write(f'  {kind}: {totals[kind]}')
+
+        counts = generate_dataset(
+            patients=options['patients'],
+            appointments=options['appointments'],
+            years=options['years'],
+            attendants=options['attendants'],
+            seed=options['seed'],
+            workers=max(1, options['workers']),
+            end_date=options['end_date'],
+            progress=progress,
+        )
+
+        elapsed = time.monotonic() - started
+        summary = '\n'.join(f'  {name.replace("_", " ").title()}: {count}' for name, count in counts.items())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ Synthetic dataset ready in {elapsed:.1f}s\n{summary}\n'
+                f'  Synthetic users log in with password "{SYNTHETIC_PASSWORD}"'
+            )
+        )
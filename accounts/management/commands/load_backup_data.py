@@ -0,0 +1,80 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError
+from accounts.portable_backup import (
+    DEFAULT_BATCH_SIZE, PortableBackupError, flush_tables, import_ndjson, is_portable_backup, open_backup,
+)
+
+
+class Command(BaseCommand):
+    help = 'Load a backup created by export_backup_data (NDJSON) or a legacy dumpdata JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backup-file',
+            type=str,
+            required=True,
+            help='Backup file (.ndjson, .ndjson.gz, or legacy dumpdata .json)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per bulk INSERT (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='Empty all backed-up tables before loading',
+        )
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help='Skip rows whose primary/unique keys already exist instead of failing',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database alias to load into (default: default)',
+        )
+
+    def handle(self, *args, **options):
+        backup_file = options['backup_file']
+        using = options['database']
+
+        if not is_portable_backup(backup_file):
+            # Monolithic dumpdata JSON: hand it to loaddata as before
+            self.stdout.write('Legacy JSON backup detected, loading with loaddata...')
+            if options['flush']:
+                flush_tables(using=using)
+            call_command('loaddata', backup_file, database=using, verbosity=options['verbosity'])
+            return
+
+        if options['flush']:
+            self.stdout.write('Flushing existing data...')
+            flush_tables(using=using)
+
+        def progress(label, count):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {label}: {count} rows')
+
+        try:
+            with open_backup(backup_file, 'r') as stream:
+                counts = import_ndjson(
+                    stream,
+                    using=using,
+                    batch_size=options['batch_size'],
+                    ignore_conflicts=options['ignore_conflicts'],
+                    progress=progress,
+                )
+        except PortableBackupError as e:
+            raise CommandError(str(e))
+        except IntegrityError as e:
+            raise CommandError(f'{e}. The target already has this data; use --flush or --ignore-conflicts.')
+
+        for label, count in counts.items():
+            if count:
+                self.stdout.write(f'  {label}: {count} rows')
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Loaded {sum(counts.values())} rows into {len(counts)} tables')
+        )
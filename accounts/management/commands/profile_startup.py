@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from beauty_clinic_django.startup import (
+    DEFAULT_FIRST_REQUEST_PATH, aggregate_by_package, import_profile, measure_cold_start, project_packages,
+)
+
+
+class Command(BaseCommand):
+    help = 'Report import time per package for a fresh start (python -X importtime) and the cold-start wall time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Packages to list (default: 25)')
+        parser.add_argument('--project', action='store_true', help='Only list this project\'s apps')
+        parser.add_argument('--cold-start', action='store_true',
+                            help='Also time `manage.py check` and the first request of a fresh process')
+        parser.add_argument('--path', default=DEFAULT_FIRST_REQUEST_PATH,
+                            help=f'URL of the first request (default: {DEFAULT_FIRST_REQUEST_PATH})')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            rows = import_profile()
+            cold_start = measure_cold_start(options['path']) if options['cold_start'] else None
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        packages = aggregate_by_package(rows)
+        if options['project']:
+            first_party = project_packages()
+            packages = [p for p in packages if p['package'] in first_party]
+        total_ms = sum(self_us for self_us, *_ in rows) / 1000
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'import_ms': round(total_ms, 1),
+                'modules': len(rows),
+                'packages': packages[:options['top']],
+                'cold_start': cold_start,
+            }, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Imports for django.setup() + URLconf: {total_ms:.1f} ms in {len(rows)} modules'
+        ))
+        self.stdout.write(f"  {'package':<32} {'cumulative ms':>13} {'own ms':>9} {'modules':>8}")
+        for package in packages[:options['top']]:
+            self.stdout.write(
+                f"  {package['package']:<32} {package['cumulative_ms']:>13.1f} "
+                f"{package['self_ms']:>9.1f} {package['modules']:>8}"
+            )
+        self.stdout.write('  cumulative: the package\'s imports including dependencies they loaded first')
+
+        if cold_start:
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING('Cold start'))
+            self.stdout.write(f"  manage.py check         {cold_start['check_ms']:>9.1f} ms")
+            self.stdout.write(
+                f"  first request {options['path']:<9} {cold_start['first_request_ms']:>9.1f} ms "
+                f"(setup {cold_start['setup_ms']:.1f} ms, request {cold_start['request_ms']:.1f} ms, "
+                f"status {cold_start['first_request_status']})"
+            )
+            self.stdout.write(self.style.SUCCESS(f"✓ Total {cold_start['total_ms']:.1f} ms"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from beauty_clinic_django.profiling import MODES, make_profile_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed X-Profile-Token header value for profiling a request (REQUEST_PROFILING must be on)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=MODES, default='sample',
+                            help='sample: collapsed stacks for flamegraphs (default); cprofile: pstats dump')
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        token = make_profile_token(options['mode'])
+        self.stdout.write(token)
+        self.stderr.write(
+            f"Valid for {settings.REQUEST_PROFILING_TOKEN_MAX_AGE}s, e.g.\n"
+            f"  curl -H 'X-Profile-Token: {token}' https://<host>/owner/ -o /dev/null -D - | grep X-Profile-Id"
+        )
@@ -0,0 +1,16 @@
+# Generated manually: index for leave-request queues (only the index operation)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_remove_attendant_archived_user_address_user_birthday_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendantleaverequest',
+            index=models.Index(fields=['leave_date', 'status'], name='leave_date_status_idx'),
+        ),
+    ]
@@ -178,6 +178,10 @@ class AttendantLeaveRequest(models.Model):
         db_table = 'attendant_leave_requests'
         unique_together = ['attendant_profile', 'leave_date']  # One request per day per attendant
         ordering = ['-leave_date']
+        indexes = [
+            # Leave-request queues filtered by status, and affected-day lookups
+            models.Index(fields=['leave_date', 'status'], name='leave_date_status_idx'),
+        ]
     
     def __str__(self):
         return f"Leave Request - {self.attendant_profile.user.get_full_name()} - {self.leave_date} ({self.get_status_display()})"
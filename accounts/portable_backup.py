@@ -0,0 +1,264 @@
+"""
+Backend-neutral NDJSON backup format.
+
+Rows are streamed per model, in foreign-key dependency order, as newline
+delimited JSON so SQLite and PostgreSQL databases can be moved in either
+direction without holding the dump in memory:
+
+    {"format": "skinovation-ndjson", "version": 1, ...}      header
+    {"model": "accounts.user", "fields": ["id", ...]}         model start
+    {"model": "accounts.user", "rows": [[1, ...], ...]}       row chunk
+    ...
+    {"end": true, "counts": {"accounts.user": 512, ...}}      trailer
+
+Loading reads one chunk line at a time and inserts it with bulk_create inside
+its own transaction, then resets the primary key sequences.
+"""
+import gzip
+import json
+from contextlib import contextmanager
+from datetime import datetime, time
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+FORMAT_NAME = 'skinovation-ndjson'
+FORMAT_VERSION = 1
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_BATCH_SIZE = 1000
+
+# Rows that are recreated by migrate (or are per-install state) and whose
+# primary keys differ between databases.
+EXCLUDED_MODELS = {
+    'contenttypes.contenttype',
+    'auth.permission',
+    'admin.logentry',
+    'sessions.session',
+}
+
+
+class PortableBackupError(Exception):
+    """Raised for malformed or incompatible NDJSON backups"""
+
+
+class _BackupEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without the millisecond truncation of times"""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def open_backup(path, mode):
+    """Open a backup file, transparently handling .gz"""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def is_portable_backup(path):
+    """True if the file starts with an NDJSON backup header"""
+    try:
+        with open_backup(path, 'r') as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError, UnicodeDecodeError):
+        return False
+    return isinstance(header, dict) and header.get('format') == FORMAT_NAME
+
+
+def _excluded(model):
+    label = model._meta.label_lower
+    if label in EXCLUDED_MODELS:
+        return True
+    # Auto-created M2M tables pointing at excluded models (e.g. user_permissions)
+    if model._meta.auto_created:
+        return any(
+            f.related_model is not None and f.related_model._meta.label_lower in EXCLUDED_MODELS
+            for f in model._meta.local_concrete_fields
+        )
+    return False
+
+
+def backup_models():
+    """Concrete, managed models sorted so every FK target precedes its referrers"""
+    models = [
+        m for m in apps.get_models(include_auto_created=True)
+        if m._meta.managed and not m._meta.proxy and not _excluded(m)
+    ]
+    included = set(models)
+    deps = {
+        m: {
+            f.related_model._meta.concrete_model
+            for f in m._meta.local_concrete_fields
+            if f.is_relation and f.related_model is not None
+            and f.related_model._meta.concrete_model is not m
+            and f.related_model._meta.concrete_model in included
+        }
+        for m in models
+    }
+
+    ordered = []
+    done = set()
+    pending = sorted(models, key=lambda m: m._meta.label_lower)
+    while pending:
+        ready = [m for m in pending if deps[m] <= done]
+        if not ready:
+            # Dependency cycle: emit the rest as-is; constraint checks are
+            # disabled/deferred while loading.
+            ready = pending
+        for m in ready:
+            ordered.append(m)
+            done.add(m)
+        pending = [m for m in pending if m not in done]
+    return ordered
+
+
+def _field_names(model):
+    return [f.attname for f in model._meta.local_concrete_fields]
+
+
+def export_ndjson(out, using=DEFAULT_DB_ALIAS, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Stream every backed-up table into a text file object. Returns row counts"""
+    encoder = _BackupEncoder(separators=(',', ':'))
+
+    def write(obj):
+        out.write(encoder.encode(obj))
+        out.write('\n')
+
+    write({
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'source_engine': connections[using].vendor,
+    })
+
+    counts = {}
+    for model in backup_models():
+        label = model._meta.label_lower
+        fields = _field_names(model)
+        write({'model': label, 'fields': fields})
+
+        count = 0
+        rows = []
+        queryset = model._base_manager.using(using).order_by('pk').values_list(*fields)
+        for row in queryset.iterator(chunk_size=chunk_size):
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                write({'model': label, 'rows': rows})
+                count += len(rows)
+                rows = []
+        if rows:
+            write({'model': label, 'rows': rows})
+            count += len(rows)
+
+        counts[label] = count
+        if progress:
+            progress(label, count)
+
+    write({'end': True, 'counts': counts})
+    return counts
+
+
+@contextmanager
+def raw_timestamps(model):
+    """Keep auto_now/auto_now_add values from the backup instead of now()"""
+    toggled = []
+    for field in model._meta.local_concrete_fields:
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            toggled.append((field, field.auto_now, field.auto_now_add))
+            field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in toggled:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def flush_tables(using=DEFAULT_DB_ALIAS):
+    """Empty every table covered by the backup format"""
+    connection = connections[using]
+    tables = [m._meta.db_table for m in backup_models()]
+    statements = connection.ops.sql_flush(no_style(), tables, allow_cascade=True)
+    connection.ops.execute_sql_flush(statements)
+
+
+def reset_sequences(models, using=DEFAULT_DB_ALIAS):
+    """Move PK sequences past the imported ids (no-op on SQLite)"""
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def import_ndjson(stream, using=DEFAULT_DB_ALIAS, batch_size=DEFAULT_BATCH_SIZE,
+                  ignore_conflicts=False, progress=None):
+    """Load an NDJSON backup from a text file object. Returns row counts"""
+    header = json.loads(stream.readline() or 'null')
+    if not isinstance(header, dict) or header.get('format') != FORMAT_NAME:
+        raise PortableBackupError('Not an NDJSON backup file')
+    if header.get('version') != FORMAT_VERSION:
+        raise PortableBackupError(f"Unsupported backup version {header.get('version')}")
+
+    connection = connections[using]
+    counts = {}
+    loaded_models = []
+    model = fields = converters = None
+    trailer = None
+
+    with connection.constraint_checks_disabled():
+        for line_no, line in enumerate(stream, start=2):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+
+            if record.get('end'):
+                trailer = record
+                break
+
+            if 'fields' in record:
+                try:
+                    model = apps.get_model(record['model'])
+                except LookupError:
+                    raise PortableBackupError(f"Unknown model {record['model']} (line {line_no})")
+                fields = record['fields']
+                by_attname = {f.attname: f for f in model._meta.local_concrete_fields}
+                missing = [name for name in fields if name not in by_attname]
+                if missing:
+                    raise PortableBackupError(f"{record['model']} has no fields {missing}; migrate first")
+                converters = [by_attname[name].to_python for name in fields]
+                counts[model._meta.label_lower] = 0
+                loaded_models.append(model)
+                continue
+
+            if model is None or record.get('model') != model._meta.label_lower:
+                raise PortableBackupError(f'Row chunk without a model header (line {line_no})')
+
+            objs = [
+                model(**{name: convert(value) for name, convert, value in zip(fields, converters, row)})
+                for row in record['rows']
+            ]
+            with transaction.atomic(using=using), raw_timestamps(model):
+                model._base_manager.using(using).bulk_create(
+                    objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+                )
+            counts[model._meta.label_lower] += len(objs)
+            if progress:
+                progress(model._meta.label_lower, counts[model._meta.label_lower])
+
+    if trailer is None:
+        raise PortableBackupError('Backup is truncated (no end record)')
+    expected = trailer.get('counts', {})
+    short = {label: (counts.get(label, 0), n) for label, n in expected.items() if counts.get(label, 0) != n}
+    if short and not ignore_conflicts:
+        raise PortableBackupError(f'Row counts do not match the backup: {short}')
+
+    reset_sequences(loaded_models, using=using)
+    return counts
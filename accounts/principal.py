@@ -0,0 +1,154 @@
+"""
+Per-request principal: the logged-in user's role and staff records.
+
+PrincipalMiddleware (after AuthenticationMiddleware) sets request.principal, a
+lazily loaded Principal carrying the user's user_type, their Attendant record
+(matched by name, the way staff create attendants) and their
+AttendantProfile. Principals are kept in the shared cache per user, so the
+attendant pages stop looking the Attendant up by name on every request:
+
+    attendant = request.principal.attendant        # None if not found
+    profile = request.principal.attendant_profile  # None if not set up
+
+Saving or deleting a User or AttendantProfile drops that user's principal;
+saving or deleting an Attendant drops all of them, because the name match may
+now resolve differently.
+"""
+import functools
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import SimpleLazyObject
+
+VERSION_KEY = 'principal:version'
+DEFAULT_TIMEOUT = 60 * 60
+
+
+class Principal:
+    """Role and staff records of one user; picklable so it can be cached"""
+
+    def __init__(self, user_id=None, user_type=None, is_superuser=False, attendant=None, attendant_profile=None):
+        self.user_id = user_id
+        self.user_type = user_type
+        self.is_superuser = is_superuser
+        self.attendant = attendant
+        self.attendant_profile = attendant_profile
+
+    @property
+    def is_authenticated(self):
+        return self.user_id is not None
+
+    @property
+    def attendant_id(self):
+        return self.attendant.id if self.attendant else None
+
+    def __repr__(self):
+        return f'<Principal user={self.user_id} type={self.user_type} attendant={self.attendant_id}>'
+
+
+ANONYMOUS = Principal()
+
+
+def resolve_attendant(user):
+    """Attendant record of an attendant user: exact name match, then case-insensitive"""
+    from .models import Attendant
+
+    attendant = Attendant.objects.filter(
+        first_name=user.first_name, last_name=user.last_name,
+    ).order_by('id').first()
+    if attendant is None:
+        attendant = Attendant.objects.filter(
+            first_name__iexact=user.first_name, last_name__iexact=user.last_name,
+        ).order_by('id').first()
+    return attendant
+
+
+def build_principal(user):
+    from .models import AttendantProfile
+
+    principal = Principal(user.pk, user.user_type, user.is_superuser)
+    if user.user_type == 'attendant':
+        principal.attendant = resolve_attendant(user)
+        principal.attendant_profile = AttendantProfile.objects.filter(user_id=user.pk).first()
+    return principal
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def principal_cache_key(user_id):
+    return f'principal:{_version()}:{user_id}'
+
+
+def get_principal(user):
+    """Cached Principal for a user (ANONYMOUS for anonymous users)"""
+    if not user.is_authenticated:
+        return ANONYMOUS
+    key = principal_cache_key(user.pk)
+    principal = cache.get(key)
+    # A role changed with queryset.update() bypasses the signals below
+    if principal is None or principal.user_type != user.user_type:
+        principal = build_principal(user)
+        cache.set(key, principal, getattr(settings, 'PRINCIPAL_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return principal
+
+
+def invalidate_principal(user_id):
+    cache.delete(principal_cache_key(user_id))
+
+
+def invalidate_all_principals():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+
+
+# Invalidate after commit, so a concurrent request cannot re-cache the old rows
+def _user_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(functools.partial(invalidate_principal, instance.pk))
+
+
+def _profile_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(functools.partial(invalidate_principal, instance.user_id))
+
+
+def _attendant_changed(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(invalidate_all_principals)
+
+
+def connect_principal_signals():
+    from .models import Attendant, AttendantProfile, User
+
+    for model, receiver in ((User, _user_changed), (AttendantProfile, _profile_changed), (Attendant, _attendant_changed)):
+        uid = f'principal-{model._meta.label_lower}'
+        post_save.connect(receiver, sender=model, dispatch_uid=uid)
+        post_delete.connect(receiver, sender=model, dispatch_uid=uid)
+
+
+class PrincipalMiddleware:
+    """Set request.principal; the cache is only read when a view uses it"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: get_principal(request.user))
+        # Under ASGI this returns the coroutine of the async handler below
+        return self.get_response(request)
@@ -0,0 +1,211 @@
+"""
+Serving of access-controlled files (medical documents, database backups).
+
+Views do the authorization and then call serve_file(), which handles:
+
+- ETag / Last-Modified conditional requests (304 / 412)
+- single Range requests with If-Range (206 / 416), so interrupted downloads resume
+- chunked streaming instead of loading the file in memory
+- optional offload to the front server for local files:
+    PROTECTED_FILES_OFFLOAD = 'x-accel'    nginx X-Accel-Redirect
+    PROTECTED_FILES_OFFLOAD = 'x-sendfile' Apache/lighttpd X-Sendfile
+  X-Accel-Redirect needs PROTECTED_FILES_ACCEL_LOCATIONS, a mapping of local
+  directories to nginx `internal` locations.
+"""
+import mimetypes
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _FileInfo:
+    """Size, mtime and an opener for a local path or a storage file"""
+
+    def __init__(self, size, modified, open_file, local_path=None):
+        self.size = size
+        self.modified = modified
+        self.open = open_file
+        self.local_path = local_path
+
+    @property
+    def etag(self):
+        stamp = int(self.modified.timestamp() * 1_000_000) if self.modified else 0
+        return f'"{self.size:x}-{stamp:x}"'
+
+    @property
+    def last_modified(self):
+        return int(self.modified.timestamp()) if self.modified else None
+
+    @classmethod
+    def for_path(cls, path):
+        stat = os.stat(path)
+        modified = datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc)
+        return cls(stat.st_size, modified, lambda: open(path, 'rb'), local_path=os.path.abspath(path))
+
+    @classmethod
+    def for_field_file(cls, field_file):
+        storage, name = field_file.storage, field_file.name
+        try:
+            local_path = storage.path(name)
+        except NotImplementedError:
+            local_path = None
+        if local_path:
+            return cls.for_path(local_path)
+        try:
+            modified = storage.get_modified_time(name)
+        except (NotImplementedError, OSError):
+            modified = None
+        return cls(storage.size(name), modified, lambda: storage.open(name, 'rb'))
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header into (start, end) inclusive.
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range, which we answer with the full body) and 'unsatisfiable'
+    when no requested byte exists.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+    start = int(first)
+    if start >= size:
+        return 'unsatisfiable'
+    end = int(last) if last else size - 1
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, info):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Strong comparison only
+        return if_range == info.etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and info.last_modified is not None and since == info.last_modified
+
+
+def _stream(open_file, start, length):
+    f = open_file()
+    try:
+        if start:
+            try:
+                f.seek(start)
+            except (AttributeError, OSError, ValueError):
+                # Non-seekable storage stream: skip ahead by reading
+                remaining = start
+                while remaining:
+                    skipped = f.read(min(STREAM_CHUNK_SIZE, remaining))
+                    if not skipped:
+                        return
+                    remaining -= len(skipped)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def _offload_header(local_path):
+    mode = getattr(settings, 'PROTECTED_FILES_OFFLOAD', '')
+    if not mode or not local_path:
+        return None
+    if mode == 'x-sendfile':
+        return 'X-Sendfile', local_path
+    if mode == 'x-accel':
+        for root, location in getattr(settings, 'PROTECTED_FILES_ACCEL_LOCATIONS', {}).items():
+            root = os.path.abspath(root)
+            if os.path.commonpath([root, local_path]) == root:
+                relative = os.path.relpath(local_path, root).replace(os.sep, '/')
+                return 'X-Accel-Redirect', location.rstrip('/') + '/' + quote(relative)
+    return None
+
+
+def serve_file(request, source, filename=None, as_attachment=True, content_type=None):
+    """
+    Stream a file to an already-authorized request.
+
+    source is a local path or a FieldFile. filename is the download name
+    (defaults to the file's base name).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        info = _FileInfo.for_path(source)
+        name = os.fspath(source)
+    else:
+        info = _FileInfo.for_field_file(source)
+        name = source.name
+    filename = filename or os.path.basename(name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=info.etag, last_modified=info.last_modified)
+    if response is not None:
+        response['ETag'] = info.etag
+        return response
+
+    headers = {
+        'ETag': info.etag,
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': content_disposition_header(as_attachment, filename),
+        # Private documents must not end up in shared caches
+        'Cache-Control': 'private, no-cache',
+    }
+    if info.last_modified is not None:
+        headers['Last-Modified'] = http_date(info.last_modified)
+
+    offload = _offload_header(info.local_path)
+    if offload:
+        # The front server handles Range and streams the bytes itself
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response[offload[0]] = offload[1]
+        return response
+
+    byte_range = parse_range(request.headers.get('Range'), info.size) if _if_range_matches(request, info) else None
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416, headers=headers)
+        response['Content-Range'] = f'bytes */{info.size}'
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+    else:
+        start, end = 0, info.size - 1
+        status = 200
+    length = end - start + 1
+    headers['Content-Length'] = str(length)
+
+    if request.method == 'HEAD':
+        return HttpResponse(status=status, content_type=content_type, headers=headers)
+    return StreamingHttpResponse(
+        _stream(info.open, start, length), status=status, content_type=content_type, headers=headers
+    )
@@ -0,0 +1,406 @@
+"""
+Synthetic, production-sized data for load tests and benchmarks.
+
+generate_dataset() inserts patients, attendants with schedules, appointments,
+package bookings with their sessions, feedback and notifications using batched
+bulk_create. Work is split into fixed-size blocks, each with its own random
+generator seeded from (seed, block), so the output only depends on the seed and
+end date - not on the number of worker processes. Patient primary keys are
+assigned up front so appointment blocks can reference them without a lookup.
+
+Synthetic users are recognisable by the 'synthetic_' username prefix and share
+one password (SYNTHETIC_PASSWORD), hashed once.
+"""
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .portable_backup import raw_timestamps, reset_sequences
+
+SYNTHETIC_PREFIX = 'synthetic_'
+SYNTHETIC_PASSWORD = 'synthetic123'
+
+PATIENT_BLOCK = 5000
+APPOINTMENT_BLOCK = 20000
+BATCH_SIZE = 2000
+
+FIRST_NAMES = [
+    'Maria', 'Angel', 'Princess', 'Kimberly', 'Jasmine', 'Nicole', 'Camille', 'Andrea', 'Patricia',
+    'Kristine', 'Joy', 'Mae', 'Grace', 'Bea', 'Carla', 'Diane', 'Ella', 'Faith', 'Hannah', 'Ivy',
+    'Juan', 'Jose', 'Mark', 'John', 'Paolo', 'Miguel', 'Carlo', 'Rafael', 'Nathan', 'Gabriel',
+]
+LAST_NAMES = [
+    'Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Tomas',
+    'Andrada', 'Castillo', 'Flores', 'Villanueva', 'Ramos', 'Castro', 'Rivera', 'Aquino',
+    'Navarro', 'Salazar', 'Mercado', 'Dela Cruz', 'Del Rosario', 'Gonzales', 'Lopez', 'Perez',
+]
+CITIES = ['Quezon City', 'Manila', 'Makati', 'Pasig', 'Taguig', 'Caloocan', 'Marikina', 'Antipolo']
+OCCUPATIONS = ['Student', 'Teacher', 'Nurse', 'Engineer', 'Call Center Agent', 'Entrepreneur', 'Accountant', None]
+COMMENTS = [
+    'Very satisfied with the treatment!', 'Friendly staff and clean clinic.', 'Will come back again.',
+    'Results were visible after one session.', 'A bit of a wait but worth it.', 'Not what I expected.',
+    None, None,
+]
+
+WORK_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+SLOTS = [time(hour, 0) for hour in range(10, 18)]
+# Busier towards the weekend (Mon..Sun); Sunday is closed
+WEEKDAY_WEIGHTS = [0.12, 0.12, 0.14, 0.15, 0.19, 0.28, 0.0]
+RATING_WEIGHTS = [0.03, 0.05, 0.12, 0.35, 0.45]
+
+# Share of bookings by item type and outcome
+SERVICE_SHARE, PRODUCT_SHARE = 0.8, 0.1
+PAST_STATUS = [('completed', 0.78), ('cancelled', 0.14), ('confirmed', 0.05), ('pending', 0.03)]
+FUTURE_STATUS = [('confirmed', 0.55), ('pending', 0.40), ('cancelled', 0.05)]
+FEEDBACK_RATE = 0.4
+PACKAGE_PATIENT_RATE = 0.08
+
+
+def _rng(seed, kind, block):
+    return random.Random(f'{seed}:{kind}:{block}')
+
+
+def _aware(day, at=time(9, 0)):
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def ensure_catalog():
+    """Use the existing catalog; create a small one if the database is empty"""
+    from packages.models import Package
+    from products.models import Product
+    from services.models import Service, ServiceCategory
+
+    if not Service.objects.exists():
+        category, _ = ServiceCategory.objects.get_or_create(name='Facials')
+        Service.objects.bulk_create([
+            Service(service_name=f'Synthetic Facial {i}', price=Decimal(399 + i * 100), duration=60, category=category)
+            for i in range(1, 11)
+        ])
+    if not Product.objects.exists():
+        Product.objects.bulk_create([
+            Product(product_name=f'Synthetic Serum {i}', price=Decimal(299 + i * 50), stock=500)
+            for i in range(1, 6)
+        ])
+    if not Package.objects.exists():
+        Package.objects.bulk_create([
+            Package(package_name=f'Synthetic Package {i}', price=Decimal(2999 + i * 1000), sessions=3 + i * 2,
+                    duration_days=90 + i * 30, grace_period_days=30)
+            for i in range(1, 4)
+        ])
+    return {
+        'services': list(Service.objects.filter(archived=False).values_list('id', flat=True)),
+        'products': list(Product.objects.filter(archived=False).values_list('id', flat=True)),
+        'packages': list(Package.objects.filter(archived=False).values_list('id', 'sessions', 'duration_days', 'grace_period_days')),
+    }
+
+
+def _unique_name(rng, taken, attempts=20):
+    """A random (first, last) pair not in taken, numbered once the name pool runs dry"""
+    for _ in range(attempts):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        if (first, last) not in taken:
+            return first, last
+    # Only len(FIRST_NAMES) * len(LAST_NAMES) pairs exist
+    suffix = 2
+    while (first, f'{last} {suffix}') in taken:
+        suffix += 1
+    return first, f'{last} {suffix}'
+
+
+def create_attendants(count, seed, password):
+    """Attendant rows (referenced by appointments) plus attendant users with schedules"""
+    from .models import Attendant, AttendantProfile, User
+
+    rng = _rng(seed, 'attendants', 0)
+    existing = User.objects.filter(username__startswith=f'{SYNTHETIC_PREFIX}attendant').count()
+    # Booking views match Attendant rows to attendant users by name, so names must be unique
+    taken = set(User.objects.filter(user_type='attendant').values_list('first_name', 'last_name'))
+    attendants, users = [], []
+    for i in range(existing, count):
+        first, last = _unique_name(rng, taken)
+        taken.add((first, last))
+        attendants.append(Attendant(first_name=first, last_name=last, shift_date=date.today(), shift_time=time(10, 0)))
+        users.append(User(
+            username=f'{SYNTHETIC_PREFIX}attendant{i + 1}', email=f'attendant{i + 1}@synthetic.example',
+            first_name=first, last_name=last, user_type='attendant', password=password,
+        ))
+    Attendant.objects.bulk_create(attendants)
+    User.objects.bulk_create(users)
+    new_users = User.objects.filter(username__in=[u.username for u in users])
+    AttendantProfile.objects.bulk_create([
+        AttendantProfile(user=user, work_days=WORK_DAYS, start_time=time(10, 0), end_time=time(18, 0))
+        for user in new_users
+    ])
+
+    names = Q()
+    for first, last in User.objects.filter(username__startswith=f'{SYNTHETIC_PREFIX}attendant').values_list('first_name', 'last_name'):
+        names |= Q(first_name=first, last_name=last)
+    return list(Attendant.objects.filter(names).order_by('id').values_list('id', flat=True))
+
+
+def _patient_block(params, block):
+    from .models import User
+
+    rng = _rng(params['seed'], 'patients', block)
+    start = block * PATIENT_BLOCK
+    stop = min(start + PATIENT_BLOCK, params['patients'])
+    first_day, span = params['start_date'], params['span_days']
+    users = []
+    for index in range(start, stop):
+        pk = params['patient_base'] + index
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        joined = _aware(first_day + timedelta(days=rng.randrange(span)), time(rng.randrange(8, 21), rng.randrange(60)))
+        age = min(70, max(18, int(rng.gauss(32, 9))))
+        users.append(User(
+            id=pk,
+            username=f'{SYNTHETIC_PREFIX}p{pk}',
+            email=f'p{pk}@synthetic.example',
+            password=params['password'],
+            first_name=first,
+            last_name=last,
+            user_type='patient',
+            gender=rng.choices(['female', 'male', 'other'], [0.78, 0.2, 0.02])[0],
+            civil_status=rng.choices(['single', 'married', 'separated'], [0.6, 0.35, 0.05])[0],
+            birthday=date(params['end_date'].year - age, rng.randint(1, 12), rng.randint(1, 28)),
+            phone=f'09{rng.randrange(10 ** 9):09d}',
+            address=f'{rng.randint(1, 999)} {rng.choice(LAST_NAMES)} St., {rng.choice(CITIES)}',
+            occupation=rng.choice(OCCUPATIONS),
+            date_joined=joined,
+            created_at=joined,
+            updated_at=joined,
+        ))
+    with transaction.atomic(), raw_timestamps(User):
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    return len(users)
+
+
+def _pick_patient(rng, params):
+    # Skewed towards lower indices: a minority of loyal patients book most visits
+    return params['patient_base'] + int(params['patients'] * rng.random() ** 1.6)
+
+
+def _pick_day(rng, params):
+    while True:
+        day = params['start_date'] + timedelta(days=rng.randrange(params['span_days'] + params['future_days']))
+        if rng.random() < WEEKDAY_WEIGHTS[day.weekday()] / max(WEEKDAY_WEIGHTS):
+            return day
+
+
+def _appointment_block(params, block):
+    from appointments.models import Appointment, Feedback, Notification
+
+    rng = _rng(params['seed'], 'appointments', block)
+    start = block * APPOINTMENT_BLOCK
+    stop = min(start + APPOINTMENT_BLOCK, params['appointments'])
+    catalog, attendants, today = params['catalog'], params['attendants'], params['end_date']
+    # Nothing is created after the dataset's end date, even for future visits
+    latest_booking, latest = today - timedelta(days=1), _aware(today, time.min)
+
+    appointments = []
+    for _ in range(start, stop):
+        day = _pick_day(rng, params)
+        roll = rng.random()
+        item = {}
+        if roll < SERVICE_SHARE or not (catalog['products'] or catalog['packages']):
+            item['service_id'] = rng.choice(catalog['services'])
+        elif roll < SERVICE_SHARE + PRODUCT_SHARE and catalog['products']:
+            item['product_id'] = rng.choice(catalog['products'])
+        elif catalog['packages']:
+            item['package_id'] = rng.choice(catalog['packages'])[0]
+        else:
+            item['service_id'] = rng.choice(catalog['services'])
+        status = _weighted(rng, PAST_STATUS if day < today else FUTURE_STATUS)
+        booked = min(day, latest_booking) - timedelta(days=rng.randint(0, 21))
+        created = _aware(booked, time(rng.randrange(8, 22), rng.randrange(60)))
+        appointments.append(Appointment(
+            patient_id=_pick_patient(rng, params),
+            attendant_id=rng.choice(attendants),
+            appointment_date=day,
+            appointment_time=rng.choice(SLOTS),
+            status=status,
+            created_at=created,
+            updated_at=created,
+            **item,
+        ))
+
+    with transaction.atomic():
+        with raw_timestamps(Appointment):
+            Appointment.objects.bulk_create(appointments, batch_size=BATCH_SIZE)
+
+        feedback, notifications = [], []
+        for appointment in appointments:
+            visited = _aware(appointment.appointment_date, appointment.appointment_time)
+            if appointment.status == 'completed' and rng.random() < FEEDBACK_RATE:
+                rating = rng.choices(range(1, 6), RATING_WEIGHTS)[0]
+                feedback.append(Feedback(
+                    appointment_id=appointment.id,
+                    patient_id=appointment.patient_id,
+                    rating=rating,
+                    attendant_rating=min(5, max(1, rating + rng.choice([-1, 0, 0, 1]))),
+                    comment=rng.choice(COMMENTS),
+                    created_at=min(visited + timedelta(hours=rng.randint(2, 72)), latest),
+                ))
+            if appointment.status in ('confirmed', 'completed', 'cancelled'):
+                kind = 'cancellation' if appointment.status == 'cancelled' else 'confirmation'
+                sent = min(appointment.created_at + timedelta(hours=rng.randint(1, 48)), latest)
+                notifications.append(Notification(
+                    type=kind,
+                    appointment_id=appointment.id,
+                    title='Appointment Cancelled' if kind == 'cancellation' else 'Appointment Confirmed',
+                    message=f'Your appointment on {appointment.appointment_date:%B %d, %Y} '
+                            f'at {appointment.appointment_time:%I:%M %p} has been {appointment.status}.',
+                    is_read=appointment.appointment_date < today and rng.random() < 0.85,
+                    patient_id=appointment.patient_id,
+                    created_at=sent,
+                ))
+        with raw_timestamps(Feedback), raw_timestamps(Notification):
+            Feedback.objects.bulk_create(feedback, batch_size=BATCH_SIZE)
+            Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+    return len(appointments), len(feedback), len(notifications)
+
+
+def _package_block(params, block):
+    """Package bookings for a share of the patients in one patient block"""
+    from packages.models import PackageAppointment, PackageBooking
+    from packages.sessions import booking_status
+
+    rng = _rng(params['seed'], 'packages', block)
+    packages = params['catalog']['packages']
+    if not packages:
+        return 0, 0
+    start = block * PATIENT_BLOCK
+    stop = min(start + PATIENT_BLOCK, params['patients'])
+
+    bookings, sessions_used = [], []
+    for index in range(start, stop):
+        if rng.random() >= PACKAGE_PATIENT_RATE:
+            continue
+        package_id, sessions, duration_days, grace_days = rng.choice(packages)
+        booked = params['start_date'] + timedelta(days=rng.randrange(params['span_days']))
+        used = rng.randint(0, sessions)
+        valid_until = booked + timedelta(days=duration_days)
+        grace_period_until = valid_until + timedelta(days=grace_days)
+        created = _aware(booked)
+        bookings.append(PackageBooking(
+            patient_id=params['patient_base'] + index,
+            package_id=package_id,
+            sessions_remaining=sessions - used,
+            valid_until=valid_until,
+            grace_period_until=grace_period_until,
+            # As of the end date, as if sweep_packages had just run
+            status=booking_status(sessions - used, valid_until, grace_period_until, params['end_date']),
+            created_at=created,
+            updated_at=created,
+        ))
+        sessions_used.append(used)
+
+    with transaction.atomic():
+        with raw_timestamps(PackageBooking):
+            PackageBooking.objects.bulk_create(bookings, batch_size=BATCH_SIZE)
+        visits = []
+        for booking, used in zip(bookings, sessions_used):
+            gap = max(7, (booking.valid_until - booking.created_at.date()).days // max(used, 1))
+            for session in range(used):
+                day = booking.created_at.date() + timedelta(days=7 + session * gap)
+                created = _aware(min(day, params['end_date'] - timedelta(days=1)) - timedelta(days=3))
+                visits.append(PackageAppointment(
+                    booking_id=booking.id,
+                    attendant_id=rng.choice(params['attendants']),
+                    appointment_date=day,
+                    appointment_time=rng.choice(SLOTS),
+                    status='completed' if day < params['end_date'] else 'confirmed',
+                    created_at=created,
+                    updated_at=created,
+                ))
+        with raw_timestamps(PackageAppointment):
+            PackageAppointment.objects.bulk_create(visits, batch_size=BATCH_SIZE)
+    return len(bookings), len(visits)
+
+
+def _run_job(job):
+    kind, params, block = job
+    try:
+        if kind == 'patients':
+            return kind, _patient_block(params, block)
+        if kind == 'appointments':
+            return kind, _appointment_block(params, block)
+        return kind, _package_block(params, block)
+    finally:
+        connections.close_all()
+
+
+def _run(jobs, workers, progress):
+    if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # Children must open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for kind, result in pool.map(_run_job, jobs):
+                progress(kind, result)
+    else:
+        for job in jobs:
+            progress(*_run_job(job))
+
+
+def generate_dataset(patients, appointments, years=2, attendants=10, seed=42, workers=1,
+                     end_date=None, progress=None):
+    """Insert a synthetic dataset. Returns a dict of row counts"""
+    from appointments.models import Appointment, Feedback, Notification
+    from packages.models import PackageAppointment, PackageBooking
+
+    from .models import User
+
+    if connections['default'].vendor == 'sqlite':
+        # SQLite has a single writer: parallel blocks would only wait on the lock
+        workers = 1
+    progress = progress or (lambda kind, result: None)
+    end_date = end_date or timezone.localdate()
+    span_days = max(1, int(365 * years))
+    password = make_password(SYNTHETIC_PASSWORD)
+
+    catalog = ensure_catalog()
+    attendant_ids = create_attendants(attendants, seed, password)
+    params = {
+        'seed': seed,
+        'patients': patients,
+        'appointments': appointments if patients else 0,
+        'patient_base': (User.objects.aggregate(top=Max('id'))['top'] or 0) + 1,
+        'password': password,
+        'end_date': end_date,
+        'start_date': end_date - timedelta(days=span_days),
+        'span_days': span_days,
+        'future_days': 30,
+        'catalog': catalog,
+        'attendants': attendant_ids,
+    }
+
+    patient_blocks = range((patients + PATIENT_BLOCK - 1) // PATIENT_BLOCK)
+    appointment_blocks = range((params['appointments'] + APPOINTMENT_BLOCK - 1) // APPOINTMENT_BLOCK)
+    _run([('patients', params, block) for block in patient_blocks], workers, progress)
+    reset_sequences([User])
+    _run(
+        [('appointments', params, block) for block in appointment_blocks]
+        + [('packages', params, block) for block in patient_blocks],
+        workers, progress,
+    )
+
+    return {
+        'patients': User.objects.filter(username__startswith=f'{SYNTHETIC_PREFIX}p').count(),
+        'appointments': Appointment.objects.count(),
+        'feedback': Feedback.objects.count(),
+        'notifications': Notification.objects.count(),
+        'package_bookings': PackageBooking.objects.count(),
+        'package_appointments': PackageAppointment.objects.count(),
+    }
@@ -1,3 +1,215 @@
-from django.test import TestCase
+import io
+import random
+import tempfile
+from datetime import date, datetime, time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from .backup_store import BackupStore, BackupStoreError, ContentDefinedChunker
+
+
+class BackupStoreTests(SimpleTestCase):
+    """Chunked backup store: deduplication and verified restore"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        chunker = ContentDefinedChunker(min_size=1024, avg_size=4096, max_size=16384)
+        self.store = BackupStore(self.tmp.name, chunker=chunker)
+        self.data = random.Random(42).randbytes(200_000)
+
+    def test_round_trip(self):
+        manifest = self.store.backup_stream(io.BytesIO(self.data), 'db_backup_1')
+        out = io.BytesIO()
+        self.store.restore_to(self.store.load_manifest('latest'), out)
+        self.assertEqual(out.getvalue(), self.data)
+        self.assertEqual(manifest['size'], len(self.data))
+
+    def test_small_edit_only_stores_changed_chunks(self):
+        first = self.store.backup_stream(io.BytesIO(self.data), 'db_backup_1')
+        edited = self.data[:100_000] + b'new row' + self.data[100_000:]
+        second = self.store.backup_stream(io.BytesIO(edited), 'db_backup_2')
+        self.assertLessEqual(second['new_chunks'], 2)
+        self.assertLess(second['new_chunks'], len(first['chunks']))
+
+    def test_corrupt_chunk_fails_verification(self):
+        manifest = self.store.backup_stream(io.BytesIO(self.data), 'db_backup_1')
+        digest = manifest['chunks'][0][0]
+        self.store._chunk_path(digest).write_bytes(b'garbage')
+        with self.assertRaises(BackupStoreError):
+            self.store.restore_to(manifest, io.BytesIO())
+
+    def test_prune_removes_unreferenced_chunks(self):
+        self.store.backup_stream(io.BytesIO(self.data), 'db_backup_1')
+        self.store.backup_stream(io.BytesIO(self.data[::-1]), 'db_backup_2')
+        removed, freed = self.store.prune(keep_count=1)
+        self.assertEqual(removed, ['db_backup_1'])
+        self.assertGreater(freed, 0)
+        out = io.BytesIO()
+        self.store.restore_to(self.store.load_manifest(), out)
+        self.assertEqual(out.getvalue(), self.data[::-1])
+
+
+class PortableBackupOrderTests(SimpleTestCase):
+    """NDJSON export order must load without forward FK references"""
+
+    def test_fk_targets_precede_referrers(self):
+        from .portable_backup import backup_models
+
+        ordered = backup_models()
+        position = {model: i for i, model in enumerate(ordered)}
+        for model in ordered:
+            for field in model._meta.local_concrete_fields:
+                target = field.related_model
+                if field.is_relation and target in position and target is not model:
+                    self.assertLess(position[target], position[model], f'{model} before {target}')
+
+    def test_install_specific_tables_are_excluded(self):
+        from .portable_backup import backup_models
+
+        labels = {model._meta.label_lower for model in backup_models()}
+        self.assertNotIn('contenttypes.contenttype', labels)
+        self.assertNotIn('sessions.session', labels)
+        self.assertIn('appointments.appointment', labels)
+
+
+class ProtectedFileTests(SimpleTestCase):
+    """Range / conditional GET handling of serve_file()"""
+
+    def setUp(self):
+        from .protected_files import serve_file
+
+        self.serve_file = serve_file
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = f'{self.tmp.name}/db_backup_1.sql'
+        self.data = bytes(range(256)) * 1000
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def get(self, **headers):
+        request = RequestFactory().get('/', headers=headers)
+        return self.serve_file(request, self.path)
+
+    def test_full_download(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_range_resumes_download(self):
+        response = self.get(Range='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[1000:2000])
+
+    def test_suffix_and_unsatisfiable_ranges(self):
+        response = self.get(Range='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+        self.assertEqual(self.get(Range=f'bytes={len(self.data)}-').status_code, 416)
+
+    def test_stale_if_range_sends_whole_file(self):
+        response = self.get(Range='bytes=0-9', **{'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_conditional_get(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(**{'If-None-Match': etag}).status_code, 304)
+
+    @override_settings(PROTECTED_FILES_OFFLOAD='x-accel')
+    def test_x_accel_redirect(self):
+        with self.settings(PROTECTED_FILES_ACCEL_LOCATIONS={self.tmp.name: '/_protected/backups/'}):
+            response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/_protected/backups/db_backup_1.sql')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PrincipalTests(SimpleTestCase):
+    """Cached per-user principal with invalidation"""
+
+    def setUp(self):
+        from . import principal
+
+        cache.clear()
+        self.principal = principal
+        self.user = SimpleNamespace(is_authenticated=True, pk=7, user_type='attendant')
+        patcher = mock.patch.object(
+            principal, 'build_principal',
+            side_effect=lambda user: principal.Principal(user.pk, user.user_type, attendant=SimpleNamespace(id=3)),
+        )
+        self.build = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_principal_is_built_once_until_invalidated(self):
+        self.assertEqual(self.principal.get_principal(self.user).attendant_id, 3)
+        self.principal.get_principal(self.user)
+        self.assertEqual(self.build.call_count, 1)
+
+        self.principal.invalidate_principal(self.user.pk)
+        self.principal.get_principal(self.user)
+        self.principal.invalidate_all_principals()
+        self.principal.get_principal(self.user)
+        self.assertEqual(self.build.call_count, 3)
+
+    def test_role_change_rebuilds_and_anonymous_needs_no_lookup(self):
+        self.principal.get_principal(self.user)
+        self.user.user_type = 'admin'
+        self.assertEqual(self.principal.get_principal(self.user).user_type, 'admin')
+        self.assertFalse(self.principal.get_principal(SimpleNamespace(is_authenticated=False)).is_authenticated)
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_middleware_loads_the_principal_lazily(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.principal.PrincipalMiddleware(lambda request: HttpResponse())(request)
+        self.build.assert_not_called()
+        self.assertEqual(request.principal.user_type, 'attendant')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SyntheticDataTests(TestCase):
+    """generate_dataset() against the test database"""
+
+    def test_nothing_is_created_after_the_end_date(self):
+        from django.utils import timezone
+
+        from appointments.models import Appointment, Feedback, Notification
+        from packages.models import PackageAppointment
+
+        from .synthetic_data import generate_dataset
+
+        end_date = date(2025, 6, 30)
+        counts = generate_dataset(patients=200, appointments=2000, years=1, attendants=3, end_date=end_date)
+        self.assertEqual(counts['appointments'], 2000)
+        self.assertTrue(Appointment.objects.filter(appointment_date__gt=end_date).exists())
+
+        cutoff = timezone.make_aware(datetime.combine(end_date, time.min))
+        for model in (Appointment, Feedback, Notification, PackageAppointment):
+            self.assertFalse(model.objects.filter(created_at__gt=cutoff).exists(), model.__name__)
+
+    def test_package_statuses_need_no_sweep(self):
+        from packages.models import PackageBooking
+        from packages.sessions import sweep_package_bookings
+
+        from .synthetic_data import generate_dataset
+
+        end_date = date(2025, 6, 30)
+        generate_dataset(patients=1000, appointments=100, years=1, attendants=2, end_date=end_date)
+        statuses = set(PackageBooking.objects.values_list('status', flat=True))
+        self.assertTrue({'active', 'expired', 'used_up'} <= statuses, statuses)
+        counts = sweep_package_bookings(today=end_date, dry_run=True)
+        self.assertEqual((counts['used_up'], counts['expired'], counts['grace']), (0, 0, 0))
+
+    def test_attendant_names_stay_unique_past_the_name_pool(self):
+        from .models import User
+        from .synthetic_data import FIRST_NAMES, LAST_NAMES, create_attendants
+
+        count = len(FIRST_NAMES) * len(LAST_NAMES) + 5
+        self.assertEqual(len(create_attendants(count, seed=1, password='x')), count)
+        names = list(User.objects.filter(user_type='attendant').values_list('first_name', 'last_name'))
+        self.assertEqual(len(set(names)), count)
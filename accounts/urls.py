@@ -24,6 +24,7 @@ urlpatterns = [
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('medical-history/', views.medical_history, name='medical_history'),
+    path('medical-history/<int:history_id>/download/', views.download_medical_history, name='download_medical_history'),
     path('medical-history/delete/<int:history_id>/', views.delete_medical_history, name='delete_medical_history'),
     path('verify-password/', views.verify_password, name='verify_password'),
     path('test-mailtrap/', views.test_mailtrap, name='test_mailtrap'),
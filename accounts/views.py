@@ -7,17 +7,21 @@ from django.urls import reverse, reverse_lazy
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
+from django.utils.decorators import method_decorator
+from django.views.generic import View
+from asgiref.sync import sync_to_async
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_protect
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_http_methods
 import json
+import os
 from .models import User
 from .forms import CustomUserCreationForm, CustomPasswordResetForm, CustomSetPasswordForm
-from .email_service import MailtrapEmailService
+from .email_service import MailtrapEmailService, asend_mail
+from services.uploads import pending_spool_path, release_upload, store_upload
 
 
 def login_selection(request):
@@ -369,11 +373,30 @@ class CustomPasswordResetView(PasswordResetView):
         context['user_type'] = 'patient'
         return context
     
-    def form_valid(self, form):
-        """Override to only send reset emails to patients using Django's email system"""
+    # Async so the email send awaits the network instead of holding a worker
+    # (ASGI); Django runs it on a thread under WSGI
+    @method_decorator(csrf_protect)
+    async def dispatch(self, *args, **kwargs):
+        return await View.dispatch(self, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        # The template response renders after the view returns
+        return super().get(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        form = self.get_form()
+        if await sync_to_async(form.is_valid)():
+            return await self.form_valid(form)
+        return self.form_invalid(form)
+
+    async def put(self, *args, **kwargs):
+        return await self.post(*args, **kwargs)
+
+    async def form_valid(self, form):
+        """Override to only send reset emails to patients, without blocking on the email send"""
         email = form.cleaned_data['email']
         try:
-            user = User.objects.filter(email=email, user_type='patient').first()
+            user = await User.objects.filter(email=email, user_type='patient').afirst()
             if user and user.is_active:
                 # Generate token and create reset URL
                 token = default_token_generator.make_token(user)
@@ -387,7 +410,7 @@ class CustomPasswordResetView(PasswordResetView):
                     })
                 )
                 
-                # Send email using Django's email system
+                # Send email through the Mailtrap API or EMAIL_BACKEND
                 subject = 'Password Reset - Skinovation Beauty Clinic'
                 message = render_to_string('accounts/password_reset_email.html', {
                     'user': user,
@@ -396,13 +419,13 @@ class CustomPasswordResetView(PasswordResetView):
                 })
                 
                 try:
-                    send_mail(
+                    await asend_mail(
                         subject,
                         message,
                         settings.DEFAULT_FROM_EMAIL,
                         [user.email],
-                        fail_silently=False,
                         html_message=message,  # Send as HTML email
+                        category='Password Reset',
                     )
                     messages.success(self.request, 'Password reset email sent! Please check your inbox.')
                 except Exception as e:
@@ -463,13 +486,14 @@ def medical_history(request):
         notes = request.POST.get('notes', '')
         
         if document_type and title and file:
-            medical_history = MedicalHistory.objects.create(
+            medical_history = MedicalHistory(
                 patient=request.user,
                 document_type=document_type,
                 title=title,
-                file=file,
                 notes=notes
             )
+            medical_history.file = store_upload(medical_history, 'file', file)
+            medical_history.save()
             messages.success(request, 'Medical history document uploaded successfully!')
             return redirect('accounts:medical_history')
         else:
@@ -484,6 +508,30 @@ def medical_history(request):
     return render(request, 'accounts/medical_history.html', context)
 
 
+@login_required
+def download_medical_history(request, history_id):
+    """Serve a medical history document to its patient or to clinic staff"""
+    from .models import MedicalHistory
+    from .protected_files import serve_file
+    
+    medical_history = get_object_or_404(MedicalHistory, id=history_id)
+    if medical_history.patient_id != request.user.id and request.user.user_type not in ('admin', 'owner', 'attendant'):
+        raise Http404("Document not found.")
+    if not medical_history.file:
+        raise Http404("Document has no file.")
+    
+    # A background upload is not in storage until its transfer has run;
+    # until then the spooled copy is served
+    spool_path = pending_spool_path(medical_history.file)
+    if spool_path and not os.path.exists(spool_path):
+        # Spooled on another server
+        raise Http404("Document is still being uploaded.")
+    
+    # Documents open inline (PDF/images) but keep their original file name
+    filename = os.path.basename(medical_history.file.name)
+    return serve_file(request, spool_path or medical_history.file, filename=filename, as_attachment=False)
+
+
 @login_required
 def delete_medical_history(request, history_id):
     """Delete medical history document"""
@@ -492,7 +540,7 @@ def delete_medical_history(request, history_id):
     medical_history = get_object_or_404(MedicalHistory, id=history_id, patient=request.user)
     
     if request.method == 'POST':
-        medical_history.file.delete()  # Delete the file
+        release_upload(medical_history.file)  # Delete the file unless another record shares it
         medical_history.delete()  # Delete the record
         messages.success(request, 'Medical history document deleted successfully!')
     
@@ -0,0 +1,147 @@
+"""
+Patient retention by signup cohort.
+
+Retention used to be a 12-step loop of two COUNT queries per month over
+30-day windows. Here patients are grouped by the calendar month they signed up
+in (their cohort) and counted per calendar month they had an appointment in,
+all in one statement: cohort sizes UNION ALL distinct active patients per
+(cohort, month). The counts are cached under a version that changes whenever
+a patient or an appointment is saved or deleted, so any view of them (a 36
+month horizon, the last 6 cohorts, month-1 retention) is computed in Python
+without another query:
+
+    cohort_matrix(cohorts=12, horizon=12)
+    # [{'cohort': '2025-01', 'size': 40, 'active': [26, 18, 12, ...],
+    #   'retention': [65.0, 45.0, 30.0, ...]}, ...]   None for months not reached yet
+"""
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DateField, Value
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+VERSION_KEY = 'analytics:cohorts:version'
+COUNTS_KEY_PREFIX = 'analytics:cohorts'
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def cohort_version():
+    """Current cohort data version (starts at 1, never expires)"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_cohort_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+        return 2
+
+
+def _invalidate_on_commit(sender, instance, raw=False, **kwargs):
+    if raw or (sender._meta.label_lower == 'accounts.user' and instance.user_type != 'patient'):
+        return
+    transaction.on_commit(bump_cohort_version)
+
+
+def connect_cohort_signals():
+    from accounts.models import User
+    from appointments.models import Appointment
+
+    for model in (User, Appointment):
+        uid = f'analytics-cohorts-{model._meta.label_lower}'
+        post_save.connect(_invalidate_on_commit, sender=model, dispatch_uid=uid)
+        post_delete.connect(_invalidate_on_commit, sender=model, dispatch_uid=uid)
+
+
+def _month_index(day):
+    # TruncMonth of created_at is a datetime in the current time zone
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.year * 12 + day.month - 1
+
+
+def _month(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def query_cohort_counts():
+    """{'sizes': {cohort: patients}, 'active': {(cohort, month): patients}} keyed by month index"""
+    from accounts.models import User
+
+    patients = User.objects.filter(user_type='patient')
+    sizes = patients.values(cohort=TruncMonth('created_at')).annotate(
+        active=Value(None, output_field=DateField()), patients=Count('id'),
+    ).order_by()
+    active = patients.filter(appointments__isnull=False).values(
+        cohort=TruncMonth('created_at'), active=TruncMonth('appointments__appointment_date'),
+    ).annotate(patients=Count('id', distinct=True)).order_by()
+
+    counts = {'sizes': {}, 'active': {}}
+    for row in sizes.union(active, all=True):
+        cohort = _month_index(row['cohort'])
+        if row['active'] is None:
+            counts['sizes'][cohort] = row['patients']
+        else:
+            counts['active'][cohort, _month_index(row['active'])] = row['patients']
+    return counts
+
+
+def cohort_counts():
+    """query_cohort_counts(), cached for the current data version"""
+    key = f'{COUNTS_KEY_PREFIX}:{cohort_version()}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = query_cohort_counts()
+        cache.set(key, counts, getattr(settings, 'ANALYTICS_COHORT_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return counts
+
+
+def cohort_matrix(cohorts=12, horizon=12, today=None, counts=None):
+    """
+    The last `cohorts` signup months, oldest first, each with active patients
+    and retention (% of the cohort) for months 0..horizon after signup
+    """
+    counts = counts if counts is not None else cohort_counts()
+    current = _month_index(today or timezone.localdate())
+    matrix = []
+    for cohort in range(current - cohorts + 1, current + 1):
+        size = counts['sizes'].get(cohort, 0)
+        active, retention = [], []
+        for offset in range(horizon + 1):
+            if cohort + offset > current:
+                active.append(None)
+                retention.append(None)
+                continue
+            patients = counts['active'].get((cohort, cohort + offset), 0)
+            active.append(patients)
+            retention.append(round(patients / size * 100, 1) if size else 0)
+        month = _month(cohort)
+        matrix.append({'cohort': month.strftime('%Y-%m'), 'date': month, 'size': size,
+                       'active': active, 'retention': retention})
+    return matrix
+
+
+def monthly_retention(months=12, today=None, counts=None):
+    """
+    The `months` cohorts before the current month, newest first: new patients
+    and how many of them came back the month after signing up
+    """
+    matrix = cohort_matrix(cohorts=months + 1, horizon=1, today=today, counts=counts)[:-1]
+    return [
+        {
+            'month': row['cohort'],
+            'new_patients': row['size'],
+            'returning_patients': row['active'][1],
+            'retention_rate': row['retention'][1],
+        }
+        for row in reversed(matrix)
+    ]
@@ -0,0 +1,376 @@
+"""
+Streaming CSV / XLSX exports.
+
+Each export is a header row plus a generator of rows read with
+.iterator(chunk_size=...), so rows are fetched from a server-side cursor and
+written as they arrive; memory use does not grow with the row count and a
+download starts with the first chunk:
+
+    export = EXPORTS['appointments']
+    for chunk in csv_chunks(export.header, export.rows(using, filters)): ...
+
+Exports: appointments, patients (roster with visit counts), revenue (monthly
+rollup by service/product/package) and history (history log). Filters match
+the owner pages' query parameters, so an export holds what the page shows.
+
+xlsx_chunks() writes a minimal workbook (one sheet, inline strings) through
+zipfile onto a write-only stream, so XLSX needs no extra dependency and is
+produced row by row like CSV. Used by analytics:export and
+`manage.py export_report`.
+
+Under ASGI a StreamingHttpResponse over a plain generator is consumed with
+sync_to_async(list), i.e. the whole export is built in memory before the first
+byte is sent; async_chunks() wraps the generator so each chunk is pulled
+separately instead.
+"""
+import csv
+import io
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Callable
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+DEFAULT_CHUNK_SIZE = 2000
+CHUNK_BYTES = 64 * 1024
+FORMATS = ('csv', 'xlsx')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+@dataclass
+class Export:
+    name: str
+    header: list
+    rows: Callable  # (using, filters, chunk_size) -> iterable of rows
+
+
+def filter_appointments(appointments, status='', date='', search=''):
+    """The owner appointments page's filters"""
+    if status:
+        appointments = appointments.filter(status=status)
+    if date:
+        appointments = appointments.filter(appointment_date=date)
+    if search:
+        appointments = appointments.filter(
+            Q(patient__first_name__icontains=search) |
+            Q(patient__last_name__icontains=search) |
+            Q(service__service_name__icontains=search) |
+            Q(product__product_name__icontains=search) |
+            Q(package__package_name__icontains=search)
+        )
+    return appointments
+
+
+def filter_history_logs(history_logs, patient='', treatment='', attendant='', year='', type=''):
+    """The owner history log page's filters"""
+    if patient:
+        history_logs = history_logs.filter(Q(details__icontains=patient) | Q(performed_by__icontains=patient))
+    if treatment:
+        history_logs = history_logs.filter(Q(name__icontains=treatment) | Q(details__icontains=treatment))
+    if attendant:
+        history_logs = history_logs.filter(Q(details__icontains=attendant) | Q(performed_by__icontains=attendant))
+    if year:
+        history_logs = history_logs.filter(datetime__year=year)
+    if type:
+        history_logs = history_logs.filter(type=type)
+    return history_logs
+
+
+def _pick(filters, *names):
+    return {name: filters.get(name, '') for name in names}
+
+
+def appointment_rows(using, filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    from appointments.models import Appointment
+
+    appointments = filter_appointments(
+        Appointment.objects.using(using), **_pick(filters, 'status', 'date', 'search'),
+    ).order_by('-created_at', '-id').values_list(
+        'id', 'appointment_date', 'appointment_time', 'status',
+        'patient__first_name', 'patient__last_name', 'patient__email',
+        'service__service_name', 'service__price', 'product__product_name', 'product__price',
+        'package__package_name', 'package__price',
+        'attendant__first_name', 'attendant__last_name', 'created_at',
+    )
+    for (pk, day, at, status, first, last, email, service, service_price, product, product_price,
+         package, package_price, attendant_first, attendant_last, created_at) in appointments.iterator(chunk_size=chunk_size):
+        if service:
+            kind, item, price = 'service', service, service_price
+        elif product:
+            kind, item, price = 'product', product, product_price
+        elif package:
+            kind, item, price = 'package', package, package_price
+        else:
+            kind, item, price = '', '', None
+        yield [
+            pk, day, at, status, f'{first} {last}'.strip(), email, kind, item, price,
+            f'{attendant_first or ""} {attendant_last or ""}'.strip(), created_at,
+        ]
+
+
+def patient_rows(using, filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    from accounts.models import User
+
+    patients = User.objects.using(using).filter(user_type='patient')
+    if filters.get('search'):
+        search = filters['search']
+        patients = patients.filter(
+            Q(first_name__icontains=search) | Q(last_name__icontains=search) | Q(email__icontains=search)
+        )
+    # One grouped query instead of five per patient (admin_patients)
+    patients = patients.annotate(
+        total_appointments=Count('appointments'),
+        completed_appointments=Count('appointments', filter=Q(appointments__status='completed')),
+        cancelled_appointments=Count('appointments', filter=Q(appointments__status='cancelled')),
+        package_appointments=Count('appointments', filter=Q(appointments__package__isnull=False)),
+        last_visit=Max('appointments__appointment_date', filter=Q(appointments__status='completed')),
+    ).order_by('-id').values_list(
+        'id', 'first_name', 'last_name', 'email', 'phone', 'gender', 'birthday', 'archived', 'created_at',
+        'total_appointments', 'completed_appointments', 'cancelled_appointments', 'package_appointments',
+        'last_visit',
+    )
+    for row in patients.iterator(chunk_size=chunk_size):
+        yield list(row)
+
+
+def revenue_rows(using, filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Completed appointment revenue per month and kind, plus package sales"""
+    from appointments.models import Appointment
+    from packages.models import PackageBooking
+
+    completed = Appointment.objects.using(using).filter(status='completed')
+    if filters.get('year'):
+        completed = completed.filter(appointment_date__year=filters['year'])
+    months = {}
+    for month, services, service_revenue, products, product_revenue in completed.annotate(
+        month=TruncMonth('appointment_date'),
+    ).values('month').annotate(
+        services=Count('id', filter=Q(service__isnull=False)),
+        service_revenue=Sum('service__price'),
+        products=Count('id', filter=Q(product__isnull=False)),
+        product_revenue=Sum('product__price'),
+    ).values_list('month', 'services', 'service_revenue', 'products', 'product_revenue').order_by():
+        months[month] = [services, service_revenue or 0, products, product_revenue or 0, 0, 0]
+
+    bookings = PackageBooking.objects.using(using)
+    if filters.get('year'):
+        bookings = bookings.filter(created_at__year=filters['year'])
+    for month, packages, package_revenue in bookings.annotate(
+        month=TruncMonth('created_at'),
+    ).values('month').annotate(
+        packages=Count('id'), package_revenue=Sum('package__price'),
+    ).values_list('month', 'packages', 'package_revenue').order_by():
+        month = month.date() if isinstance(month, datetime) else month
+        row = months.setdefault(month, [0, 0, 0, 0, 0, 0])
+        row[4] += packages
+        row[5] += package_revenue or 0
+
+    for month in sorted(months):
+        services, service_revenue, products, product_revenue, packages, package_revenue = months[month]
+        yield [
+            month.strftime('%Y-%m'), services, service_revenue, products, product_revenue,
+            packages, package_revenue, service_revenue + product_revenue + package_revenue,
+        ]
+
+
+def history_rows(using, filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    from services.models import HistoryLog
+
+    history_logs = filter_history_logs(
+        HistoryLog.objects.using(using), **_pick(filters, 'patient', 'treatment', 'attendant', 'year', 'type'),
+    ).order_by('-datetime', '-id').values_list(
+        'id', 'datetime', 'type', 'name', 'action', 'performed_by', 'details', 'related_id',
+    )
+    for row in history_logs.iterator(chunk_size=chunk_size):
+        yield list(row)
+
+
+EXPORTS = {
+    'appointments': Export('appointments', [
+        'ID', 'Date', 'Time', 'Status', 'Patient', 'Patient Email', 'Type', 'Item', 'Price',
+        'Attendant', 'Booked At',
+    ], appointment_rows),
+    'patients': Export('patients', [
+        'ID', 'First Name', 'Last Name', 'Email', 'Phone', 'Gender', 'Birthday', 'Archived', 'Registered',
+        'Appointments', 'Completed', 'Cancelled', 'Package Appointments', 'Last Visit',
+    ], patient_rows),
+    'revenue': Export('revenue', [
+        'Month', 'Services', 'Service Revenue', 'Products', 'Product Revenue', 'Packages Sold',
+        'Package Revenue', 'Total Revenue',
+    ], revenue_rows),
+    'history': Export('history', [
+        'ID', 'Date', 'Type', 'Name', 'Action', 'Performed By', 'Details', 'Related ID',
+    ], history_rows),
+}
+
+
+def export_filename(name, file_format):
+    return f'{name}_{timezone.localdate():%Y%m%d}.{file_format}'
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    return str(value)
+
+
+def _csv_cell(value):
+    text = _text(value)
+    # Keep spreadsheet apps from evaluating user-entered text as a formula
+    if isinstance(value, str) and text[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + text
+    return text
+
+
+def csv_chunks(header, rows, chunk_bytes=CHUNK_BYTES):
+    """Encoded CSV (UTF-8 with BOM, for Excel) in chunks of about chunk_bytes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([_csv_cell(value) for value in row])
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class _Sink:
+    """Write-only stream collecting zipfile output until it is drained"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        self.size = 0
+        return data
+
+
+# Characters XML 1.0 does not allow, even escaped
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+_XLSX_FILES = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_INVALID_XML.sub('', _text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def xlsx_chunks(header, rows, sheet_name='Export', chunk_bytes=CHUNK_BYTES):
+    """An .xlsx workbook with one sheet, written and yielded as rows arrive"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _XLSX_FILES.items():
+            workbook.writestr(name, content)
+        workbook.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31])))
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row(header)
+            ).encode())
+            for row in rows:
+                sheet.write(_xlsx_row(row).encode())
+                if sink.size >= chunk_bytes:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+def export_chunks(name, file_format, using, filters=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encoded chunks of an export in the given format"""
+    export = EXPORTS[name]
+    rows = export.rows(using, filters or {}, chunk_size)
+    if file_format == 'xlsx':
+        return xlsx_chunks(export.header, rows, sheet_name=name.title())
+    return csv_chunks(export.header, rows)
+
+
+async def async_chunks(chunks):
+    """
+    chunks as an async iterator for ASGI responses, each chunk produced in the
+    sync thread so the rows' server-side cursor stays on one connection
+    """
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Client went away mid-download: close the generator (and its cursor)
+        if hasattr(chunks, 'close'):
+            await sync_to_async(chunks.close, thread_sensitive=True)()
@@ -0,0 +1,62 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.exports import DEFAULT_CHUNK_SIZE, EXPORTS, FORMATS, export_chunks, export_filename
+from beauty_clinic_django.db_routers import read_replica_alias
+
+
+class Command(BaseCommand):
+    help = 'Stream an export (appointments, patients, revenue, history) to a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS), help='What to export')
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='File format (default: csv)')
+        parser.add_argument('--output', default=None,
+                            help='Output file, or - for stdout (default: exports/<name>_<date>.<format>)')
+        parser.add_argument('--filter', action='append', default=[], metavar='KEY=VALUE',
+                            help='Filter as on the owner pages, e.g. --filter status=completed --filter year=2025')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f'Rows per cursor fetch (default: {DEFAULT_CHUNK_SIZE})')
+        parser.add_argument('--database', default=None,
+                            help='Database alias to read (default: the read replica when configured and reachable)')
+
+    def handle(self, *args, **options):
+        filters = {}
+        for item in options['filter']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'--filter expects KEY=VALUE, got {item!r}')
+            filters[key] = value
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        chunks = export_chunks(
+            options['name'], options['format'], options['database'] or read_replica_alias(),
+            filters, options['chunk_size'],
+        )
+        output = options['output'] or os.path.join('exports', export_filename(options['name'], options['format']))
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        output_dir = os.path.dirname(output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        # Written under a temp name so an interrupted export never looks complete
+        tmp_output = f'{output}.partial'
+        try:
+            with open(tmp_output, 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+            os.replace(tmp_output, output)
+        except BaseException:
+            if os.path.exists(tmp_output):
+                os.remove(tmp_output)
+            raise
+
+        size_mb = os.path.getsize(output) / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(f'✓ Exported {options["name"]} to {output} ({size_mb:.2f} MB)'))
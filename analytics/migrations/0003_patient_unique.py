@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:20
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicates(apps, schema_editor):
+    # update_or_create kept one row per patient, but nothing enforced it; keep the newest
+    for name in ('PatientAnalytics', 'PatientSegment'):
+        model = apps.get_model('analytics', name)
+        newest = model.objects.values('patient_id').annotate(keep=Max('id')).values_list('keep', flat=True)
+        model.objects.exclude(id__in=list(newest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_diagnosis'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='patientanalytics',
+            constraint=models.UniqueConstraint(fields=('patient',), name='patient_analytics_patient_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='patientsegment',
+            constraint=models.UniqueConstraint(fields=('patient',), name='patient_segment_patient_uniq'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_patient_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50, unique=True)),
+                ('watermark', models.DateTimeField(help_text='Changes at or after this time are picked up by the next run')),
+                ('stats', models.JSONField(blank=True, default=dict, help_text='What the last run refreshed')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Analytics Watermarks',
+                'db_table': 'analytics_watermarks',
+            },
+        ),
+    ]
@@ -27,6 +27,9 @@ class PatientAnalytics(models.Model):
     class Meta:
         db_table = 'patient_analytics'
         verbose_name_plural = 'Patient Analytics'
+        constraints = [
+            models.UniqueConstraint(fields=['patient'], name='patient_analytics_patient_uniq'),
+        ]
 
 
 class ServiceAnalytics(models.Model):
@@ -111,3 +114,21 @@ class PatientSegment(models.Model):
     class Meta:
         db_table = 'patient_segments'
         verbose_name_plural = 'Patient Segments'
+        constraints = [
+            models.UniqueConstraint(fields=['patient'], name='patient_segment_patient_uniq'),
+        ]
+
+
+class AnalyticsWatermark(models.Model):
+    """Last successful run of an analytics refresh job (analytics/refresh.py)"""
+    job = models.CharField(max_length=50, unique=True)
+    watermark = models.DateTimeField(help_text="Changes at or after this time are picked up by the next run")
+    stats = models.JSONField(default=dict, blank=True, help_text="What the last run refreshed")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.job} - {self.watermark}"
+
+    class Meta:
+        db_table = 'analytics_watermarks'
+        verbose_name_plural = 'Analytics Watermarks'
@@ -0,0 +1,392 @@
+"""
+Incremental analytics refresh (`manage.py populate_analytics`).
+
+The job used to delete every analytics table and rebuild it serially with
+tens of queries per patient, service and day, leaving the dashboards empty
+while it ran. A run now:
+
+1. Reads the job's AnalyticsWatermark: the start time of the last successful
+   run. Only what changed since is refreshed; without a watermark (or with
+   --force) everything is.
+2. Collects the touched entities:
+   - patients who signed up or were edited, or whose appointments, package
+     bookings or feedback changed, plus patients whose last visit crossed
+     the 60 / 90 day churn-risk marks since the last run
+   - days in the BusinessAnalytics window (the last 90) with changed
+     appointments, bookings, sign-ups or feedback, plus days new to the window
+   - services and treatment correlations, whenever anything changed (one
+     pass over all services; popularity is a ranking across them)
+3. Splits patients into id-range partitions and days into date ranges and
+   computes them in a process pool. Workers only read, each on its own
+   database connection, and return unsaved rows.
+4. Writes every row and the new watermark in one transaction, so readers
+   see the previous analytics until the new ones replace them.
+
+Deleted appointments and bookings leave nothing to find by timestamp; a
+periodic --force run picks them up.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Avg, Case, Count, DecimalField, Q, Subquery, Sum, When
+from django.db.models.functions import ExtractMonth, TruncDate
+from django.utils import timezone
+
+from . import scoring
+
+JOB = 'populate_analytics'
+BUSINESS_DAYS = 90
+DEFAULT_WORKERS = 2
+DEFAULT_PATIENT_CHUNK = 5000
+DATE_CHUNK = 15
+CORRELATION_THRESHOLD = 0.1
+RISK_MARKS = (60, 90)
+
+
+def _chunked(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _revenue():
+    return Sum(
+        Case(
+            When(service__isnull=False, then='service__price'),
+            When(product__isnull=False, then='product__price'),
+            default=0,
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+        filter=Q(status='completed'),
+    )
+
+
+# Touched entities
+
+def _midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def touched_patients(since, today):
+    """Sorted ids of patients whose analytics may have changed since `since`"""
+    from accounts.models import User
+    from appointments.models import Appointment, Feedback
+    from packages.models import PackageBooking
+
+    from .models import PatientAnalytics
+
+    changed = (
+        Q(created_at__gte=since) | Q(updated_at__gte=since)
+        | Q(id__in=Subquery(Appointment.objects.filter(updated_at__gte=since).values('patient_id')))
+        | Q(id__in=Subquery(PackageBooking.objects.filter(updated_at__gte=since).values('patient_id')))
+        | Q(id__in=Subquery(Feedback.objects.filter(created_at__gte=since).values('appointment__patient_id')))
+    )
+    since_day = timezone.localdate(since)
+    for days in RISK_MARKS:
+        # Under the mark at the last run, over it today
+        crossed = PatientAnalytics.objects.filter(
+            last_visit__gte=_midnight(since_day - timedelta(days=days)),
+            last_visit__lt=_midnight(today - timedelta(days=days)),
+        ).values('patient_id')
+        changed |= Q(id__in=Subquery(crossed))
+    return list(User.objects.filter(changed, user_type='patient').order_by('id').values_list('id', flat=True))
+
+
+def business_window(today):
+    return today - timedelta(days=BUSINESS_DAYS - 1), today
+
+
+def touched_days(since, today):
+    """Sorted days of the BusinessAnalytics window whose row may have changed since `since`"""
+    from accounts.models import User
+    from appointments.models import Appointment, Feedback
+    from packages.models import PackageBooking
+
+    start, end = business_window(today)
+    days = set()
+    days.update(Appointment.objects.filter(
+        updated_at__gte=since, appointment_date__range=(start, end),
+    ).values_list('appointment_date', flat=True).distinct())
+    days.update(Feedback.objects.filter(
+        created_at__gte=since, appointment__appointment_date__range=(start, end),
+    ).values_list('appointment__appointment_date', flat=True).distinct())
+    for queryset in (PackageBooking.objects.all(), User.objects.filter(user_type='patient')):
+        days.update(queryset.filter(created_at__gte=since).annotate(
+            day=TruncDate('created_at'),
+        ).values_list('day', flat=True).distinct())
+
+    # Days that entered the window since the last run, today included
+    day = max(start, timezone.localdate(since))
+    while day <= end:
+        days.add(day)
+        day += timedelta(days=1)
+    return sorted(day for day in days if start <= day <= end)
+
+
+def has_changes(since):
+    from appointments.models import Appointment, Feedback
+    from services.models import Service
+
+    return (
+        Appointment.objects.filter(updated_at__gte=since).exists()
+        or Feedback.objects.filter(created_at__gte=since).exists()
+        or Service.objects.filter(updated_at__gte=since).exists()
+    )
+
+
+# Row builders (run in workers)
+
+def business_rows(days):
+    """Unsaved BusinessAnalytics rows for the given days (sorted)"""
+    from accounts.models import User
+    from appointments.models import Appointment, Feedback
+    from packages.models import PackageBooking
+
+    from .models import BusinessAnalytics
+
+    if not days:
+        return []
+    wanted = set(days)
+    period = (days[0], days[-1])
+    rows = {day: {} for day in days}
+
+    for values in Appointment.objects.filter(appointment_date__range=period).values('appointment_date').annotate(
+        total_appointments=Count('id'),
+        completed_appointments=Count('id', filter=Q(status='completed')),
+        cancelled_appointments=Count('id', filter=Q(status='cancelled')),
+        returning_patients=Count('patient_id', distinct=True, filter=Q(patient__user_type='patient')),
+        total_revenue=_revenue(),
+    ).order_by():
+        day = values.pop('appointment_date')
+        if day in wanted:
+            rows[day].update(values)
+
+    created = {'created_at__date__range': period}
+    for values in PackageBooking.objects.filter(**created).annotate(day=TruncDate('created_at')).values('day').annotate(
+        package_revenue=Sum('package__price'),
+    ).order_by():
+        if values['day'] in wanted:
+            rows[values['day']]['package_revenue'] = values['package_revenue']
+
+    for values in User.objects.filter(user_type='patient', **created).annotate(day=TruncDate('created_at')).values(
+        'day',
+    ).annotate(new_patients=Count('id')).order_by():
+        if values['day'] in wanted:
+            rows[values['day']]['new_patients'] = values['new_patients']
+
+    for values in Feedback.objects.filter(appointment__appointment_date__range=period).values(
+        'appointment__appointment_date',
+    ).annotate(score=Avg('rating')).order_by():
+        day = values['appointment__appointment_date']
+        if day in wanted:
+            rows[day]['patient_satisfaction_score'] = values['score']
+
+    analytics = []
+    for day in days:
+        values = rows[day]
+        completed = values.get('completed_appointments', 0)
+        revenue = (values.get('total_revenue') or 0) + (values.get('package_revenue') or 0)
+        analytics.append(BusinessAnalytics(
+            date=day,
+            total_appointments=values.get('total_appointments', 0),
+            completed_appointments=completed,
+            cancelled_appointments=values.get('cancelled_appointments', 0),
+            new_patients=values.get('new_patients', 0),
+            returning_patients=values.get('returning_patients', 0),
+            total_revenue=revenue,
+            average_appointment_value=revenue / completed if completed else 0,
+            patient_satisfaction_score=values.get('patient_satisfaction_score') or 0,
+        ))
+    return analytics
+
+
+def service_rows():
+    """Unsaved ServiceAnalytics rows for every service"""
+    from appointments.models import Appointment, Feedback
+    from services.models import Service
+
+    from .models import ServiceAnalytics
+
+    service_ids = list(Service.objects.values_list('id', flat=True))
+    totals = {
+        values.pop('service_id'): values
+        for values in Appointment.objects.filter(service__isnull=False).values('service_id').annotate(
+            total_bookings=Count('id'),
+            completed_bookings=Count('id', filter=Q(status='completed')),
+            cancelled_bookings=Count('id', filter=Q(status='cancelled')),
+            total_revenue=Sum('service__price', filter=Q(status='completed')),
+        ).order_by()
+    }
+    ratings = dict(Feedback.objects.filter(
+        appointment__status='completed', appointment__service__isnull=False,
+    ).values('appointment__service_id').annotate(avg=Avg('rating')).values_list('appointment__service_id', 'avg'))
+    seasonal = {service_id: {str(month): 0 for month in range(1, 13)} for service_id in service_ids}
+    for service_id, month, bookings in Appointment.objects.filter(
+        status='completed', service__isnull=False,
+    ).annotate(month=ExtractMonth('appointment_date')).values('service_id', 'month').annotate(
+        bookings=Count('id'),
+    ).values_list('service_id', 'month', 'bookings').order_by():
+        if service_id in seasonal:
+            seasonal[service_id][str(month)] = bookings
+
+    # Rank by completed bookings among services that have any
+    booked = sorted(
+        (service_id for service_id in service_ids if totals.get(service_id, {}).get('completed_bookings')),
+        key=lambda service_id: -totals[service_id]['completed_bookings'],
+    )
+    popularity = {service_id: 1 - rank / len(service_ids) for rank, service_id in enumerate(booked)}
+
+    rows = []
+    for service_id in service_ids:
+        values = totals.get(service_id, {})
+        rows.append(ServiceAnalytics(
+            service_id=service_id,
+            total_bookings=values.get('total_bookings', 0),
+            completed_bookings=values.get('completed_bookings', 0),
+            cancelled_bookings=values.get('cancelled_bookings', 0),
+            total_revenue=values.get('total_revenue') or 0,
+            average_rating=ratings.get(service_id) or 0,
+            popularity_score=popularity.get(service_id, 0),
+            seasonal_trends=seasonal[service_id],
+        ))
+    return rows
+
+
+def correlation_rows():
+    """Unsaved TreatmentCorrelation rows: Jaccard overlap of the patients of each service pair"""
+    from appointments.models import Appointment
+    from services.models import Service
+
+    from .models import TreatmentCorrelation
+
+    patients = {}
+    for service_id, patient_id in Appointment.objects.filter(
+        status='completed', service__isnull=False,
+    ).values_list('service_id', 'patient_id').distinct():
+        patients.setdefault(service_id, set()).add(patient_id)
+
+    services = list(Service.objects.values_list('id', flat=True))
+    rows = []
+    for i, primary in enumerate(services):
+        for secondary in services[i + 1:]:
+            first, second = patients.get(primary, set()), patients.get(secondary, set())
+            union = len(first | second)
+            if not union:
+                continue
+            intersection = len(first & second)
+            strength = intersection / union
+            if strength >= CORRELATION_THRESHOLD:
+                rows.append(TreatmentCorrelation(
+                    primary_service_id=primary, secondary_service_id=secondary,
+                    correlation_strength=strength, frequency=intersection,
+                    confidence_score=min(1.0, intersection / 10),
+                ))
+    return rows
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Forked workers must not share the parent's connections
+    connections.close_all()
+
+
+def _patient_partition(patient_ids, today):
+    return scoring.score_rows(patient_ids, today)
+
+
+def _day_partition(days):
+    return business_rows(days)
+
+
+def _run_partitions(patient_partitions, day_partitions, today, workers):
+    """(PatientAnalytics rows, PatientSegment rows, BusinessAnalytics rows) of every partition"""
+    analytics, segments, business = [], [], []
+    in_memory = connection.vendor == 'sqlite' and connection.is_in_memory_db()
+    if workers <= 1 or in_memory or len(patient_partitions) + len(day_partitions) <= 1:
+        for partition in patient_partitions:
+            rows, partition_segments = _patient_partition(partition, today)
+            analytics.extend(rows)
+            segments.extend(partition_segments)
+        for partition in day_partitions:
+            business.extend(_day_partition(partition))
+        return analytics, segments, business
+
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        patient_jobs = [pool.submit(_patient_partition, partition, today) for partition in patient_partitions]
+        day_jobs = [pool.submit(_day_partition, partition) for partition in day_partitions]
+        for job in patient_jobs:
+            rows, partition_segments = job.result()
+            analytics.extend(rows)
+            segments.extend(partition_segments)
+        for job in day_jobs:
+            business.extend(job.result())
+    return analytics, segments, business
+
+
+def get_watermark(job=JOB):
+    from .models import AnalyticsWatermark
+
+    row = AnalyticsWatermark.objects.filter(job=job).first()
+    return row.watermark if row else None
+
+
+def refresh_analytics(since=None, full=False, workers=None, chunk_size=DEFAULT_PATIENT_CHUNK, job=JOB):
+    """
+    Refresh what changed since `since` (default: the job's watermark; all of
+    it if there is none or full is set). Returns counts of refreshed rows.
+    """
+    from accounts.models import User
+
+    from .models import (AnalyticsWatermark, BusinessAnalytics, PatientAnalytics, PatientSegment,
+                         ServiceAnalytics, TreatmentCorrelation)
+
+    started = timezone.now()
+    today = timezone.localdate(started)
+    if workers is None:
+        workers = getattr(settings, 'ANALYTICS_REFRESH_WORKERS', DEFAULT_WORKERS)
+    since = None if full else (since or get_watermark(job))
+
+    if since is None:
+        patient_ids = list(User.objects.filter(user_type='patient').order_by('id').values_list('id', flat=True))
+        start, end = business_window(today)
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        refresh_services = True
+    else:
+        patient_ids = touched_patients(since, today)
+        days = touched_days(since, today)
+        refresh_services = has_changes(since)
+
+    analytics, segments, business = _run_partitions(
+        _chunked(patient_ids, chunk_size), _chunked(days, DATE_CHUNK), today, workers,
+    )
+    services = service_rows() if refresh_services else []
+    correlations = correlation_rows() if refresh_services else []
+
+    stats = {
+        'mode': 'full' if since is None else 'incremental',
+        'since': since.isoformat() if since else None,
+        'patients': len(analytics),
+        'days': len(business),
+        'services': len(services),
+        'correlations': len(correlations),
+    }
+    with transaction.atomic():
+        scoring.save_scores(analytics, segments)
+        BusinessAnalytics.objects.bulk_create(
+            business, batch_size=scoring.DEFAULT_BATCH_SIZE, update_conflicts=True, unique_fields=['date'],
+            update_fields=[field.name for field in BusinessAnalytics._meta.concrete_fields
+                           if field.name not in ('id', 'date', 'created_at')],
+        )
+        if refresh_services:
+            ServiceAnalytics.objects.all().delete()
+            ServiceAnalytics.objects.bulk_create(services)
+            TreatmentCorrelation.objects.all().delete()
+            TreatmentCorrelation.objects.bulk_create(correlations, batch_size=scoring.DEFAULT_BATCH_SIZE)
+        if since is None:
+            # Accounts that are no longer patients
+            PatientAnalytics.objects.exclude(patient__user_type='patient').delete()
+            PatientSegment.objects.exclude(patient__user_type='patient').delete()
+        AnalyticsWatermark.objects.update_or_create(job=job, defaults={'watermark': started, 'stats': stats})
+    return stats
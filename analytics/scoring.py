@@ -0,0 +1,281 @@
+"""
+Batch patient scoring: PatientAnalytics, churn risk and PatientSegment.
+
+populate_analytics used to walk every patient and run a handful of queries
+each (appointments, cancellations, packages, feedback, the last visits) plus
+two update_or_create calls. Here the features of all patients come from a few
+grouped queries into parallel columns, one value per patient:
+
+- appointment counts, spend, first and last completed visit (one GROUP BY)
+- package spending and average feedback rating (one GROUP BY each)
+- the dates of each patient's last six completed visits (one window query),
+  for the recent-vs-older visit gap
+- up to five preferred services per patient (one DISTINCT query)
+
+Risk scores and segments are then computed column by column and both tables
+are written with bulk_create(update_conflicts=True) in batches, so a full
+re-score is a fixed number of queries however many patients there are:
+
+    score_patients()                   # every patient
+    score_patients(patient_ids=[...])  # just these
+
+score_rows() computes without writing, so partitions can be scored in
+worker processes and saved together (analytics/refresh.py).
+"""
+from datetime import datetime, time
+
+from django.db.models import Avg, Case, Count, DecimalField, F, Max, Min, Q, Sum, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+RECENT_VISITS = 3
+PREFERRED_SERVICES = 5
+ID_CHUNK = 900
+DENSE_SPAN = 4
+DEFAULT_BATCH_SIZE = 1000
+
+HIGH_VALUE_SPENT = 10000
+FREQUENT_VISITS = 10
+AT_RISK_SCORE = 0.7
+NEW_VISITS = 2
+
+ANALYTICS_UPDATE_FIELDS = [
+    'total_appointments', 'completed_appointments', 'cancelled_appointments', 'total_spent', 'last_visit',
+    'average_visit_frequency', 'preferred_services', 'risk_score', 'updated_at',
+]
+SEGMENT_UPDATE_FIELDS = ['segment', 'segment_score', 'last_updated']
+
+
+def _chunks(ids, size=ID_CHUNK):
+    # Keeps IN (...) lists under SQLite's parameter limit
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _grouped(queryset, patient_ids, path='patient_id'):
+    """Run queryset for all patients, or only for patient_ids (sorted) when given"""
+    if patient_ids is None:
+        yield from queryset
+        return
+    if patient_ids and patient_ids[-1] - patient_ids[0] < len(patient_ids) * DENSE_SPAN:
+        # A partition of consecutive ids: one range scan, callers drop rows of other ids
+        yield from queryset.filter(**{f'{path}__gte': patient_ids[0], f'{path}__lte': patient_ids[-1]})
+        return
+    for chunk in _chunks(patient_ids):
+        yield from queryset.filter(**{f'{path}__in': chunk})
+
+
+def _spent():
+    return Sum(
+        Case(
+            When(service__isnull=False, then='service__price'),
+            When(product__isnull=False, then='product__price'),
+            default=0,
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+        filter=Q(status='completed'),
+    )
+
+
+def patient_features(patient_ids=None):
+    """Columns of per-patient features: {'patient_id': [...], 'completed': [...], ...}"""
+    from accounts.models import User
+    from appointments.models import Appointment, Feedback
+    from packages.models import PackageBooking
+
+    if patient_ids is None:
+        ids = list(User.objects.filter(user_type='patient').order_by('id').values_list('id', flat=True))
+    else:
+        ids = sorted(set(patient_ids))
+    row = {patient_id: index for index, patient_id in enumerate(ids)}
+    size = len(ids)
+    features = {
+        'patient_id': ids,
+        'total': [0] * size,
+        'completed': [0] * size,
+        'cancelled': [0] * size,
+        'spent': [0] * size,
+        'first_visit': [None] * size,
+        'last_visit': [None] * size,
+        'avg_rating': [None] * size,
+        'recent_visits': [[] for _ in ids],
+        'preferred_services': [[] for _ in ids],
+    }
+    lookup = None if patient_ids is None else ids
+
+    appointments = Appointment.objects.values('patient_id').annotate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+        spent=_spent(),
+        first_visit=Min('appointment_date', filter=Q(status='completed')),
+        last_visit=Max('appointment_date', filter=Q(status='completed')),
+    ).order_by()
+    for values in _grouped(appointments, lookup):
+        index = row.get(values.pop('patient_id'))
+        if index is None:
+            continue
+        for name, value in values.items():
+            features[name][index] = value if value is not None else features[name][index]
+
+    packages = PackageBooking.objects.values('patient_id').annotate(spent=Sum('package__price')).order_by()
+    for values in _grouped(packages, lookup):
+        index = row.get(values['patient_id'])
+        if index is not None and values['spent']:
+            features['spent'][index] += values['spent']
+
+    ratings = Feedback.objects.values(rated_by=F('appointment__patient_id')).annotate(
+        avg_rating=Avg('rating'),
+    ).order_by()
+    for values in _grouped(ratings, lookup, path='appointment__patient_id'):
+        index = row.get(values['rated_by'])
+        if index is not None:
+            features['avg_rating'][index] = values['avg_rating']
+
+    # Last two runs of RECENT_VISITS completed visits, newest first
+    visits = Appointment.objects.filter(status='completed').annotate(
+        visit_rank=Window(RowNumber(), partition_by=F('patient_id'),
+                          order_by=[F('appointment_date').desc(), F('id').desc()]),
+    ).filter(visit_rank__lte=RECENT_VISITS * 2).values_list('patient_id', 'appointment_date', 'visit_rank')
+    for patient_id, day, rank in _grouped(visits, lookup):
+        index = row.get(patient_id)
+        if index is not None:
+            features['recent_visits'][index].append((rank, day))
+    features['recent_visits'] = [[day for _, day in sorted(days)] for days in features['recent_visits']]
+
+    preferred = Appointment.objects.filter(status='completed', service__isnull=False).values_list(
+        'patient_id', 'service__service_name',
+    ).distinct().order_by('patient_id', 'service__service_name')
+    for patient_id, name in _grouped(preferred, lookup):
+        index = row.get(patient_id)
+        if index is not None and len(features['preferred_services'][index]) < PREFERRED_SERVICES:
+            features['preferred_services'][index].append(name)
+    return features
+
+
+def _average_gap(days):
+    """Average days between visits, days newest first"""
+    return (days[0] - days[-1]).days / (len(days) - 1) if len(days) > 1 else 0
+
+
+def _risk(completed, total, cancelled, last_visit, recent_visits, avg_rating, today):
+    risk_factors = 0
+    total_factors = 0
+
+    # Time since last visit
+    if completed:
+        days_since_last_visit = (today - last_visit).days
+        if days_since_last_visit > 90:
+            risk_factors += 1
+        elif days_since_last_visit > 60:
+            risk_factors += 0.5
+        total_factors += 1
+
+    # Cancellation rate
+    if total:
+        cancellation_rate = cancelled / total
+        if cancellation_rate > 0.3:
+            risk_factors += 1
+        elif cancellation_rate > 0.2:
+            risk_factors += 0.5
+        total_factors += 1
+
+    # Visit frequency decline: recent gaps much longer than older ones
+    recent, older = recent_visits[:RECENT_VISITS], recent_visits[RECENT_VISITS:]
+    if completed >= RECENT_VISITS and len(recent) >= 2 and len(older) >= 2:
+        if _average_gap(recent) > _average_gap(older) * 1.5:
+            risk_factors += 1
+        total_factors += 1
+
+    # Low satisfaction
+    if avg_rating is not None:
+        if avg_rating < 3.0:
+            risk_factors += 1
+        total_factors += 1
+
+    return min(1.0, risk_factors / total_factors) if total_factors else 0.0
+
+
+def risk_scores(features, today=None):
+    """Churn risk (0-1) per patient"""
+    today = today or timezone.now().date()
+    return [
+        _risk(*values, today)
+        for values in zip(features['completed'], features['total'], features['cancelled'], features['last_visit'],
+                          features['recent_visits'], features['avg_rating'])
+    ]
+
+
+def _segment(spent, completed, risk):
+    if spent >= HIGH_VALUE_SPENT:
+        return 'high_value', min(1.0, float(spent) / 20000)
+    if completed >= FREQUENT_VISITS:
+        return 'frequent', min(1.0, completed / 20)
+    if risk >= AT_RISK_SCORE:
+        return 'at_risk', risk
+    if completed <= NEW_VISITS:
+        return 'new', 1.0 - (completed / 3)
+    return 'occasional', min(1.0, completed / 10)
+
+
+def segments(features, risks):
+    """(segment, segment score) per patient"""
+    return [_segment(*values) for values in zip(features['spent'], features['completed'], risks)]
+
+
+def visit_frequencies(features):
+    """Average days between completed visits per patient"""
+    return [
+        int((last - first).days / (completed - 1)) if completed > 1 else 0
+        for first, last, completed in zip(features['first_visit'], features['last_visit'], features['completed'])
+    ]
+
+
+def _as_datetime(day):
+    return timezone.make_aware(datetime.combine(day, time.min)) if day else None
+
+
+def score_rows(patient_ids=None, today=None):
+    """Unsaved (PatientAnalytics, PatientSegment) lists for the given patients (all if None)"""
+    from .models import PatientAnalytics, PatientSegment
+
+    features = patient_features(patient_ids)
+    risks = risk_scores(features, today)
+    frequencies = visit_frequencies(features)
+    analytics = [
+        PatientAnalytics(
+            patient_id=patient_id, total_appointments=total, completed_appointments=completed,
+            cancelled_appointments=cancelled, total_spent=spent, last_visit=_as_datetime(last_visit),
+            average_visit_frequency=frequency, preferred_services=preferred, risk_score=risk,
+        )
+        for patient_id, total, completed, cancelled, spent, last_visit, frequency, preferred, risk in zip(
+            features['patient_id'], features['total'], features['completed'], features['cancelled'],
+            features['spent'], features['last_visit'], frequencies, features['preferred_services'], risks,
+        )
+    ]
+    patient_segments = [
+        PatientSegment(patient_id=patient_id, segment=segment, segment_score=score)
+        for patient_id, (segment, score) in zip(features['patient_id'], segments(features, risks))
+    ]
+    return analytics, patient_segments
+
+
+def save_scores(analytics, patient_segments, batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert score_rows() output by patient"""
+    from .models import PatientAnalytics, PatientSegment
+
+    PatientAnalytics.objects.bulk_create(
+        analytics, batch_size=batch_size,
+        update_conflicts=True, unique_fields=['patient'], update_fields=ANALYTICS_UPDATE_FIELDS,
+    )
+    PatientSegment.objects.bulk_create(
+        patient_segments, batch_size=batch_size,
+        update_conflicts=True, unique_fields=['patient'], update_fields=SEGMENT_UPDATE_FIELDS,
+    )
+
+
+def score_patients(patient_ids=None, today=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Recompute PatientAnalytics and PatientSegment; returns the number of patients scored"""
+    analytics, patient_segments = score_rows(patient_ids, today)
+    save_scores(analytics, patient_segments, batch_size)
+    return len(analytics)
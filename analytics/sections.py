@@ -0,0 +1,174 @@
+"""
+Dashboard sections served as JSON.
+
+The owner and analytics dashboards render as a shell; each block (overview
+KPIs, revenue trend, patient lifetime value, service performance,
+correlations, insights, diagnostics) is fetched in parallel by
+static/js/dashboard-sections.js from analytics:dashboard_section, so the page
+no longer waits for the slowest AnalyticsService aggregate.
+
+A section's payload is {"section", "data", "html"}: plain data (charts read
+it) and the block's markup rendered from templates/analytics/sections/.
+Payloads are cached for ANALYTICS_SECTION_CACHE_TIMEOUT seconds. The ETag is
+a hash of the payload and Last-Modified the time it last changed, kept in a
+key that never expires, so a recomputed but unchanged section still answers
+conditional requests with 304.
+"""
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+SECTION_KEY_PREFIX = 'analytics:section'
+DEFAULT_SECTION_TIMEOUT = 60 * 5
+TOP_PATIENTS = 10
+
+
+def _plain(value):
+    """Numbers as floats, dates as ISO strings, querysets as lists"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) or hasattr(value, 'model'):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _visit_date(appointment):
+    return appointment.appointment_date if appointment else None
+
+
+def _correlation(correlation):
+    return {
+        'primary': correlation.primary_service.service_name,
+        'secondary': correlation.secondary_service.service_name,
+        'strength': correlation.correlation_strength,
+        'frequency': correlation.frequency,
+    }
+
+
+def overview_section(service):
+    return _plain(service.get_business_overview())
+
+
+def revenue_section(service):
+    revenue = service.get_revenue_analytics()
+    revenue['category_revenue'] = [
+        {'category': row['category__name'], 'revenue': row['revenue'], 'bookings': row['bookings']}
+        for row in revenue['category_revenue']
+    ]
+    return _plain(revenue)
+
+
+def patients_section(service):
+    patients = service.get_patient_analytics()
+    patients['patient_lifetime_values'] = [
+        {
+            'patient_id': row['patient'].id,
+            'name': row['patient'].get_full_name(),
+            'total_spent': row['total_spent'],
+            'appointment_count': row['appointment_count'],
+            'avg_visit_value': row['avg_visit_value'],
+            'first_visit': _visit_date(row['first_visit']),
+            'last_visit': _visit_date(row['last_visit']),
+        }
+        for row in patients['patient_lifetime_values'][:TOP_PATIENTS]
+    ]
+    return _plain(patients)
+
+
+def services_section(service):
+    services = service.get_service_analytics()
+    services['services'] = [
+        {
+            'id': s.id,
+            'name': s.service_name,
+            'total_bookings': s.total_bookings,
+            'completed_bookings': s.completed_bookings,
+            'cancelled_bookings': s.cancelled_bookings,
+            'total_revenue': s.total_revenue,
+            'avg_rating': s.avg_rating,
+            'conversion_rate': s.conversion_rate,
+        }
+        for s in services['services']
+    ]
+    services['popularity_trends'] = [
+        {'service_id': trend['service'].id, 'service': trend['service'].service_name,
+         'monthly_bookings': trend['monthly_bookings']}
+        for trend in services['popularity_trends']
+    ]
+    for row in services['category_performance']:
+        row['category'] = row.pop('category__name')
+    return _plain(services)
+
+
+def correlations_section(service):
+    correlations = service.get_treatment_correlations()
+    return {name: [_correlation(c) for c in rows] for name, rows in correlations.items()}
+
+
+def insights_section(service):
+    return _plain({'insights': service.get_business_insights()})
+
+
+def diagnostics_section(service):
+    diagnostics = service.get_diagnostic_metrics()
+    diagnostics['scores'] = [
+        (label, diagnostics[f'{name}_score'])
+        for label, name in (('Completion', 'completion'), ('Patient growth', 'growth'),
+                            ('Retention', 'retention'), ('Revenue', 'revenue'))
+    ]
+    return _plain(diagnostics)
+
+
+SECTIONS = {
+    'overview': overview_section,
+    'revenue': revenue_section,
+    'patients': patients_section,
+    'services': services_section,
+    'correlations': correlations_section,
+    'insights': insights_section,
+    'diagnostics': diagnostics_section,
+}
+
+
+def _key(name):
+    return f'{SECTION_KEY_PREFIX}:{name}'
+
+
+def build_section(name):
+    """Compute a section; returns {'body', 'etag', 'last_modified'}"""
+    from .services import AnalyticsService
+
+    data = SECTIONS[name](AnalyticsService())
+    html = render_to_string(f'analytics/sections/{name}.html', data)
+    body = json.dumps({'section': name, 'data': data, 'html': html}, cls=DjangoJSONEncoder).encode()
+    etag = f'"{hashlib.md5(body).hexdigest()}"'
+
+    # Last-Modified only moves when the payload does
+    meta_key = f'{_key(name)}:meta'
+    previous = cache.get(meta_key)
+    if previous and previous['etag'] == etag:
+        last_modified = previous['last_modified']
+    else:
+        last_modified = int(timezone.now().timestamp())
+        cache.set(meta_key, {'etag': etag, 'last_modified': last_modified}, timeout=None)
+    return {'body': body, 'etag': etag, 'last_modified': last_modified}
+
+
+def get_section(name):
+    """A section's cached payload, computed if missing or expired"""
+    entry = cache.get(_key(name))
+    if entry is None:
+        entry = build_section(name)
+        cache.set(_key(name), entry, getattr(settings, 'ANALYTICS_SECTION_CACHE_TIMEOUT', DEFAULT_SECTION_TIMEOUT))
+    return entry
@@ -1,15 +1,17 @@
 from django.db.models import Count, Sum, Avg, Q, F, Case, When, IntegerField
-from django.db.models.functions import TruncMonth, TruncWeek, TruncDay, Extract
 from django.utils import timezone
 from datetime import datetime, timedelta
 from collections import defaultdict
-import statistics
 from accounts.models import User
 from appointments.models import Appointment, Feedback
+from appointments.ratings import average_subquery, combined_average, summaries
 from services.models import Service
 from products.models import Product
 from packages.models import Package, PackageBooking
+from beauty_clinic_django.db_routers import replica_reads
 from .models import PatientAnalytics, ServiceAnalytics, BusinessAnalytics, TreatmentCorrelation, PatientSegment
+from .cohorts import cohort_matrix, monthly_retention
+from .timeseries import grouped_time_series, seasonal_series, time_series
 
 
 class AnalyticsService:
@@ -21,6 +23,7 @@ class AnalyticsService:
         self.last_90_days = self.today - timedelta(days=90)
         self.last_year = self.today - timedelta(days=365)
     
+    @replica_reads()
     def get_business_overview(self):
         """Get comprehensive business overview metrics"""
         total_patients = User.objects.filter(user_type='patient').count()
@@ -102,42 +105,27 @@ class AnalyticsService:
             'active_patients': active_patients,
         }
     
+    @replica_reads()
     def get_revenue_analytics(self):
         """Get detailed revenue analytics with trends"""
-        # Daily revenue for last 30 days
-        daily_revenue = Appointment.objects.filter(
-            status='completed',
-            appointment_date__gte=self.last_30_days
-        ).extra(
-            select={'day': "strftime('%%Y-%%m-%%d', appointment_date)"}
-        ).values('day').annotate(
-            revenue=Sum(
-                Case(
-                    When(service__isnull=False, then='service__price'),
-                    When(product__isnull=False, then='product__price'),
-                    default=0,
-                    output_field=IntegerField()
-                )
+        revenue = Sum(
+            Case(
+                When(service__isnull=False, then='service__price'),
+                When(product__isnull=False, then='product__price'),
+                default=0,
+                output_field=IntegerField()
             )
-        ).order_by('day')
+        )
+        completed = Appointment.objects.filter(status='completed')
+        
+        # Daily revenue for last 30 days
+        daily_revenue = time_series(completed, 'appointment_date', 'day', self.last_30_days, self.today, revenue=revenue)
         
         # Monthly revenue for last 12 months
-        monthly_revenue = Appointment.objects.filter(
-            status='completed',
-            appointment_date__gte=self.last_year
-        ).extra(
-            select={'month': "strftime('%%Y-%%m', appointment_date)"}
-        ).values('month').annotate(
-            revenue=Sum(
-                Case(
-                    When(service__isnull=False, then='service__price'),
-                    When(product__isnull=False, then='product__price'),
-                    default=0,
-                    output_field=IntegerField()
-                )
-            ),
-            appointments=Count('id')
-        ).order_by('month')
+        monthly_revenue = time_series(
+            completed, 'appointment_date', 'month', self.last_year, self.today,
+            revenue=revenue, appointments=Count('id'),
+        )
         
         # Revenue by service category
         category_revenue = Service.objects.values('category__name').annotate(
@@ -146,14 +134,14 @@ class AnalyticsService:
         ).filter(revenue__isnull=False).order_by('-revenue')
         
         # Revenue trends and growth
-        monthly_revenue_list = list(monthly_revenue)
+        monthly_revenue_list = monthly_revenue
         current_month_revenue = sum([item['revenue'] for item in monthly_revenue_list[-1:]]) if monthly_revenue_list else 0
         previous_month_revenue = sum([item['revenue'] for item in monthly_revenue_list[-2:-1]]) if len(monthly_revenue_list) > 1 else 0
         
         revenue_growth = ((current_month_revenue - previous_month_revenue) / previous_month_revenue * 100) if previous_month_revenue > 0 else 0
         
         return {
-            'daily_revenue': list(daily_revenue),
+            'daily_revenue': daily_revenue,
             'monthly_revenue': monthly_revenue_list,
             'category_revenue': list(category_revenue),
             'revenue_growth': revenue_growth,
@@ -161,6 +149,7 @@ class AnalyticsService:
             'previous_month_revenue': previous_month_revenue,
         }
     
+    @replica_reads()
     def get_patient_analytics(self):
         """Get comprehensive patient analytics"""
         # Patient segments
@@ -197,32 +186,9 @@ class AnalyticsService:
         # Sort by total spent
         patient_lifetime_values.sort(key=lambda x: x['total_spent'], reverse=True)
         
-        # Patient retention analysis
-        retention_data = []
-        for i in range(1, 13):  # Last 12 months
-            month_start = self.today.replace(day=1) - timedelta(days=30*i)
-            month_end = month_start + timedelta(days=30)
-            
-            new_patients = User.objects.filter(
-                user_type='patient',
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).count()
-            
-            returning_patients = User.objects.filter(
-                user_type='patient',
-                appointments__appointment_date__gte=month_start,
-                appointments__appointment_date__lt=month_end
-            ).distinct().count()
-            
-            retention_rate = (returning_patients / new_patients * 100) if new_patients > 0 else 0
-            
-            retention_data.append({
-                'month': month_start.strftime('%Y-%m'),
-                'new_patients': new_patients,
-                'returning_patients': returning_patients,
-                'retention_rate': retention_rate
-            })
+        # Patient retention by signup cohort
+        cohorts = cohort_matrix(today=self.today)
+        retention_data = monthly_retention(today=self.today)
         
         # Patient demographics
         demographics = {
@@ -236,9 +202,11 @@ class AnalyticsService:
             'segments': list(segments),
             'patient_lifetime_values': patient_lifetime_values[:20],  # Top 20
             'retention_data': retention_data,
+            'cohorts': cohorts,
             'demographics': demographics,
         }
     
+    @replica_reads()
     def get_service_analytics(self):
         """Get comprehensive service performance analytics"""
         # Service performance metrics
@@ -247,7 +215,7 @@ class AnalyticsService:
             completed_bookings=Count('appointments', filter=Q(appointments__status='completed')),
             cancelled_bookings=Count('appointments', filter=Q(appointments__status='cancelled')),
             total_revenue=Sum('appointments__service__price', filter=Q(appointments__status='completed')),
-            avg_rating=Avg('appointments__feedback__rating', filter=Q(appointments__feedback__isnull=False)),
+            avg_rating=average_subquery('service'),
             conversion_rate=Case(
                 When(total_bookings=0, then=0),
                 default=F('completed_bookings') * 100.0 / F('total_bookings'),
@@ -261,44 +229,48 @@ class AnalyticsService:
             total_bookings=Count('appointments'),
             completed_bookings=Count('appointments', filter=Q(appointments__status='completed')),
             total_revenue=Sum('appointments__service__price', filter=Q(appointments__status='completed')),
-            avg_rating=Avg('appointments__feedback__rating', filter=Q(appointments__feedback__isnull=False))
         ).order_by('-total_revenue')
+        category_performance = list(category_performance)
+        # Category averages combine the services' stored rating aggregates
+        service_ratings = summaries('service')
+        category_services = defaultdict(list)
+        for service_id, category in Service.objects.values_list('id', 'category__name'):
+            if service_id in service_ratings:
+                category_services[category].append(service_ratings[service_id])
+        for category in category_performance:
+            category['avg_rating'] = combined_average(category_services[category['category__name']])
         
         # Seasonal trends
-        seasonal_data = Appointment.objects.filter(
-            appointment_date__gte=self.last_year
-        ).extra(
-            select={'month': "strftime('%%m', appointment_date)"}
-        ).values('month').annotate(
+        seasonal_data = seasonal_series(
+            Appointment.objects.filter(appointment_date__gte=self.last_year),
+            'appointment_date',
             count=Count('id'),
-            revenue=Sum('service__price', filter=Q(status='completed'))
-        ).order_by('month')
+            revenue=Sum('service__price', filter=Q(status='completed')),
+        )
         
-        # Service popularity trends
-        popularity_trends = []
+        # Service popularity trends: top 10 services, one grouped query
         services_list = list(services)
-        for service in services_list[:10]:  # Top 10 services
-            monthly_bookings = Appointment.objects.filter(
-                service=service,
-                appointment_date__gte=self.last_year
-            ).extra(
-                select={'month': "strftime('%%Y-%%m', appointment_date)"}
-            ).values('month').annotate(
-                bookings=Count('id')
-            ).order_by('month')
-            
-            popularity_trends.append({
-                'service': service,
-                'monthly_bookings': list(monthly_bookings)
-            })
+        top_services = services_list[:10]
+        monthly_by_service = grouped_time_series(
+            Appointment.objects.filter(service__in=top_services),
+            'appointment_date', 'month', self.last_year, self.today, 'service_id',
+            bookings=Count('id'),
+        )
+        empty = time_series(Appointment.objects.none(), 'appointment_date', 'month', self.last_year, self.today,
+                            bookings=Count('id'))
+        popularity_trends = [
+            {'service': service, 'monthly_bookings': monthly_by_service.get(service.id, empty)}
+            for service in top_services
+        ]
         
         return {
             'services': services_list,
-            'category_performance': list(category_performance),
-            'seasonal_data': list(seasonal_data),
+            'category_performance': category_performance,
+            'seasonal_data': seasonal_data,
             'popularity_trends': popularity_trends,
         }
     
+    @replica_reads()
     def get_treatment_correlations(self):
         """Get treatment correlation analysis"""
         correlations = TreatmentCorrelation.objects.select_related(
@@ -324,6 +296,7 @@ class AnalyticsService:
             'all_correlations': list(correlations[:50]),  # Top 50
         }
     
+    @replica_reads()
     def get_business_insights(self):
         """Generate actionable business insights and recommendations"""
         overview = self.get_business_overview()
@@ -433,6 +406,7 @@ class AnalyticsService:
         
         return dict(age_groups)
     
+    @replica_reads()
     def get_diagnostic_metrics(self):
         """Get diagnostic metrics for business health"""
         overview = self.get_business_overview()
@@ -0,0 +1,376 @@
+import csv
+import io
+import json
+import warnings
+import zipfile
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from xml.etree import ElementTree
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Count
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import cohorts, refresh, scoring, sections, timeseries
+from .exports import async_chunks, csv_chunks, xlsx_chunks
+from .management.commands.populate_analytics import Command as PopulateAnalyticsCommand
+from .views import dashboard_section
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardSectionTests(SimpleTestCase):
+    """Cached JSON dashboard sections with conditional GET"""
+
+    def setUp(self):
+        cache.clear()
+        self.insights = [{
+            'type': 'info', 'category': 'Services', 'title': 'Top Performing Service',
+            'message': 'Facial generates revenue.', 'priority': 'low', 'action': 'Promote it',
+        }]
+        patcher = mock.patch.dict(sections.SECTIONS, {'insights': lambda service: {'insights': self.insights}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def get(self, name='insights', **headers):
+        request = self.factory.get(f'/analytics/sections/{name}/', headers=headers)
+        request.user = SimpleNamespace(is_authenticated=True, user_type='owner')
+        return dashboard_section(request, name=name)
+
+    def test_payload(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(response.content)
+        self.assertEqual(payload['data'], {'insights': self.insights})
+        self.assertIn('Top Performing Service', payload['html'])
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_unchanged_section_revalidates(self):
+        first = self.get()
+        self.assertEqual(self.get(**{'If-None-Match': first['ETag']}).status_code, 304)
+
+        # Recomputed after expiry with the same data: same validators
+        cache.delete(sections._key('insights'))
+        second = self.get(**{'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['Last-Modified'], first['Last-Modified'])
+
+    def test_changed_section_gets_new_etag(self):
+        first = self.get()
+        self.insights = []
+        cache.delete(sections._key('insights'))
+        second = self.get(**{'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+    def test_unknown_section(self):
+        from django.http import Http404
+
+        with self.assertRaises(Http404):
+            self.get('nope')
+
+    def test_plain_values(self):
+        self.assertEqual(
+            sections._plain({'total': Decimal('12.50'), 'rows': ({'n': Decimal('1')},)}),
+            {'total': 12.5, 'rows': [{'n': 1.0}]},
+        )
+
+
+class ExportWriterTests(SimpleTestCase):
+    """Streaming CSV and XLSX writers"""
+
+    header = ['ID', 'Date', 'Name', 'Price']
+
+    def rows(self, count=3):
+        for i in range(count):
+            yield [i, date(2025, 1, i % 28 + 1), f'Patient <{i}> & co', Decimal('1500.50')]
+
+    def test_csv(self):
+        data = b''.join(csv_chunks(self.header, self.rows())).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(data)))
+        self.assertEqual(rows[0], self.header)
+        self.assertEqual(rows[1], ['0', '2025-01-01', 'Patient <0> & co', '1500.50'])
+        self.assertEqual(len(rows), 4)
+
+    def test_csv_neutralises_formulas(self):
+        data = b''.join(csv_chunks(['Name'], [['=HYPERLINK("x")'], [-5]])).decode('utf-8-sig')
+        self.assertEqual(list(csv.reader(io.StringIO(data)))[1:], [['\'=HYPERLINK("x")'], ['-5']])
+
+    def test_csv_is_chunked(self):
+        chunks = list(csv_chunks(self.header, self.rows(2000), chunk_bytes=4096))
+        self.assertGreater(len(chunks), 10)
+
+    async def test_async_chunks_pull_one_chunk_at_a_time(self):
+        produced = []
+
+        def chunks():
+            for i in range(3):
+                produced.append(i)
+                yield b'%d' % i
+
+        stream = async_chunks(chunks())
+        self.assertEqual(await anext(stream), b'0')
+        self.assertEqual(produced, [0])
+        self.assertEqual([chunk async for chunk in stream], [b'1', b'2'])
+
+    async def test_async_chunks_close_the_generator(self):
+        closed = []
+
+        def chunks():
+            try:
+                yield b'a'
+                yield b'b'
+            finally:
+                closed.append(True)
+
+        stream = async_chunks(chunks())
+        await anext(stream)
+        await stream.aclose()
+        self.assertEqual(closed, [True])
+
+    def test_xlsx(self):
+        chunks = list(xlsx_chunks(self.header, self.rows(5000), chunk_bytes=4096))
+        self.assertGreater(len(chunks), 1)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('s:sheetData/s:row', ns)
+        self.assertEqual(len(rows), 5001)
+        cells = rows[1].findall('s:c', ns)
+        self.assertEqual(cells[0].find('s:v', ns).text, '0')
+        self.assertEqual(cells[2].find('s:is/s:t', ns).text, 'Patient <0> & co')
+
+
+class TimeSeriesTests(SimpleTestCase):
+    """Gap-filled date buckets"""
+
+    def test_bucket_starts(self):
+        self.assertEqual(
+            timeseries.bucket_starts(date(2024, 11, 15), date(2025, 2, 3), 'month'),
+            [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)],
+        )
+        self.assertEqual(
+            timeseries.bucket_starts(date(2025, 1, 1), date(2025, 1, 14), 'week'),
+            [date(2024, 12, 30), date(2025, 1, 6), date(2025, 1, 13)],
+        )
+        self.assertEqual(len(timeseries.bucket_starts(date(2024, 2, 1), date(2024, 3, 1), 'day')), 30)
+
+    def test_bucket_starts_up_to_the_last_date(self):
+        self.assertEqual(timeseries.bucket_starts(date(9999, 11, 1), date(9999, 12, 31), 'month'),
+                         [date(9999, 11, 1), date(9999, 12, 1)])
+        self.assertEqual(timeseries.bucket_starts(date(9999, 12, 30), date(9999, 12, 31), 'day'),
+                         [date(9999, 12, 30), date(9999, 12, 31)])
+        self.assertEqual(timeseries.bucket_starts(date(9999, 12, 20), date(9999, 12, 31), 'week')[-1],
+                         date(9999, 12, 27))
+
+    def test_time_series_fills_gaps(self):
+        rows = [
+            {'bucket': datetime(2025, 3, 1, tzinfo=dt_timezone.utc), 'revenue': Decimal('1500'), 'appointments': 2},
+            {'bucket': date(2025, 1, 1), 'revenue': None, 'appointments': 1},
+        ]
+        with mock.patch.object(timeseries, '_buckets', return_value=rows):
+            series = timeseries.time_series(None, 'appointment_date', 'month', date(2024, 12, 20), date(2025, 3, 5),
+                                             revenue=None, appointments=None)
+        self.assertEqual([row['month'] for row in series], ['2024-12', '2025-01', '2025-02', '2025-03'])
+        self.assertEqual([row['revenue'] for row in series], [0, 0, 0, Decimal('1500')])
+        self.assertEqual([row['appointments'] for row in series], [0, 1, 0, 2])
+        self.assertEqual(series[0]['date'], date(2024, 12, 1))
+        self.assertEqual(timeseries.chart_arrays(series, 'month', 'appointments'), {
+            'labels': ['2024-12', '2025-01', '2025-02', '2025-03'], 'appointments': [0, 1, 0, 2],
+        })
+
+    def test_grouped_time_series(self):
+        rows = [
+            {'bucket': date(2025, 1, 6), 'service_id': 1, 'bookings': 3},
+            {'bucket': date(2025, 1, 13), 'service_id': 2, 'bookings': 1},
+        ]
+        with mock.patch.object(timeseries, '_buckets', return_value=rows):
+            series = timeseries.grouped_time_series(None, 'appointment_date', 'week', date(2025, 1, 6),
+                                                    date(2025, 1, 19), 'service_id', bookings=None)
+        self.assertEqual([row['bookings'] for row in series[1]], [3, 0])
+        self.assertEqual([row['bookings'] for row in series[2]], [0, 1])
+        self.assertEqual([row['week'] for row in series[2]], ['2025-01-06', '2025-01-13'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DateTimeSeriesTests(TestCase):
+    """time_series() over a DateTimeField, against the test database"""
+
+    def test_whole_local_days_are_counted(self):
+        from datetime import time as clock
+
+        from accounts.models import Attendant, User
+        from appointments.models import Appointment
+
+        patient = User.objects.create_user('patient', password='x', user_type='patient')
+        attendant = Attendant.objects.create(first_name='A', last_name='B', shift_date=date(2025, 1, 1),
+                                             shift_time=clock(9))
+        for created in (datetime(2025, 1, 1, 0, 30), datetime(2025, 1, 2, 12), datetime(2025, 1, 2, 23, 30),
+                        datetime(2025, 1, 3, 0, 0)):
+            appointment = Appointment.objects.create(patient=patient, attendant=attendant,
+                                                     appointment_date=date(2025, 1, 5), appointment_time=clock(10))
+            Appointment.objects.filter(id=appointment.id).update(created_at=timezone.make_aware(created))
+
+        with warnings.catch_warnings():
+            # Naive datetime bounds would warn
+            warnings.simplefilter('error', RuntimeWarning)
+            series = timeseries.time_series(Appointment.objects.all(), 'created_at', 'day',
+                                            date(2025, 1, 1), date(2025, 1, 2), bookings=Count('id'))
+        self.assertEqual([row['bookings'] for row in series], [1, 2])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CohortTests(SimpleTestCase):
+    """Signup-cohort retention from one cached set of counts"""
+
+    def setUp(self):
+        cache.clear()
+        nov, dec, jan = (cohorts._month_index(date(2024, 11, 1)), cohorts._month_index(date(2024, 12, 1)),
+                         cohorts._month_index(date(2025, 1, 1)))
+        self.counts = {
+            'sizes': {nov: 10, dec: 4},
+            'active': {(nov, nov): 6, (nov, dec): 5, (nov, jan): 2, (dec, jan): 1},
+        }
+
+    def test_matrix(self):
+        matrix = cohorts.cohort_matrix(cohorts=3, horizon=3, today=date(2025, 1, 20), counts=self.counts)
+        self.assertEqual([row['cohort'] for row in matrix], ['2024-11', '2024-12', '2025-01'])
+        self.assertEqual(matrix[0]['active'], [6, 5, 2, None])
+        self.assertEqual(matrix[0]['retention'], [60.0, 50.0, 20.0, None])
+        self.assertEqual(matrix[1]['active'], [0, 1, None, None])
+        self.assertEqual(matrix[2]['size'], 0)
+        self.assertEqual(matrix[2]['retention'], [0, None, None, None])
+
+    def test_longer_horizon_needs_no_query(self):
+        with mock.patch.object(cohorts, 'query_cohort_counts', return_value=self.counts) as query:
+            short = cohorts.cohort_matrix(cohorts=3, horizon=1, today=date(2025, 1, 20))
+            long = cohorts.cohort_matrix(cohorts=36, horizon=36, today=date(2025, 1, 20))
+        query.assert_called_once()
+        self.assertEqual(long[-3]['active'][:2], short[0]['active'])
+
+    def test_new_version_requeries(self):
+        with mock.patch.object(cohorts, 'query_cohort_counts', return_value=self.counts) as query:
+            cohorts.cohort_counts()
+            cohorts.bump_cohort_version()
+            cohorts.cohort_counts()
+        self.assertEqual(query.call_count, 2)
+
+    def test_monthly_retention(self):
+        retention = cohorts.monthly_retention(months=2, today=date(2025, 1, 20), counts=self.counts)
+        self.assertEqual(retention, [
+            {'month': '2024-12', 'new_patients': 4, 'returning_patients': 1, 'retention_rate': 25.0},
+            {'month': '2024-11', 'new_patients': 10, 'returning_patients': 5, 'retention_rate': 50.0},
+        ])
+
+
+class PatientScoringTests(SimpleTestCase):
+    """Column-wise churn risk and segmentation"""
+
+    def features(self, **columns):
+        base = {
+            'patient_id': [1], 'total': [0], 'completed': [0], 'cancelled': [0], 'spent': [0],
+            'first_visit': [None], 'last_visit': [None], 'avg_rating': [None],
+            'recent_visits': [[]], 'preferred_services': [[]],
+        }
+        base.update(columns)
+        return base
+
+    def test_no_history(self):
+        features = self.features()
+        risks = scoring.risk_scores(features, today=date(2025, 6, 1))
+        self.assertEqual(risks, [0.0])
+        self.assertEqual(scoring.segments(features, risks), [('new', 1.0)])
+
+    def test_lapsed_low_rated_patient(self):
+        # 100 days since the last visit, 1 of 3 cancelled, rated 2.5
+        features = self.features(total=[3], completed=[2], cancelled=[1], last_visit=[date(2025, 2, 21)],
+                                 avg_rating=[2.5], recent_visits=[[date(2025, 2, 21), date(2025, 1, 1)]])
+        risks = scoring.risk_scores(features, today=date(2025, 6, 1))
+        self.assertAlmostEqual(risks[0], 1.0)
+        self.assertEqual(scoring.segments(features, risks), [('at_risk', 1.0)])
+
+    def test_visit_gaps_widening(self):
+        visits = [date(2025, 5, 30), date(2025, 4, 30), date(2025, 3, 31),
+                  date(2025, 3, 21), date(2025, 3, 11), date(2025, 3, 1)]
+        features = self.features(total=[6], completed=[6], last_visit=[visits[0]], first_visit=[visits[-1]],
+                                 recent_visits=[visits])
+        # Factors: recent visit (0), no cancellations (0), gaps 30 vs 10 days (1)
+        self.assertAlmostEqual(scoring.risk_scores(features, today=date(2025, 6, 1))[0], 1 / 3)
+        self.assertEqual(scoring.visit_frequencies(features), [18])
+
+    def test_segment_precedence(self):
+        features = self.features(patient_id=[1, 2, 3], spent=[Decimal('12000'), 500, 500],
+                                 completed=[12, 12, 5])
+        self.assertEqual(scoring.segments(features, [0.9, 0.9, 0.2]), [
+            ('high_value', 0.6), ('frequent', 0.6), ('occasional', 0.5),
+        ])
+
+
+class AnalyticsRefreshTests(SimpleTestCase):
+    """populate_analytics partitions and options"""
+
+    def test_partitions_are_combined_in_order(self):
+        def score(patient_ids, today):
+            return [f'analytics-{i}' for i in patient_ids], [f'segment-{i}' for i in patient_ids]
+
+        with mock.patch.object(refresh, '_patient_partition', side_effect=score), \
+                mock.patch.object(refresh, '_day_partition', side_effect=lambda days: [f'day-{d}' for d in days]):
+            analytics, segments, business = refresh._run_partitions(
+                refresh._chunked([1, 2, 3, 4, 5], 2), refresh._chunked([7, 8, 9], 2), date(2025, 1, 1), workers=1,
+            )
+        self.assertEqual(analytics, ['analytics-1', 'analytics-2', 'analytics-3', 'analytics-4', 'analytics-5'])
+        self.assertEqual(segments[-1], 'segment-5')
+        self.assertEqual(business, ['day-7', 'day-8', 'day-9'])
+
+    def test_since_option(self):
+        command = PopulateAnalyticsCommand()
+        since = command.parse_since('2025-06-01')
+        self.assertEqual(since, timezone.make_aware(datetime(2025, 6, 1)))
+        self.assertEqual(command.parse_since('2025-06-01T08:30:00+00:00'),
+                         datetime(2025, 6, 1, 8, 30, tzinfo=dt_timezone.utc))
+        with self.assertRaises(CommandError):
+            command.parse_since('yesterday')
+
+
+class PatientUniqueMigrationTests(TransactionTestCase):
+    """analytics 0003 on a table holding duplicate rows per patient"""
+
+    def setUp(self):
+        from .models import PatientAnalytics, PatientSegment
+
+        # The suite builds tables from the models; load the real migration
+        with override_settings(MIGRATION_MODULES={}):
+            loader = MigrationLoader(None, ignore_no_migrations=True)
+        self.migration = loader.get_migration('analytics', '0003_patient_unique')
+        self.state = loader.project_state(('analytics', '0003_patient_unique'), at_end=False)
+        # Back to the schema before 0003 so duplicates can be written (SQLite
+        # rebuilds the table from the model passed in, so pass the old one)
+        with connection.schema_editor() as editor:
+            for model in (PatientAnalytics, PatientSegment):
+                editor.remove_constraint(self.state.apps.get_model(model._meta.label), model._meta.constraints[0])
+
+    def test_keeps_the_newest_row_per_patient_and_adds_the_constraints(self):
+        from django.db import IntegrityError
+
+        from accounts.models import User
+
+        from .models import PatientAnalytics, PatientSegment
+
+        first, second = (User.objects.create_user(f'patient{i}', password='x', user_type='patient') for i in (1, 2))
+        PatientAnalytics.objects.bulk_create([PatientAnalytics(patient=p) for p in (first, first, second)])
+        PatientSegment.objects.bulk_create([PatientSegment(patient=first, segment=s) for s in ('new', 'frequent')])
+
+        with connection.schema_editor() as editor:
+            self.migration.apply(self.state, editor)
+
+        self.assertEqual(sorted(PatientAnalytics.objects.values_list('patient_id', flat=True)), [first.id, second.id])
+        self.assertEqual(list(PatientSegment.objects.values_list('segment', flat=True)), ['frequent'])
+        with self.assertRaises(IntegrityError):
+            PatientAnalytics.objects.create(patient=second)
@@ -0,0 +1,152 @@
+"""
+Date-bucketed aggregates that run the same on SQLite and PostgreSQL.
+
+Trends used to group on .extra(select={'month': "strftime(...)"}), which only
+SQLite understands. Here buckets come from TruncDay / TruncWeek / TruncMonth
+(or Extract for month-of-year), the date range is a plain filter on the
+column so its index can be used, and the rows are gap-filled in Python: every
+bucket in the range is present, with zeros where nothing happened, in
+O(buckets) after one grouped query.
+
+    series = time_series(completed, 'appointment_date', 'month', start, end, revenue=Sum('service__price'))
+    # [{'month': '2025-01', 'date': date(2025, 1, 1), 'revenue': 1200}, ...]
+    chart_arrays(series, 'month', 'revenue')
+    # {'labels': ['2025-01', ...], 'revenue': [1200, ...]}
+
+start and end are dates, inclusive. On a DateTimeField they cover whole days
+in the current time zone (start's midnight up to, not including, the midnight
+after end), matching the day the Trunc functions put each row in.
+
+Labels: day '2025-01-31', week the Monday it starts on ('2025-01-27'),
+month '2025-01'; seasonal_series() labels months of the year '01'..'12'.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import DateTimeField
+from django.db.models.functions import ExtractMonth, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+GRAINS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+LABEL_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-%m-%d',
+    'month': '%Y-%m',
+}
+
+
+def bucket_start(day, grain):
+    """First day of the bucket containing day"""
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    if grain == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(start, end, grain):
+    """First days of every bucket from start's to end's, inclusive"""
+    current, last = bucket_start(start, grain), bucket_start(end, grain)
+    starts = []
+    while current <= last:
+        starts.append(current)
+        if current == last:
+            # Stepping past the last bucket could overflow date.max
+            break
+        if grain == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=7 if grain == 'week' else 1)
+    return starts
+
+
+def _as_date(value):
+    # Truncating a DateTimeField gives a datetime in the current time zone
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _empty_row(aggregates):
+    return {name: 0 for name in aggregates}
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _range(field, start, end, is_datetime):
+    """Lookups for start..end (dates, inclusive)"""
+    if not is_datetime:
+        return {f'{field}__gte': start, f'{field}__lte': end}
+    # A date compared to a datetime is its naive midnight: end's day would be lost
+    bounds = {f'{field}__gte': _day_start(start)}
+    if end < date.max:
+        bounds[f'{field}__lt'] = _day_start(end + timedelta(days=1))
+    return bounds
+
+
+def _buckets(queryset, field, grain, start, end, group=None, **aggregates):
+    rows = queryset.annotate(bucket=GRAINS[grain](field))
+    is_datetime = isinstance(rows.query.annotations['bucket'].lhs.output_field, DateTimeField)
+    rows = rows.filter(**_range(field, start, end, is_datetime))
+    values = ['bucket', group] if group else ['bucket']
+    return rows.values(*values).annotate(**aggregates).order_by()
+
+
+def _dense(found, starts, grain, aggregates):
+    series = []
+    for day in starts:
+        row = {grain: day.strftime(LABEL_FORMATS[grain]), 'date': day, **_empty_row(aggregates)}
+        for name, value in found.get(day, {}).items():
+            row[name] = value or 0
+        series.append(row)
+    return series
+
+
+def time_series(queryset, field, grain, start, end, **aggregates):
+    """
+    Aggregates per bucket of a date/datetime field between start and end
+    (dates, inclusive; whole local days on a datetime field), one row per
+    bucket including empty ones
+    """
+    found = {}
+    for row in _buckets(queryset, field, grain, start, end, **aggregates):
+        found[_as_date(row.pop('bucket'))] = row
+    return _dense(found, bucket_starts(start, end, grain), grain, aggregates)
+
+
+def grouped_time_series(queryset, field, grain, start, end, group, **aggregates):
+    """{group value: time_series(...)} from one grouped query, for groups with any rows"""
+    found = {}
+    for row in _buckets(queryset, field, grain, start, end, group=group, **aggregates):
+        bucket = _as_date(row.pop('bucket'))
+        found.setdefault(row.pop(group), {})[bucket] = row
+    starts = bucket_starts(start, end, grain)
+    return {key: _dense(rows, starts, grain, aggregates) for key, rows in found.items()}
+
+
+def seasonal_series(queryset, field, **aggregates):
+    """Aggregates per month of the year ('01'..'12'), all twelve months present"""
+    found = {
+        row.pop('month_of_year'): row
+        for row in queryset.annotate(month_of_year=ExtractMonth(field))
+        .values('month_of_year').annotate(**aggregates).order_by()
+    }
+    series = []
+    for month in range(1, 13):
+        row = {'month': f'{month:02d}', **_empty_row(aggregates)}
+        for name, value in found.get(month, {}).items():
+            row[name] = value or 0
+        series.append(row)
+    return series
+
+
+def chart_arrays(series, label, *fields):
+    """Parallel arrays of a series for a chart: {'labels': [...], field: [...]}"""
+    arrays = {'labels': [row[label] for row in series]}
+    for name in fields:
+        arrays[name] = [row[name] for row in series]
+    return arrays
+
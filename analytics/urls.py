@@ -9,4 +9,6 @@ urlpatterns = [
     path('services/', views.service_analytics, name='service_analytics'),
     path('correlations/', views.treatment_correlations, name='treatment_correlations'),
     path('insights/', views.business_insights, name='business_insights'),
+    path('sections/<slug:name>/', views.dashboard_section, name='dashboard_section'),
+    path('export/<slug:name>/', views.export_report, name='export'),
 ]
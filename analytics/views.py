@@ -1,13 +1,23 @@
 from django.shortcuts import render
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+from django.views.decorators.http import require_GET
 from django.db.models import Count, Sum, Avg, Q
-from django.db.models.functions import TruncMonth, TruncWeek
 from datetime import datetime, timedelta
 from .models import PatientAnalytics, ServiceAnalytics, BusinessAnalytics, TreatmentCorrelation, PatientSegment
+from .exports import CONTENT_TYPES, EXPORTS, FORMATS, async_chunks, export_chunks, export_filename
+from .cohorts import monthly_retention
+from .sections import SECTIONS, get_section
+from .timeseries import seasonal_series, time_series
 from accounts.models import User
 from appointments.models import Appointment
+from appointments.ratings import average_subquery
 from services.models import Service
+from beauty_clinic_django.db_routers import read_replica_alias, replica_reads
 from products.models import Product
 from packages.models import Package
 
@@ -19,6 +29,53 @@ def is_owner_or_admin(user):
 
 @login_required
 @user_passes_test(is_owner_or_admin)
+@require_GET
+@replica_reads()
+def dashboard_section(request, name):
+    """One dashboard section as JSON (analytics/sections.py), revalidated by ETag / Last-Modified"""
+    if name not in SECTIONS:
+        raise Http404('Unknown dashboard section')
+    
+    section = get_section(name)
+    response = get_conditional_response(request, etag=section['etag'], last_modified=section['last_modified'])
+    if response is None:
+        response = HttpResponse(section['body'], content_type='application/json')
+    response['ETag'] = section['etag']
+    response['Last-Modified'] = http_date(section['last_modified'])
+    # Revalidate on every load; owner data must not sit in shared caches
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@user_passes_test(is_owner_or_admin)
+@require_GET
+def export_report(request, name):
+    """
+    Stream an export (analytics/exports.py) as CSV or, with ?format=xlsx, as a
+    workbook. Other query parameters are the source page's filters.
+    """
+    if name not in EXPORTS:
+        raise Http404('Unknown export')
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in FORMATS:
+        file_format = 'csv'
+    
+    # The rows are read while the response streams, after this view has
+    # returned, so the database is chosen here rather than by replica_reads()
+    chunks = export_chunks(name, file_format, read_replica_alias(), request.GET.dict())
+    if isinstance(request, ASGIRequest):
+        # A sync iterator would be buffered whole before sending
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = content_disposition_header(True, export_filename(name, file_format))
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@login_required
+@user_passes_test(is_owner_or_admin)
+@replica_reads()
 def analytics_dashboard(request):
     """Comprehensive analytics dashboard with filtering"""
     # Get filter parameters from request
@@ -149,33 +206,18 @@ def analytics_dashboard(request):
         popular_services = Service.objects.none()
     
     # Monthly trends (filtered)
-    monthly_appointments = appointments_qs.extra(
-        select={'month': "strftime('%%Y-%%m', appointment_date)"}
-    ).values('month').annotate(
-        count=Count('id'),
-        revenue=Sum('service__price')
-    ).order_by('month')
+    monthly_appointments = time_series(
+        appointments_qs, 'appointment_date', 'month', filter_start_date, filter_end_date,
+        count=Count('id'), revenue=Sum('service__price'),
+    )
     
     # Status breakdown
     status_breakdown = appointments_qs.values('status').annotate(
         count=Count('id')
     ).order_by('-count')
     
-    # Treatment correlations
-    try:
-        correlations = TreatmentCorrelation.objects.filter(
-            correlation_strength__gte=0.5
-        ).order_by('-correlation_strength')[:10]
-    except Exception:
-        correlations = TreatmentCorrelation.objects.none()
-    
-    # Patient segments
-    try:
-        segments = PatientSegment.objects.values('segment').annotate(
-            count=Count('id')
-        ).order_by('-count')
-    except Exception:
-        segments = []
+    # Treatment correlations, segments and trend charts are unfiltered and
+    # load as JSON sections (analytics/sections.py)
     
     # Get attendants for filter dropdown
     from accounts.models import Attendant
@@ -193,8 +235,6 @@ def analytics_dashboard(request):
         'patient_stats': patient_stats,
         'popular_services': popular_services,
         'monthly_appointments': monthly_appointments,
-        'correlations': correlations,
-        'segments': segments,
         'recent_appointments': recent_appointments,
         'status_breakdown': status_breakdown,
         'attendants': attendants,
@@ -217,6 +257,7 @@ def analytics_dashboard(request):
 
 @login_required
 @user_passes_test(is_owner_or_admin)
+@replica_reads()
 def patient_analytics(request):
     """Detailed patient analytics"""
     # Get filter parameters
@@ -266,6 +307,7 @@ def patient_analytics(request):
 
 @login_required
 @user_passes_test(is_owner_or_admin)
+@replica_reads()
 def service_analytics(request):
     """Service performance analytics"""
     # Service performance metrics
@@ -274,7 +316,7 @@ def service_analytics(request):
         completed_bookings=Count('appointments', filter=Q(appointments__status='completed')),
         cancelled_bookings=Count('appointments', filter=Q(appointments__status='cancelled')),
         total_revenue=Sum('appointments__service__price', filter=Q(appointments__status='completed')),
-        avg_rating=Avg('appointments__feedback__rating', filter=Q(appointments__feedback__isnull=False))
+        avg_rating=average_subquery('service')
     ).order_by('-total_bookings')
     
     # Service categories performance
@@ -285,14 +327,11 @@ def service_analytics(request):
     ).order_by('-total_revenue')
     
     # Seasonal trends
-    seasonal_data = Appointment.objects.filter(
-        appointment_date__gte=timezone.now().date() - timedelta(days=365)
-    ).extra(
-        select={'month': "strftime('%%m', appointment_date)"}
-    ).values('month').annotate(
-        count=Count('id'),
-        revenue=Sum('service__price')
-    ).order_by('month')
+    seasonal_data = seasonal_series(
+        Appointment.objects.filter(appointment_date__gte=timezone.now().date() - timedelta(days=365)),
+        'appointment_date',
+        count=Count('id'), revenue=Sum('service__price'),
+    )
     
     context = {
         'services': services,
@@ -305,6 +344,7 @@ def service_analytics(request):
 
 @login_required
 @user_passes_test(is_owner_or_admin)
+@replica_reads()
 def treatment_correlations(request):
     """Treatment correlation analysis"""
     correlations = TreatmentCorrelation.objects.select_related(
@@ -325,6 +365,7 @@ def treatment_correlations(request):
 
 @login_required
 @user_passes_test(is_owner_or_admin)
+@replica_reads()
 def business_insights(request):
     """Business insights and recommendations"""
     # Calculate key metrics
@@ -334,39 +375,14 @@ def business_insights(request):
     cancellation_rate = (Appointment.objects.filter(status='cancelled').count() / total_appointments * 100) if total_appointments > 0 else 0
     
     # Revenue trends
-    revenue_trend = Appointment.objects.filter(
-        status='completed',
-        appointment_date__gte=timezone.now().date() - timedelta(days=90)
-    ).extra(
-        select={'week': "strftime('%%Y-%%W', appointment_date)"}
-    ).values('week').annotate(
-        revenue=Sum('service__price')
-    ).order_by('week')
-    
-    # Patient retention
-    retention_data = []
-    for i in range(1, 13):  # Last 12 months
-        month_start = timezone.now().date().replace(day=1) - timedelta(days=30*i)
-        month_end = month_start + timedelta(days=30)
-        
-        new_patients = User.objects.filter(
-            user_type='patient',
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-        
-        returning_patients = User.objects.filter(
-            user_type='patient',
-            appointments__appointment_date__gte=month_start,
-            appointments__appointment_date__lt=month_end
-        ).distinct().count()
-        
-        retention_data.append({
-            'month': month_start.strftime('%Y-%m'),
-            'new_patients': new_patients,
-            'returning_patients': returning_patients,
-            'retention_rate': (returning_patients / new_patients * 100) if new_patients > 0 else 0
-        })
+    today = timezone.now().date()
+    revenue_trend = time_series(
+        Appointment.objects.filter(status='completed'), 'appointment_date', 'week',
+        today - timedelta(days=90), today, revenue=Sum('service__price'),
+    )
+    
+    # Patient retention by signup cohort
+    retention_data = monthly_retention()
     
     # Generate insights
     insights = []
@@ -4,11 +4,15 @@ from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Q, Sum
 from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 from .models import Appointment, Notification, ClosedDay
 from accounts.models import User, Attendant, AttendantProfile
 from services.models import Service, ServiceImage
 from products.models import Product, ProductImage
+from products.inventory import fulfil_preorder, get_summary, release_preorders, restock, set_stock
 from services.utils import send_appointment_sms
+from services.uploads import store_upload
+from beauty_clinic_django.db_routers import replica_reads
 
 def is_admin(user):
     """Check if user is staff/admin"""
@@ -236,12 +240,9 @@ def admin_confirm_appointment(request, appointment_id):
         appointment.status = 'confirmed'
         appointment.save()
         
-        # If this is a product pre-order, deduct stock
-        if appointment.product:
-            product = appointment.product
-            if product.stock > 0:
-                product.stock -= 1
-                product.save()
+        # If this is a product pre-order, deduct stock and drop its reservation
+        if appointment.product_id:
+            fulfil_preorder(appointment.product_id, appointment.id, request.user)
         
         # Create notification for patient
         Notification.objects.create(
@@ -282,9 +283,15 @@ def admin_complete_appointment(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
     
     if appointment.status in ['pending', 'confirmed']:
+        was_pending = appointment.status == 'pending'
         appointment.status = 'completed'
         appointment.save()
         
+        # A pre-order completed without being confirmed first still holds its
+        # reservation: hand the unit over now
+        if was_pending and appointment.product_id:
+            fulfil_preorder(appointment.product_id, appointment.id, request.user)
+        
         # Create notification for patient
         Notification.objects.create(
             type='appointment',
@@ -319,6 +326,8 @@ def admin_cancel_appointment(request, appointment_id):
         # Get reason from POST or set default
         reason = request.POST.get('reason', '').strip() if request.method == 'POST' else 'Cancelled by admin'
         
+        # A pending pre-order's reserved unit goes back on sale
+        release_preorders([appointment], request.user)
         appointment.status = 'cancelled'
         appointment.save()
         
@@ -855,228 +864,102 @@ def admin_delete_closed_day(request, closed_day_id):
 @login_required
 @user_passes_test(is_admin)
 def admin_cancellation_requests(request):
-    """Admin view for cancellation and reschedule requests"""
-    from .models import CancellationRequest, RescheduleRequest, Appointment
+    """Admin view for cancellation and reschedule requests, one page of each kind"""
+    from .request_inbox import DEFAULT_PAGE_SIZE, STATUSES, inbox_page, status_counts
     
-    cancellation_requests = CancellationRequest.objects.all().order_by('-created_at')
-    reschedule_requests = RescheduleRequest.objects.all().order_by('-created_at')
+    status = request.GET.get('status', 'pending')
+    if status not in STATUSES and status != 'all':
+        status = 'pending'
     
-    # Get appointments for reschedule requests
-    reschedule_requests_with_appointments = []
-    for reschedule_request in reschedule_requests:
-        try:
-            appointment = Appointment.objects.get(id=reschedule_request.appointment_id)
-            reschedule_requests_with_appointments.append((reschedule_request, appointment))
-        except Appointment.DoesNotExist:
-            reschedule_requests_with_appointments.append((reschedule_request, None))
-    
-    # Get appointments for cancellation requests
-    cancellation_requests_with_appointments = []
-    for cancellation_request in cancellation_requests:
-        try:
-            appointment = Appointment.objects.get(id=cancellation_request.appointment_id)
-            cancellation_requests_with_appointments.append((cancellation_request, appointment))
-        except Appointment.DoesNotExist:
-            cancellation_requests_with_appointments.append((cancellation_request, None))
+    reschedule_page = inbox_page('reschedule', status, request.GET.get('reschedule_after'), DEFAULT_PAGE_SIZE)
+    cancellation_page = inbox_page('cancellation', status, request.GET.get('cancellation_after'), DEFAULT_PAGE_SIZE)
     
     context = {
-        'cancellation_requests': cancellation_requests,
-        'reschedule_requests': reschedule_requests,
-        'reschedule_requests_with_appointments': reschedule_requests_with_appointments,
-        'cancellation_requests_with_appointments': cancellation_requests_with_appointments,
+        'status': status,
+        'statuses': STATUSES,
+        'reschedule_page': reschedule_page,
+        'cancellation_page': cancellation_page,
+        'reschedule_counts': status_counts('reschedule'),
+        'cancellation_counts': status_counts('cancellation'),
+        'paged': 'reschedule_after' in request.GET or 'cancellation_after' in request.GET,
     }
     
     return render(request, 'appointments/admin_reschedules_cancellations.html', context)
 
+
+def _report_decisions(request, kind, decision, result):
+    """Flash messages for the outcome of decide_requests()"""
+    label = 'Cancellation' if kind == 'cancellation' else 'Reschedule'
+    verb = 'approved' if decision == 'approve' else 'rejected'
+    if len(result.decided) == 1:
+        patient = result.decided[0].patient
+        messages.success(request, f'{label} request {verb} for {patient.full_name}.')
+    elif result.decided:
+        messages.success(request, f'{len(result.decided)} {label.lower()} requests {verb}.')
+    for request_id, reason in result.skipped:
+        if reason.startswith('the clinic is closed'):
+            messages.error(request, f'Cannot approve reschedule request #{request_id}: {reason[0].upper()}{reason[1:]}.')
+        elif reason == 'already processed':
+            messages.error(request, f'{label} request #{request_id} has already been processed.')
+        elif reason == 'not found':
+            messages.error(request, f'{label} request #{request_id} was not found.')
+        else:
+            messages.error(request, f'{label} request #{request_id} was skipped: {reason}.')
+
+
+def _decide_one(request, kind, request_id, decision):
+    from .request_inbox import KINDS, decide_requests
+    
+    get_object_or_404(KINDS[kind], id=request_id)
+    result = decide_requests(kind, [request_id], decision, request.user)
+    _report_decisions(request, kind, decision, result)
+    return redirect('appointments:admin_cancellation_requests')
+
+
 @login_required
 @user_passes_test(is_admin)
 def admin_approve_cancellation(request, request_id):
     """Admin approve cancellation request"""
-    from .models import CancellationRequest
-    
-    cancellation_request = get_object_or_404(CancellationRequest, id=request_id)
-    appointment = get_object_or_404(Appointment, id=cancellation_request.appointment_id)
-    
-    if cancellation_request.status == 'pending':
-        # Update cancellation request status
-        cancellation_request.status = 'approved'
-        cancellation_request.save()
-        
-        # Cancel the appointment
-        appointment.status = 'cancelled'
-        appointment.save()
-        
-        # Create notification for patient
-        Notification.objects.create(
-            type='cancellation',
-            appointment_id=appointment.id,
-            title='Cancellation Approved',
-            message=f'Your cancellation request for {appointment.get_service_name()} on {appointment.appointment_date} at {appointment.appointment_time} has been approved.',
-            patient=appointment.patient
-        )
-        
-        messages.success(request, f'Cancellation request approved for {appointment.patient.full_name}.')
-        
-        # Log cancellation approval
-        from .models import HistoryLog
-        HistoryLog.objects.create(
-            action_type='approve',
-            item_type='cancellation_request',
-            item_id=cancellation_request.id,
-            item_name=f"Cancellation Request #{cancellation_request.id} - {appointment.patient.get_full_name()}",
-            performed_by=request.user,
-            details={
-                'appointment_id': appointment.id,
-                'patient': appointment.patient.get_full_name(),
-                'reason': cancellation_request.reason or '',
-            }
-        )
-    else:
-        messages.error(request, 'This cancellation request has already been processed.')
-    
-    return redirect('appointments:admin_cancellation_requests')
+    return _decide_one(request, 'cancellation', request_id, 'approve')
 
 @login_required
 @user_passes_test(is_admin)
 def admin_reject_cancellation(request, request_id):
     """Admin reject cancellation request"""
-    from .models import CancellationRequest
-    
-    cancellation_request = get_object_or_404(CancellationRequest, id=request_id)
-    appointment = get_object_or_404(Appointment, id=cancellation_request.appointment_id)
-    
-    if cancellation_request.status == 'pending':
-        # Update cancellation request status
-        cancellation_request.status = 'rejected'
-        cancellation_request.save()
-        
-        # Create notification for patient
-        Notification.objects.create(
-            type='cancellation',
-            appointment_id=appointment.id,
-            title='Cancellation Request Rejected',
-            message=f'Your cancellation request for {appointment.get_service_name()} on {appointment.appointment_date} at {appointment.appointment_time} has been rejected. Please contact us for more information.',
-            patient=appointment.patient
-        )
-        
-        messages.success(request, f'Cancellation request rejected for {appointment.patient.full_name}.')
-        
-        # Log cancellation rejection
-        from .models import HistoryLog
-        HistoryLog.objects.create(
-            action_type='reject',
-            item_type='cancellation_request',
-            item_id=cancellation_request.id,
-            item_name=f"Cancellation Request #{cancellation_request.id} - {appointment.patient.get_full_name()}",
-            performed_by=request.user,
-            details={
-                'appointment_id': appointment.id,
-                'patient': appointment.patient.get_full_name(),
-                'reason': cancellation_request.reason or '',
-            }
-        )
-    else:
-        messages.error(request, 'This cancellation request has already been processed.')
-    
-    return redirect('appointments:admin_cancellation_requests')
+    return _decide_one(request, 'cancellation', request_id, 'reject')
 
 
 @login_required
 @user_passes_test(is_admin)
 def admin_approve_reschedule(request, request_id):
     """Admin approve reschedule request"""
-    from .models import RescheduleRequest
-    
-    reschedule_request = get_object_or_404(RescheduleRequest, id=request_id)
-    appointment = get_object_or_404(Appointment, id=reschedule_request.appointment_id)
-    
-    if reschedule_request.status == 'pending':
-        # Check if the new date is a closed clinic day
-        if ClosedDay.objects.filter(date=reschedule_request.new_appointment_date).exists():
-            closed_day = ClosedDay.objects.get(date=reschedule_request.new_appointment_date)
-            reason_text = f" ({closed_day.reason})" if closed_day.reason else ""
-            messages.error(request, f'Cannot approve reschedule: The clinic is closed on {reschedule_request.new_appointment_date.strftime("%B %d, %Y")}{reason_text}.')
-            return redirect('appointments:admin_cancellation_requests')
-        
-        # Update reschedule request status
-        reschedule_request.status = 'approved'
-        reschedule_request.save()
-        
-        # Update the appointment with new date and time
-        old_date = appointment.appointment_date
-        old_time = appointment.appointment_time
-        appointment.appointment_date = reschedule_request.new_appointment_date
-        appointment.appointment_time = reschedule_request.new_appointment_time
-        appointment.status = 'pending'  # Set to pending after reschedule
-        appointment.save()
-        
-        # Create notification for patient
-        Notification.objects.create(
-            type='reschedule',
-            appointment_id=appointment.id,
-            title='Reschedule Request Approved',
-            message=f'Your reschedule request for {appointment.get_service_name()} has been approved. New date and time: {reschedule_request.new_appointment_date} at {reschedule_request.new_appointment_time}.',
-            patient=appointment.patient
-        )
-        
-        messages.success(request, f'Reschedule request approved for {appointment.patient.full_name}.')
-        
-        # Log reschedule approval
-        log_appointment_history('reschedule', appointment, request.user, {
-            'old_date': str(old_date),
-            'old_time': str(old_time),
-            'new_date': str(reschedule_request.new_appointment_date),
-            'new_time': str(reschedule_request.new_appointment_time),
-            'reschedule_request_id': reschedule_request.id,
-        })
-    else:
-        messages.error(request, 'This reschedule request has already been processed.')
-    
-    return redirect('appointments:admin_cancellation_requests')
+    return _decide_one(request, 'reschedule', request_id, 'approve')
 
 
 @login_required
 @user_passes_test(is_admin)
 def admin_reject_reschedule(request, request_id):
     """Admin reject reschedule request"""
-    from .models import RescheduleRequest
-    
-    reschedule_request = get_object_or_404(RescheduleRequest, id=request_id)
-    appointment = get_object_or_404(Appointment, id=reschedule_request.appointment_id)
-    
-    if reschedule_request.status == 'pending':
-        # Update reschedule request status
-        reschedule_request.status = 'rejected'
-        reschedule_request.save()
-        
-        # Create notification for patient
-        Notification.objects.create(
-            type='reschedule',
-            appointment_id=appointment.id,
-            title='Reschedule Request Rejected',
-            message=f'Your reschedule request for {appointment.get_service_name()} on {appointment.appointment_date} at {appointment.appointment_time} has been rejected. Please contact us for more information.',
-            patient=appointment.patient
-        )
-        
-        messages.success(request, f'Reschedule request rejected for {appointment.patient.full_name}.')
-        
-        # Log reschedule rejection
-        from .models import HistoryLog
-        HistoryLog.objects.create(
-            action_type='reject',
-            item_type='reschedule_request',
-            item_id=reschedule_request.id,
-            item_name=f"Reschedule Request #{reschedule_request.id} - {appointment.patient.get_full_name()}",
-            performed_by=request.user,
-            details={
-                'appointment_id': appointment.id,
-                'patient': appointment.patient.get_full_name(),
-                'requested_date': str(reschedule_request.new_appointment_date),
-                'requested_time': str(reschedule_request.new_appointment_time),
-            }
-        )
+    return _decide_one(request, 'reschedule', request_id, 'reject')
+
+
+@login_required
+@user_passes_test(is_admin)
+@require_POST
+def admin_bulk_decide_requests(request):
+    """Admin approve or reject the selected requests of one kind in one transaction"""
+    from .request_inbox import DECISIONS, KINDS, decide_requests
+    
+    kind = request.POST.get('kind')
+    decision = request.POST.get('decision')
+    request_ids = [pk for pk in request.POST.getlist('request_ids') if pk.isdigit()]
+    if kind not in KINDS or decision not in DECISIONS:
+        messages.error(request, 'Unknown bulk action.')
+    elif not request_ids:
+        messages.error(request, 'Select at least one request.')
     else:
-        messages.error(request, 'This reschedule request has already been processed.')
+        result = decide_requests(kind, request_ids, decision, request.user)
+        _report_decisions(request, kind, decision, result)
     
     return redirect('appointments:admin_cancellation_requests')
 
@@ -1101,12 +984,10 @@ def admin_manage_service_images(request):
                 if is_primary:
                     ServiceImage.objects.filter(service=service, is_primary=True).update(is_primary=False)
                 
-                ServiceImage.objects.create(
-                    service=service,
-                    image=image,
-                    alt_text=alt_text,
-                    is_primary=is_primary
-                )
+                service_image = ServiceImage(service=service, alt_text=alt_text, is_primary=is_primary)
+                # Hashed while uploading; identical files reuse the stored copy
+                service_image.image = store_upload(service_image, 'image', image)
+                service_image.save()
                 messages.success(request, f'Image uploaded successfully for {service.service_name}')
             else:
                 messages.error(request, 'Please select an image to upload')
@@ -1137,12 +1018,10 @@ def admin_manage_product_images(request):
                 if is_primary:
                     ProductImage.objects.filter(product=product, is_primary=True).update(is_primary=False)
                 
-                ProductImage.objects.create(
-                    product=product,
-                    image=image,
-                    alt_text=alt_text,
-                    is_primary=is_primary
-                )
+                product_image = ProductImage(product=product, alt_text=alt_text, is_primary=is_primary)
+                # Hashed while uploading; identical files reuse the stored copy
+                product_image.image = store_upload(product_image, 'image', image)
+                product_image.save()
                 messages.success(request, f'Image uploaded successfully for {product.product_name}')
             else:
                 messages.error(request, 'Please select an image to upload')
@@ -1230,28 +1109,25 @@ def admin_view_feedback(request):
 @user_passes_test(is_admin)
 def admin_inventory(request):
     """Staff inventory management for products"""
-    products = Product.objects.all().order_by('product_name')
+    from products.inventory import LOW_STOCK_THRESHOLD
     
-    # Get low stock products (stock < 10)
-    low_stock_products = products.filter(stock__lt=10)
+    products = Product.objects.all().order_by('product_name')
     
-    # Get out of stock products
-    out_of_stock_products = products.filter(stock=0)
+    # Statistics come from the inventory summary row (kept current by products.inventory)
+    summary = get_summary()
     
-    # Statistics
-    total_products = products.count()
-    total_stock_value = sum(p.price * p.stock for p in products)
-    low_stock_count = low_stock_products.count()
-    out_of_stock_count = out_of_stock_products.count()
+    # Alert lists only when the summary says there is something to list
+    low_stock_products = products.filter(stock__lt=LOW_STOCK_THRESHOLD) if summary.low_stock_count else Product.objects.none()
+    out_of_stock_products = products.filter(stock__lte=0) if summary.out_of_stock_count else Product.objects.none()
     
     context = {
         'products': products,
         'low_stock_products': low_stock_products,
         'out_of_stock_products': out_of_stock_products,
-        'total_products': total_products,
-        'total_stock_value': total_stock_value,
-        'low_stock_count': low_stock_count,
-        'out_of_stock_count': out_of_stock_count,
+        'total_products': summary.total_products,
+        'total_stock_value': summary.total_value,
+        'low_stock_count': summary.low_stock_count,
+        'out_of_stock_count': summary.out_of_stock_count,
     }
     
     return render(request, 'appointments/admin_inventory.html', context)
@@ -1294,6 +1170,7 @@ def log_appointment_history(action_type, appointment, performed_by, details=None
 
 @login_required
 @user_passes_test(is_admin)
+@replica_reads()
 def admin_history_log(request):
     """Admin view for history log with filtering"""
     from services.models import HistoryLog
@@ -1430,22 +1307,17 @@ def admin_update_stock(request, product_id):
             messages.error(request, 'Quantity cannot be negative.')
             return redirect('appointments:admin_inventory')
         
+        # Applied in the database, so concurrent pre-orders and restocks are not lost
         if action == 'add':
-            product.stock += quantity
+            product.stock = restock(product.id, quantity, request.user)
             messages.success(request, f'Added {quantity} unit{"s" if quantity != 1 else ""} to {product.product_name}. New stock: {product.stock}')
         elif action == 'set':
-            product.stock = quantity
+            product.stock = set_stock(product.id, quantity, request.user)
             messages.success(request, f'Stock for {product.product_name} set to {quantity}')
         else:
             messages.error(request, 'Unknown stock action. Please try again.')
             return redirect('appointments:admin_inventory')
         
-        if product.stock < 0:
-            product.stock = 0
-            messages.warning(request, f'Stock for {product.product_name} cannot go below zero. Reset to 0.')
-        
-        product.save()
-        
         # Check if product is now available for pre-ordering
         if product.stock > 0 and product.stock < 10:
             messages.warning(request, f'{product.product_name} is running low on stock ({product.stock} units remaining).')
@@ -1677,10 +1549,14 @@ def admin_manage_products(request):
             price = request.POST.get('price')
             if price:
                 product.price = price
+            # Stock goes through the ledger; a full save would overwrite concurrent reservations
+            product.save(update_fields=['product_name', 'description', 'price', 'updated_at'])
             stock = request.POST.get('stock') or request.POST.get('stock_quantity')
             if stock is not None:
-                product.stock = stock
-            product.save()
+                try:
+                    set_stock(product.id, max(int(stock), 0), request.user)
+                except ValueError:
+                    messages.error(request, 'Please enter a valid whole number for the stock.')
             log_admin_history('Product', product.product_name, 'Edited', request.user.get_full_name() or request.user.username,
                        f'Updated: {old_name} -> {product.product_name}', product.id)
             messages.success(request, 'Product updated successfully!')
@@ -1690,7 +1566,7 @@ def admin_manage_products(request):
             product = get_object_or_404(Product, id=product_id)
             product_name = product.product_name
             product.archived = True
-            product.save()
+            product.save(update_fields=['archived', 'updated_at'])
             log_admin_history('Product', product_name, 'Deleted', request.user.get_full_name() or request.user.username,
                        f'Product archived', product.id)
             messages.success(request, 'Product archived successfully!')
@@ -1,30 +1,32 @@
 from .models import Notification
 from django.db.models import Q
+from django.utils.functional import SimpleLazyObject
+
+
+def unread_notification_count(user):
+    """Unread notifications shown to a user"""
+    if not user.is_authenticated:
+        return 0
+    if user.user_type == 'admin':
+        # For admin/staff, show all system notifications (where patient is null)
+        return Notification.objects.filter(patient__isnull=True, is_read=False).count()
+    elif user.user_type == 'owner':
+        # For owner, show all system notifications (where patient is null)
+        return Notification.objects.filter(patient__isnull=True, is_read=False).count()
+    elif user.user_type == 'attendant':
+        # For attendant, show notifications assigned to them or system notifications
+        return Notification.objects.filter(
+            (Q(patient=user) | Q(patient__isnull=True)),
+            is_read=False
+        ).count()
+    # For patients, show their notifications
+    return Notification.objects.filter(patient=user, is_read=False).count()
 
 
 def notification_count(request):
     """Add notification count to all templates"""
-    if request.user.is_authenticated:
-        if request.user.user_type == 'admin':
-            # For admin/staff, show all system notifications (where patient is null)
-            count = Notification.objects.filter(patient__isnull=True, is_read=False).count()
-        elif request.user.user_type == 'owner':
-            # For owner, show all system notifications (where patient is null)
-            count = Notification.objects.filter(patient__isnull=True, is_read=False).count()
-        elif request.user.user_type == 'attendant':
-            # For attendant, show notifications assigned to them or system notifications
-            count = Notification.objects.filter(
-                (Q(patient=request.user) | Q(patient__isnull=True)),
-                is_read=False
-            ).count()
-        else:
-            # For patients, show their notifications
-            count = Notification.objects.filter(patient=request.user, is_read=False).count()
-    else:
-        count = 0
-    
+    # Counted only when a template shows it: the patient and owner layouts and the
+    # attendant dashboard do, the admin and other attendant pages skip the query
     return {
-        'notification_count': count
+        'notification_count': SimpleLazyObject(lambda: unread_notification_count(request.user))
     }
-
-
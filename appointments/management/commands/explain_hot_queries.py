@@ -0,0 +1,125 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+# SQLite: "SCAN appointments" is a full table scan, "SCAN appointments USING INDEX x"
+# walks an index, "SEARCH ..." is an index lookup
+_SQLITE_SCAN_RE = re.compile(r'\bSCAN (?!.*\bUSING (?:COVERING )?INDEX\b)(?:TABLE )?"?(\w+)"?')
+_POSTGRES_SCAN_RE = re.compile(r'Seq Scan on "?(\w+)"?')
+
+
+def sequential_scans(plan, vendor):
+    """Tables read by a full/sequential scan according to an EXPLAIN plan"""
+    pattern = _POSTGRES_SCAN_RE if vendor == 'postgresql' else _SQLITE_SCAN_RE
+    tables = []
+    for line in plan.splitlines():
+        match = pattern.search(line)
+        if match and match.group(1) not in tables:
+            tables.append(match.group(1))
+    return tables
+
+
+def hot_queries():
+    """
+    The querysets behind the busiest views and services, as (name, source, queryset).
+
+    Parameters are taken from existing rows where possible; EXPLAIN does not
+    need the rows to exist.
+    """
+    from accounts.models import Attendant, AttendantLeaveRequest, User
+    from appointments.models import Appointment, Notification
+    from packages.models import PackageBooking
+
+    today = timezone.now().date()
+    patient_id = User.objects.filter(user_type='patient').values_list('id', flat=True).first() or 1
+    attendant_id = Attendant.objects.values_list('id', flat=True).first() or 1
+    slot = Appointment.objects.values_list('appointment_date', 'appointment_time').first() or (today, '10:00')
+    active = ['pending', 'confirmed']
+
+    return [
+        ('booking slot capacity', 'appointments.views.book_service',
+         Appointment.objects.filter(appointment_date=slot[0], appointment_time=slot[1],
+                                    attendant_id=attendant_id, status__in=active)),
+        ('attendant schedule', 'attendant.views',
+         Appointment.objects.filter(attendant_id=attendant_id, appointment_date__gte=today, status__in=active)
+         .order_by('appointment_date', 'appointment_time')),
+        ('patient completed appointments', 'analytics.services.get_patient_analytics',
+         Appointment.objects.filter(patient_id=patient_id, status='completed')),
+        ('patient appointment history', 'appointments.views.my_appointments',
+         Appointment.objects.filter(patient_id=patient_id).order_by('-created_at', '-appointment_date', '-appointment_time')),
+        ('recent completed revenue', 'analytics.services.get_business_overview',
+         Appointment.objects.filter(status='completed', appointment_date__gte=today - timedelta(days=30))),
+        ('upcoming week', 'attendant.views.attendant_dashboard',
+         Appointment.objects.filter(appointment_date__gte=today, appointment_date__lte=today + timedelta(days=7),
+                                    status__in=active, attendant__isnull=False)
+         .order_by('appointment_date', 'appointment_time')),
+        ('staff pending count', 'appointments.admin_views.admin_dashboard',
+         Appointment.objects.filter(status='pending', product__isnull=True)),
+        ('staff pre-orders', 'appointments.admin_views.admin_dashboard',
+         Appointment.objects.filter(product__isnull=False).order_by('-appointment_date', '-appointment_time')[:10]),
+        ('patient unread notifications', 'appointments.context_processors',
+         Notification.objects.filter(patient_id=patient_id, is_read=False)),
+        ('patient notification feed', 'appointments.views.get_notifications_api',
+         Notification.objects.filter(patient_id=patient_id).order_by('-created_at')[:10]),
+        ('staff unread notifications', 'appointments.views.get_notifications_api',
+         Notification.objects.filter(patient__isnull=True, is_read=False).order_by('-created_at')[:10]),
+        ('patient package bookings', 'packages.views.my_packages',
+         PackageBooking.objects.filter(patient_id=patient_id).order_by('-created_at')),
+        ('leave request queue', 'owner.leave_views.list_leave_requests',
+         AttendantLeaveRequest.objects.filter(status='pending').order_by('-leave_date')),
+        ('approved leave on a day', 'owner.leave_views.approve_leave_request',
+         AttendantLeaveRequest.objects.filter(leave_date=today, status='approved')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN plans for the hot view/service querysets and flag sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-k', dest='pattern', default='', help='Only explain queries whose name contains this text')
+        parser.add_argument('--analyze', action='store_true',
+                            help='EXPLAIN ANALYZE (PostgreSQL only; runs the queries)')
+        parser.add_argument('--sql', action='store_true', help='Also print the SQL of each query')
+        parser.add_argument('--fail-on-seq-scan', action='store_true',
+                            help='Exit with an error if any query scans a whole table')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Sequential scan detection supports SQLite and PostgreSQL, not {vendor}')
+        explain_options = {}
+        if options['analyze']:
+            if vendor != 'postgresql':
+                raise CommandError('--analyze is only supported on PostgreSQL')
+            explain_options = {'analyze': True, 'buffers': True}
+
+        flagged = []
+        queries = [q for q in hot_queries() if options['pattern'] in q[0]]
+        for name, source, queryset in queries:
+            plan = queryset.explain(**explain_options)
+            scans = sequential_scans(plan, vendor)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}  [{source}]'))
+            if options['sql']:
+                self.stdout.write(f'  {queryset.query}')
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"  ⚠ sequential scan on {', '.join(scans)}"))
+            self.stdout.write('')
+
+        if vendor == 'postgresql':
+            self.stdout.write(
+                'Note: PostgreSQL prefers sequential scans on small tables; run ANALYZE and check '
+                'against production-sized data (manage.py generate_dataset) before adding indexes.'
+            )
+        if flagged:
+            message = f"{len(flagged)} of {len(queries)} queries scan a whole table: {', '.join(flagged)}"
+            if options['fail_on_seq_scan']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ No sequential scans in {len(queries)} queries'))
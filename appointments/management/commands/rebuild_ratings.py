@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from appointments.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the attendant and service rating aggregates from the feedback table'
+
+    def handle(self, *args, **options):
+        counts = rebuild_ratings()
+        self.stdout.write(f"{counts['summaries']} subjects, {counts['days']} daily rows")
+        self.stdout.write(self.style.SUCCESS('✓ Rating aggregates rebuilt'))
@@ -0,0 +1,37 @@
+# Generated manually: composite and partial indexes for hot appointment/notification filters
+# (only the index operations; see explain_hot_queries)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0014_create_treatment_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['attendant', 'appointment_date', 'appointment_time', 'status'], name='appt_attendant_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'status'], name='appt_patient_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'appointment_date'], name='appt_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('product__isnull', False)), fields=['-appointment_date', '-appointment_time'], name='appt_preorder_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['patient', 'is_read', '-created_at'], name='notif_patient_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('patient__isnull', True)), fields=['is_read', '-created_at'], name='notif_staff_read_idx'),
+        ),
+    ]
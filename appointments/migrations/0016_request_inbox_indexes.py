@@ -0,0 +1,32 @@
+# Generated manually: indexes for the staff request inbox (see request_inbox)
+from django.db import migrations, models
+
+RESCHEDULE_TABLE = 'reschedule_requests'
+
+
+def create_reschedule_index(apps, schema_editor):
+    # RescheduleRequest's table predates these migrations and no migration
+    # creates it (see 0013), so databases set up from migrations may lack it
+    if RESCHEDULE_TABLE in schema_editor.connection.introspection.table_names():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS resched_req_status_idx ON {RESCHEDULE_TABLE} (status, created_at DESC, id DESC)'
+        )
+
+
+def drop_reschedule_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS resched_req_status_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cancellationrequest',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='cancel_req_status_idx'),
+        ),
+        migrations.RunPython(create_reschedule_index, drop_reschedule_index),
+    ]
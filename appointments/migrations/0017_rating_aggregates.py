@@ -0,0 +1,47 @@
+# Generated manually: running rating aggregates (see appointments.ratings)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0016_request_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_type', models.CharField(choices=[('attendant', 'Attendant'), ('service', 'Service')], max_length=10)),
+                ('subject_id', models.IntegerField()),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_total', models.IntegerField(default=0)),
+                ('stars_1', models.IntegerField(default=0)),
+                ('stars_2', models.IntegerField(default=0)),
+                ('stars_3', models.IntegerField(default=0)),
+                ('stars_4', models.IntegerField(default=0)),
+                ('stars_5', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'rating_summaries',
+                'constraints': [models.UniqueConstraint(fields=('subject_type', 'subject_id'), name='rating_summary_subject_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RatingDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_type', models.CharField(choices=[('attendant', 'Attendant'), ('service', 'Service')], max_length=10)),
+                ('subject_id', models.IntegerField()),
+                ('day', models.DateField()),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_total', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'rating_days',
+                'constraints': [models.UniqueConstraint(fields=('subject_type', 'subject_id', 'day'), name='rating_day_subject_uniq')],
+            },
+        ),
+    ]
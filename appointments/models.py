@@ -43,6 +43,20 @@ class Appointment(models.Model):
     class Meta:
         db_table = 'appointments'
         ordering = ['-created_at']
+        indexes = [
+            # Slot capacity checks when booking, attendant schedules
+            models.Index(fields=['attendant', 'appointment_date', 'appointment_time', 'status'], name='appt_attendant_slot_idx'),
+            # Patient history and "completed appointments" lookups
+            models.Index(fields=['patient', 'status'], name='appt_patient_status_idx'),
+            # Analytics and dashboards: status filters over a date range
+            models.Index(fields=['status', 'appointment_date'], name='appt_status_date_idx'),
+            # Staff pre-order list (product bookings only)
+            models.Index(
+                fields=['-appointment_date', '-appointment_time'],
+                name='appt_preorder_date_idx',
+                condition=models.Q(product__isnull=False),
+            ),
+        ]
     
     def __str__(self):
         return f"Appointment {self.id} - {self.patient.get_full_name()}"
@@ -83,6 +97,10 @@ class CancellationRequest(models.Model):
     
     class Meta:
         db_table = 'cancellation_requests'
+        indexes = [
+            # Staff inbox: filter by status, keyset paging newest first
+            models.Index(fields=['status', '-created_at', '-id'], name='cancel_req_status_idx'),
+        ]
     
     def __str__(self):
         return f"Cancellation Request {self.id} - {self.patient.get_full_name()}"
@@ -108,6 +126,10 @@ class RescheduleRequest(models.Model):
     
     class Meta:
         db_table = 'reschedule_requests'
+        indexes = [
+            # Staff inbox: filter by status, keyset paging newest first
+            models.Index(fields=['status', '-created_at', '-id'], name='resched_req_status_idx'),
+        ]
     
     def __str__(self):
         return f"Reschedule Request {self.id} - {self.patient.get_full_name()}"
@@ -130,6 +152,61 @@ class Feedback(models.Model):
     def __str__(self):
         return f"Feedback {self.id} - Rating: {self.rating}/5"
 
+
+class RatingSummary(models.Model):
+    """Running rating totals of an attendant or service (see appointments.ratings)"""
+    SUBJECT_CHOICES = [
+        ('attendant', 'Attendant'),
+        ('service', 'Service'),
+    ]
+    
+    subject_type = models.CharField(max_length=10, choices=SUBJECT_CHOICES)
+    subject_id = models.IntegerField()
+    rating_count = models.IntegerField(default=0)
+    rating_total = models.IntegerField(default=0)
+    stars_1 = models.IntegerField(default=0)
+    stars_2 = models.IntegerField(default=0)
+    stars_3 = models.IntegerField(default=0)
+    stars_4 = models.IntegerField(default=0)
+    stars_5 = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'rating_summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['subject_type', 'subject_id'], name='rating_summary_subject_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_subject_type_display()} {self.subject_id}: {self.average or '-'} ({self.rating_count})"
+    
+    @property
+    def average(self):
+        return round(self.rating_total / self.rating_count, 2) if self.rating_count else None
+    
+    @property
+    def histogram(self):
+        """[(stars, count)] from 5 stars down to 1"""
+        return [(stars, getattr(self, f'stars_{stars}')) for stars in range(5, 0, -1)]
+
+
+class RatingDay(models.Model):
+    """Ratings of an attendant or service received on one day, for recent-window averages"""
+    subject_type = models.CharField(max_length=10, choices=RatingSummary.SUBJECT_CHOICES)
+    subject_id = models.IntegerField()
+    day = models.DateField()
+    rating_count = models.IntegerField(default=0)
+    rating_total = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'rating_days'
+        constraints = [
+            models.UniqueConstraint(fields=['subject_type', 'subject_id', 'day'], name='rating_day_subject_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject_type} {self.subject_id} on {self.day}: {self.rating_count}"
+
 class Notification(models.Model):
     """Notification model"""
     TYPE_CHOICES = [
@@ -155,6 +232,16 @@ class Notification(models.Model):
     class Meta:
         db_table = 'notifications'
         ordering = ['-created_at']
+        indexes = [
+            # Patient notification dropdown / unread badge
+            models.Index(fields=['patient', 'is_read', '-created_at'], name='notif_patient_read_idx'),
+            # Staff/owner notifications have no patient
+            models.Index(
+                fields=['is_read', '-created_at'],
+                name='notif_staff_read_idx',
+                condition=models.Q(patient__isnull=True),
+            ),
+        ]
     
     def __str__(self):
         return f"Notification {self.id} - {self.title}"
@@ -0,0 +1,136 @@
+"""
+Running rating aggregates for attendants and services.
+
+Averages used to be computed by joining feedback onto appointments on every
+dashboard and analytics load. Instead each subject (an attendant, rated by
+Feedback.attendant_rating, or a service, rated by Feedback.rating) keeps one
+RatingSummary row with the count, sum and 1-5 star histogram, and one
+RatingDay row per day it was rated for recent-window averages:
+
+- record_feedback() adds a new feedback's ratings with F() upserts, in the
+  same transaction as the feedback itself (submit_feedback)
+- rating_summary() / summaries() read the rows by subject in one query;
+  average_subquery() annotates a queryset with the stored average
+- rebuild_ratings() (`manage.py rebuild_ratings`) recomputes every row from
+  the feedback table in one grouped query per subject type; run it after
+  feedback is edited or deleted outside submit_feedback (the admin)
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Feedback, RatingDay, RatingSummary
+
+RECENT_DAYS = 30
+
+# subject type -> (Feedback field holding the rating, path to the subject id)
+SUBJECTS = {
+    'attendant': ('attendant_rating', 'appointment__attendant_id'),
+    'service': ('rating', 'appointment__service_id'),
+}
+
+
+def _subject_ratings(feedback, appointment):
+    """[(subject_type, subject_id, rating)] a feedback contributes to"""
+    ratings = []
+    if feedback.attendant_rating and appointment.attendant_id:
+        ratings.append(('attendant', appointment.attendant_id, feedback.attendant_rating))
+    if feedback.rating and appointment.service_id:
+        ratings.append(('service', appointment.service_id, feedback.rating))
+    return ratings
+
+
+def _upsert(model, lookup, changes, **values):
+    """Add changes (field -> amount) to the row matching lookup, creating it if missing"""
+    increments = {name: F(name) + amount for name, amount in changes.items()}
+    increments.update(values)
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **changes)
+    except IntegrityError:
+        # Another feedback created the row first
+        model.objects.filter(**lookup).update(**increments)
+
+
+def record_feedback(feedback, appointment=None):
+    """Add a newly created feedback's ratings to its attendant's and service's aggregates"""
+    appointment = appointment or feedback.appointment
+    day = timezone.localdate(feedback.created_at)
+    with transaction.atomic():
+        for subject_type, subject_id, rating in _subject_ratings(feedback, appointment):
+            subject = {'subject_type': subject_type, 'subject_id': subject_id}
+            _upsert(RatingSummary, subject, {'rating_count': 1, 'rating_total': rating, f'stars_{rating}': 1},
+                    updated_at=timezone.now())
+            _upsert(RatingDay, {**subject, 'day': day}, {'rating_count': 1, 'rating_total': rating})
+
+
+def rating_summary(subject_type, subject_id):
+    """A subject's RatingSummary, or an unsaved empty one if it has no ratings yet"""
+    summary = RatingSummary.objects.filter(subject_type=subject_type, subject_id=subject_id).first()
+    return summary or RatingSummary(subject_type=subject_type, subject_id=subject_id)
+
+
+def summaries(subject_type, subject_ids=None):
+    """{subject id: RatingSummary} for the given subjects (all of the type if None)"""
+    rows = RatingSummary.objects.filter(subject_type=subject_type)
+    if subject_ids is not None:
+        rows = rows.filter(subject_id__in=subject_ids)
+    return {row.subject_id: row for row in rows}
+
+
+def combined_average(rows):
+    """Average over several subjects' summaries, weighted by their rating counts"""
+    count = sum(row.rating_count for row in rows)
+    return round(sum(row.rating_total for row in rows) / count, 2) if count else None
+
+
+def recent_average(subject_type, subject_id, days=RECENT_DAYS):
+    """(average, count) of a subject's ratings over the last `days` days"""
+    totals = RatingDay.objects.filter(
+        subject_type=subject_type, subject_id=subject_id,
+        day__gt=timezone.localdate() - timedelta(days=days),
+    ).aggregate(count=Coalesce(Sum('rating_count'), 0), total=Coalesce(Sum('rating_total'), 0))
+    if not totals['count']:
+        return None, 0
+    return round(totals['total'] / totals['count'], 2), totals['count']
+
+
+def average_subquery(subject_type, ref='pk'):
+    """Subquery of the stored average rating of the subject whose id is OuterRef(ref)"""
+    return Subquery(
+        RatingSummary.objects.filter(
+            subject_type=subject_type, subject_id=OuterRef(ref), rating_count__gt=0,
+        ).annotate(
+            average=Cast('rating_total', FloatField()) / F('rating_count'),
+        ).values('average')[:1],
+        output_field=FloatField(),
+    )
+
+
+def rebuild_ratings():
+    """Recompute every summary and daily row from the feedback table; returns the row counts"""
+    summary_rows, day_rows = [], []
+    for subject_type, (field, subject_path) in SUBJECTS.items():
+        rated = Feedback.objects.filter(**{f'{field}__isnull': False, f'{subject_path}__isnull': False})
+        for row in rated.values(subject_id=F(subject_path)).annotate(
+            rating_count=Count('id'),
+            rating_total=Sum(field),
+            **{f'stars_{stars}': Count('id', filter=Q(**{field: stars})) for stars in range(1, 6)},
+        ).order_by():
+            summary_rows.append(RatingSummary(subject_type=subject_type, **row))
+        for row in rated.values(subject_id=F(subject_path), day=TruncDate('created_at')).annotate(
+            rating_count=Count('id'), rating_total=Sum(field),
+        ).order_by():
+            day_rows.append(RatingDay(subject_type=subject_type, **row))
+
+    with transaction.atomic():
+        RatingSummary.objects.all().delete()
+        RatingDay.objects.all().delete()
+        RatingSummary.objects.bulk_create(summary_rows, batch_size=500)
+        RatingDay.objects.bulk_create(day_rows, batch_size=500)
+    return {'summaries': len(summary_rows), 'days': len(day_rows)}
@@ -0,0 +1,304 @@
+"""
+Staff inbox for patients' cancellation and reschedule requests.
+
+A request only stores appointment_id (a bare IntegerField), so listing them by
+loading each appointment costs a query per request. The inbox reads one page
+at a time instead:
+
+- requests are filtered by status in the database and paged by keyset on
+  (created_at, id), newest first, so a page costs the same deep into a backlog
+- the appointments a page refers to are loaded in one in_bulk() query, with
+  patient, attendant and service/product/package joined
+
+    page = inbox_page('cancellation', status='pending', cursor=request.GET.get('after'))
+    for cancellation_request, appointment in page.items: ...
+    page.next_cursor  # None on the last page
+
+decide_requests() approves or rejects any number of pending requests in one
+transaction, writing the appointment changes, patient notifications and
+history rows in batches. The appointment changes are bulk UPDATEs, so
+Appointment's post_save is sent explicitly for each changed appointment.
+"""
+import base64
+import binascii
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from products.inventory import release_preorders
+
+from .models import Appointment, CancellationRequest, ClosedDay, HistoryLog, Notification, RescheduleRequest
+
+KINDS = {
+    'cancellation': CancellationRequest,
+    'reschedule': RescheduleRequest,
+}
+STATUSES = ('pending', 'approved', 'rejected')
+DECISIONS = {'approve': 'approved', 'reject': 'rejected'}
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+@dataclass
+class InboxPage:
+    kind: str
+    status: str
+    items: list  # (request, appointment or None)
+    next_cursor: str = None
+
+
+@dataclass
+class DecisionResult:
+    decided: list = field(default_factory=list)  # requests approved or rejected
+    skipped: list = field(default_factory=list)  # (request id, reason)
+
+
+def encode_cursor(created_at, pk):
+    """Opaque cursor for the position after a request"""
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _appointments(ids):
+    return Appointment.objects.select_related(
+        'patient', 'attendant', 'service', 'product', 'package',
+    ).in_bulk(set(ids))
+
+
+def inbox_page(kind, status='pending', cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """One page of requests of a kind and status, newest first, with their appointments"""
+    model = KINDS[kind]
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    requests = model.objects.select_related('patient').order_by('-created_at', '-id')
+    if status in STATUSES:
+        requests = requests.filter(status=status)
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        requests = requests.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    # One row past the page tells whether there is a next one
+    rows = list(requests[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    appointments = _appointments(row.appointment_id for row in rows)
+    return InboxPage(kind, status, [(row, appointments.get(row.appointment_id)) for row in rows], next_cursor)
+
+
+def status_counts(kind):
+    """Number of requests of a kind per status"""
+    counts = dict.fromkeys(STATUSES, 0)
+    for row in KINDS[kind].objects.values('status').annotate(total=Count('id')).order_by():
+        counts[row['status']] = row['total']
+    return counts
+
+
+def _appointment_name(appointment):
+    name = appointment.get_service_name()
+    if name == 'No service assigned':
+        return f'Appointment #{appointment.id}'
+    return name
+
+
+def _history_row(action_type, item_type, item_id, item_name, performed_by, details):
+    return HistoryLog(
+        action_type=action_type, item_type=item_type, item_id=item_id,
+        item_name=item_name, performed_by=performed_by, details=details,
+    )
+
+
+def _send_post_save(appointments, update_fields):
+    # bulk update() / bulk_update() skip the model signals; receivers such as
+    # the cohort cache still need to hear about the change
+    for appointment in appointments:
+        post_save.send(
+            sender=Appointment, instance=appointment, created=False, update_fields=frozenset(update_fields),
+            raw=False, using=appointment._state.db,
+        )
+
+
+def _decide_cancellations(requests, appointments, decision, performed_by):
+    notifications, history = [], []
+    cancelled = []
+    for cancellation_request in requests:
+        appointment = appointments[cancellation_request.appointment_id]
+        when = f'{appointment.appointment_date} at {appointment.appointment_time}'
+        if decision == 'approve':
+            cancelled.append(appointment)
+            title = 'Cancellation Approved'
+            message = (f'Your cancellation request for {appointment.get_service_name()} on {when} '
+                       f'has been approved.')
+        else:
+            title = 'Cancellation Request Rejected'
+            message = (f'Your cancellation request for {appointment.get_service_name()} on {when} '
+                       f'has been rejected. Please contact us for more information.')
+        notifications.append(Notification(
+            type='cancellation', appointment_id=appointment.id, title=title, message=message,
+            patient=appointment.patient,
+        ))
+        history.append(_history_row(
+            decision, 'cancellation_request', cancellation_request.id,
+            f'Cancellation Request #{cancellation_request.id} - {appointment.patient.get_full_name()}',
+            performed_by,
+            {
+                'appointment_id': appointment.id,
+                'patient': appointment.patient.get_full_name(),
+                'reason': cancellation_request.reason or '',
+            },
+        ))
+    if cancelled:
+        # Pending pre-orders' reserved units go back on sale
+        release_preorders(cancelled, performed_by)
+        now = timezone.now()
+        Appointment.objects.filter(id__in=[a.id for a in cancelled]).update(status='cancelled', updated_at=now)
+        for appointment in cancelled:
+            appointment.status, appointment.updated_at = 'cancelled', now
+        _send_post_save(cancelled, ['status', 'updated_at'])
+    return notifications, history
+
+
+def _decide_reschedules(requests, appointments, decision, performed_by):
+    notifications, history = [], []
+    rescheduled = []
+    for reschedule_request in requests:
+        appointment = appointments[reschedule_request.appointment_id]
+        new_date = reschedule_request.new_appointment_date
+        new_time = reschedule_request.new_appointment_time
+        if decision == 'approve':
+            old_date, old_time = appointment.appointment_date, appointment.appointment_time
+            appointment.appointment_date = new_date
+            appointment.appointment_time = new_time
+            appointment.status = 'pending'  # Set to pending after reschedule
+            rescheduled.append(appointment)
+            notifications.append(Notification(
+                type='reschedule', appointment_id=appointment.id, title='Reschedule Request Approved',
+                message=(f'Your reschedule request for {appointment.get_service_name()} has been approved. '
+                         f'New date and time: {new_date} at {new_time}.'),
+                patient=appointment.patient,
+            ))
+            # Same entry as log_appointment_history('reschedule', ...)
+            history.append(_history_row(
+                'reschedule', 'appointment', appointment.id,
+                f'{_appointment_name(appointment)} - {appointment.patient.get_full_name()}',
+                performed_by,
+                {
+                    'appointment_id': appointment.id,
+                    'patient': appointment.patient.get_full_name(),
+                    'date': str(appointment.appointment_date),
+                    'time': str(appointment.appointment_time),
+                    'status': appointment.status,
+                    'old_date': str(old_date),
+                    'old_time': str(old_time),
+                    'new_date': str(new_date),
+                    'new_time': str(new_time),
+                    'reschedule_request_id': reschedule_request.id,
+                },
+            ))
+        else:
+            notifications.append(Notification(
+                type='reschedule', appointment_id=appointment.id, title='Reschedule Request Rejected',
+                message=(f'Your reschedule request for {appointment.get_service_name()} on '
+                         f'{appointment.appointment_date} at {appointment.appointment_time} has been rejected. '
+                         f'Please contact us for more information.'),
+                patient=appointment.patient,
+            ))
+            history.append(_history_row(
+                'reject', 'reschedule_request', reschedule_request.id,
+                f'Reschedule Request #{reschedule_request.id} - {appointment.patient.get_full_name()}',
+                performed_by,
+                {
+                    'appointment_id': appointment.id,
+                    'patient': appointment.patient.get_full_name(),
+                    'requested_date': str(new_date),
+                    'requested_time': str(new_time),
+                },
+            ))
+    if rescheduled:
+        now = timezone.now()
+        for appointment in rescheduled:
+            appointment.updated_at = now
+        update_fields = ['appointment_date', 'appointment_time', 'status', 'updated_at']
+        Appointment.objects.bulk_update(rescheduled, update_fields, batch_size=500)
+        _send_post_save(rescheduled, update_fields)
+    return notifications, history
+
+
+def decide_requests(kind, request_ids, decision, performed_by):
+    """
+    Approve or reject pending requests of a kind in one transaction.
+
+    Requests that do not exist, are no longer pending, whose appointment is
+    gone, or (for reschedules being approved) whose new date is a closed
+    clinic day are skipped with a reason; the rest are decided together.
+    Changed appointments get post_save after their bulk update.
+    """
+    model = KINDS[kind]
+    new_status = DECISIONS[decision]
+    result = DecisionResult()
+    request_ids = {int(pk) for pk in request_ids}
+
+    with transaction.atomic():
+        # Locked so two staff members cannot decide the same request twice
+        pending = list(
+            model.objects.select_for_update().filter(id__in=request_ids, status='pending').order_by('id')
+        )
+        missing = request_ids - {r.id for r in pending}
+        processed = set(model.objects.filter(id__in=missing).values_list('id', flat=True)) if missing else set()
+        result.skipped.extend(
+            (pk, 'already processed' if pk in processed else 'not found') for pk in sorted(missing)
+        )
+        appointments = _appointments(r.appointment_id for r in pending)
+
+        closed_days = {}
+        if kind == 'reschedule' and decision == 'approve':
+            closed_days = dict(ClosedDay.objects.filter(
+                date__in={r.new_appointment_date for r in pending},
+            ).values_list('date', 'reason'))
+
+        for pending_request in pending:
+            if pending_request.appointment_id not in appointments:
+                result.skipped.append((pending_request.id, 'appointment not found'))
+            elif kind == 'reschedule' and pending_request.new_appointment_date in closed_days:
+                reason = closed_days[pending_request.new_appointment_date]
+                result.skipped.append((
+                    pending_request.id,
+                    f'the clinic is closed on {pending_request.new_appointment_date.strftime("%B %d, %Y")}'
+                    + (f' ({reason})' if reason else ''),
+                ))
+            else:
+                result.decided.append(pending_request)
+        if not result.decided:
+            return result
+
+        if kind == 'cancellation':
+            notifications, history = _decide_cancellations(result.decided, appointments, decision, performed_by)
+        else:
+            notifications, history = _decide_reschedules(result.decided, appointments, decision, performed_by)
+
+        model.objects.filter(id__in=[r.id for r in result.decided]).update(
+            status=new_status, updated_at=timezone.now(),
+        )
+        for decided in result.decided:
+            decided.status = new_status
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        HistoryLog.objects.bulk_create(history, batch_size=500)
+    return result
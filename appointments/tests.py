@@ -1,3 +1,184 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from appointments.management.commands.explain_hot_queries import sequential_scans
+from appointments.models import Appointment, CancellationRequest, Feedback, RatingDay, RatingSummary
+from appointments.ratings import _subject_ratings, _upsert, combined_average, rebuild_ratings, recent_average, record_feedback
+from appointments.request_inbox import decide_requests, decode_cursor, encode_cursor
+
+
+class ExplainHotQueriesTests(SimpleTestCase):
+    """Sequential scan detection in EXPLAIN output"""
+
+    def test_sqlite_plans(self):
+        plan = '\n'.join([
+            '3 0 0 SCAN appointments',
+            '5 0 0 SCAN notifications USING INDEX notif_staff_read_idx',
+            '7 0 0 SEARCH users USING INTEGER PRIMARY KEY (rowid=?)',
+            '9 0 0 SCAN package_bookings USING COVERING INDEX pkgbooking_patient_idx',
+        ])
+        self.assertEqual(sequential_scans(plan, 'sqlite'), ['appointments'])
+
+    def test_postgres_plans(self):
+        plan = '\n'.join([
+            'Limit  (cost=0.29..8.31 rows=1 width=4)',
+            '  ->  Index Scan using appt_status_date_idx on appointments  (cost=0.29..8.31 rows=1 width=4)',
+            '  ->  Seq Scan on notifications  (cost=0.00..35.50 rows=10 width=4)',
+        ])
+        self.assertEqual(sequential_scans(plan, 'postgresql'), ['notifications'])
+
+
+class RequestInboxCursorTests(SimpleTestCase):
+    """Keyset cursors of the staff request inbox"""
+
+    def test_round_trip(self):
+        created_at = datetime(2025, 3, 4, 9, 30, 15, 123456, tzinfo=timezone.utc)
+        cursor = encode_cursor(created_at, 42)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), (created_at, 42))
+
+    def test_malformed_cursor_starts_from_the_first_page(self):
+        for cursor in (None, '', 'not-base64!', encode_cursor(datetime(2025, 1, 1), 1)[:-3], 'bm8tc2VwYXJhdG9y'):
+            self.assertIsNone(decode_cursor(cursor), cursor)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DecideRequestsTests(TestCase):
+    """Bulk decisions on cancellation requests against the test database"""
+
+    def setUp(self):
+        from accounts.models import Attendant, User
+
+        self.staff = User.objects.create_user('admin', password='x', user_type='admin')
+        patient = User.objects.create_user('patient', password='x', user_type='patient')
+        attendant = Attendant.objects.create(first_name='A', last_name='B', shift_date=date(2025, 1, 1),
+                                             shift_time=time(9))
+        self.appointment = Appointment.objects.create(patient=patient, attendant=attendant, status='confirmed',
+                                                      appointment_date=date(2025, 1, 2), appointment_time=time(10))
+        self.pending, self.approved = (
+            CancellationRequest.objects.create(appointment_id=self.appointment.id, appointment_type='regular',
+                                               patient=patient, status=status)
+            for status in ('pending', 'approved')
+        )
+
+    def test_skipped_requests_say_why(self):
+        result = decide_requests('cancellation', [self.pending.id, self.approved.id, 999], 'approve', self.staff)
+        self.assertEqual(result.decided, [self.pending])
+        self.assertEqual(result.skipped, [(self.approved.id, 'already processed'), (999, 'not found')])
+
+    def test_cancelled_appointments_send_post_save(self):
+        saved = []
+
+        def receiver(sender, instance, update_fields, **kwargs):
+            saved.append((instance.id, instance.status, 'status' in update_fields))
+
+        post_save.connect(receiver, sender=Appointment, dispatch_uid='test-decide-requests')
+        self.addCleanup(post_save.disconnect, sender=Appointment, dispatch_uid='test-decide-requests')
+        decide_requests('cancellation', [self.pending.id], 'approve', self.staff)
+        self.assertEqual(saved, [(self.appointment.id, 'cancelled', True)])
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.status, 'cancelled')
+
+
+class RatingAggregateTests(SimpleTestCase):
+    """Stored rating aggregates"""
+
+    def test_average_and_histogram(self):
+        summary = RatingSummary(rating_count=4, rating_total=17, stars_5=2, stars_4=1, stars_3=1)
+        self.assertEqual(summary.average, 4.25)
+        self.assertEqual(summary.histogram, [(5, 2), (4, 1), (3, 1), (2, 0), (1, 0)])
+
+    def test_empty_summary(self):
+        self.assertIsNone(RatingSummary().average)
+        self.assertIsNone(combined_average([]))
+
+    def test_combined_average_is_weighted(self):
+        rows = [RatingSummary(rating_count=1, rating_total=1), RatingSummary(rating_count=3, rating_total=15)]
+        self.assertEqual(combined_average(rows), 4.0)
+
+    def test_subjects_of_a_feedback(self):
+        appointment = Appointment(attendant_id=3, service_id=7)
+        self.assertEqual(
+            _subject_ratings(Feedback(rating=4, attendant_rating=5), appointment),
+            [('attendant', 3, 5), ('service', 7, 4)],
+        )
+        # Package or product appointments and a skipped attendant rating
+        self.assertEqual(_subject_ratings(Feedback(rating=4), Appointment(attendant_id=3)), [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RatingLedgerTests(TestCase):
+    """Rating aggregates written by feedback, against the test database"""
+
+    def setUp(self):
+        from accounts.models import Attendant, User
+        from services.models import Service, ServiceCategory
+
+        self.patient = User.objects.create_user('patient', password='x', user_type='patient')
+        self.attendant = Attendant.objects.create(first_name='A', last_name='B', shift_date=date(2025, 1, 1),
+                                                  shift_time=time(9))
+        category = ServiceCategory.objects.create(name='Facials')
+        self.service = Service.objects.create(service_name='Facial', duration=60, category=category)
+        self.appointments = [
+            Appointment.objects.create(patient=self.patient, attendant=self.attendant, service=self.service,
+                                       status='completed', appointment_date=date(2025, 1, day),
+                                       appointment_time=time(10))
+            for day in (2, 3, 4)
+        ]
+
+    def feedback(self, appointment, rating, attendant_rating, days_ago=0):
+        feedback = Feedback.objects.create(appointment=appointment, patient=self.patient, rating=rating,
+                                           attendant_rating=attendant_rating)
+        if days_ago:
+            feedback.created_at -= timedelta(days=days_ago)
+            Feedback.objects.filter(id=feedback.id).update(created_at=feedback.created_at)
+        record_feedback(feedback, appointment)
+        return feedback
+
+    def rows(self):
+        summaries = RatingSummary.objects.order_by('subject_type', 'subject_id').values(
+            'subject_type', 'subject_id', 'rating_count', 'rating_total',
+            'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5',
+        )
+        days = RatingDay.objects.order_by('subject_type', 'subject_id', 'day').values(
+            'subject_type', 'subject_id', 'day', 'rating_count', 'rating_total',
+        )
+        return list(summaries), list(days)
+
+    def test_submitted_feedback_updates_the_aggregates(self):
+        self.client.force_login(self.patient)
+        self.client.post(f'/appointments/submit-feedback/{self.appointments[0].id}/',
+                         {'rating': '4', 'attendant_rating': '5'})
+        self.feedback(self.appointments[1], 5, 3)
+        self.feedback(self.appointments[2], 2, None, days_ago=45)
+
+        service = RatingSummary.objects.get(subject_type='service', subject_id=self.service.id)
+        self.assertEqual((service.rating_count, service.rating_total), (3, 11))
+        self.assertEqual(service.histogram, [(5, 1), (4, 1), (3, 0), (2, 1), (1, 0)])
+        attendant = RatingSummary.objects.get(subject_type='attendant', subject_id=self.attendant.id)
+        self.assertEqual((attendant.rating_count, attendant.average), (2, 4.0))
+        # The 45-day-old feedback is outside the recent window
+        self.assertEqual(recent_average('service', self.service.id), (4.5, 2))
+        self.assertEqual(recent_average('attendant', self.attendant.id + 1), (None, 0))
+
+    def test_rebuild_reproduces_the_running_rows(self):
+        self.feedback(self.appointments[0], 4, 5)
+        self.feedback(self.appointments[1], 5, 3)
+        self.feedback(self.appointments[2], 2, None, days_ago=45)
+        running = self.rows()
+        self.assertEqual(rebuild_ratings(), {'summaries': 2, 'days': 3})
+        self.assertEqual(self.rows(), running)
+
+    def test_upsert_retries_when_another_writer_creates_the_row(self):
+        subject = {'subject_type': 'service', 'subject_id': self.service.id}
+        RatingSummary.objects.create(**subject, rating_count=1, rating_total=5, stars_5=1)
+        # The first UPDATE runs before the other writer's row exists
+        with mock.patch.object(RatingSummary.objects, 'filter', side_effect=[
+            RatingSummary.objects.none(), RatingSummary.objects.filter(**subject),
+        ]):
+            _upsert(RatingSummary, subject, {'rating_count': 1, 'rating_total': 3, 'stars_3': 1})
+        row = RatingSummary.objects.get(**subject)
+        self.assertEqual((row.rating_count, row.rating_total, row.stars_3, row.stars_5), (2, 8, 1, 1))
@@ -67,6 +67,7 @@ urlpatterns = [
     path('admin/reject-cancellation/<int:request_id>/', admin_views.admin_reject_cancellation, name='admin_reject_cancellation'),
     path('admin/approve-reschedule/<int:request_id>/', admin_views.admin_approve_reschedule, name='admin_approve_reschedule'),
     path('admin/reject-reschedule/<int:request_id>/', admin_views.admin_reject_reschedule, name='admin_reject_reschedule'),
+    path('admin/requests/bulk/', admin_views.admin_bulk_decide_requests, name='admin_bulk_decide_requests'),
     path('admin/inventory/', admin_views.admin_inventory, name='admin_inventory'),
     path('admin/inventory/update/<int:product_id>/', admin_views.admin_update_stock, name='admin_update_stock'),
     path('admin/feedback/', admin_views.admin_view_feedback, name='admin_view_feedback'),
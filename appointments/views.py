@@ -1,7 +1,8 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import aget_object_or_404, render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
+from django.db import transaction
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -11,6 +12,7 @@ from accounts.models import User, Attendant, AttendantProfile
 from services.models import Service
 from products.models import Product
 from packages.models import Package
+from products.inventory import InsufficientStock, reserve_stock
 from services.utils import send_appointment_sms, send_attendant_assignment_sms
 import json
 
@@ -483,8 +485,8 @@ def book_product(request, product_id):
                 }
                 return render(request, 'appointments/book_product.html', context)
             
-            # Check stock availability
-            if product.stock <= 0:
+            # Check stock availability (units held by other pending pre-orders are taken)
+            if product.available_stock <= 0:
                 messages.error(request, f'Sorry, {product.product_name} is currently out of stock. Please check back later or contact the clinic.')
                 context = {
                     'product': product,
@@ -511,15 +513,25 @@ def book_product(request, product_id):
             # All appointments start as pending and require staff approval
             initial_status = 'pending'
             
-            appointment = Appointment.objects.create(
-                patient=request.user,
-                product=product,
-                attendant=attendant,
-                appointment_date=appointment_date,
-                appointment_time=appointment_time,
-                status=initial_status,
-                transaction_id=transaction_id
-            )
+            # Reserve a unit with the booking; the last unit goes to only one of concurrent pre-orders
+            try:
+                with transaction.atomic():
+                    appointment = Appointment.objects.create(
+                        patient=request.user,
+                        product=product,
+                        attendant=attendant,
+                        appointment_date=appointment_date,
+                        appointment_time=appointment_time,
+                        status=initial_status,
+                        transaction_id=transaction_id
+                    )
+                    reserve_stock(product.id, appointment.id, request.user)
+            except InsufficientStock:
+                messages.error(request, f'Sorry, {product.product_name} is currently out of stock. Please check back later or contact the clinic.')
+                context = {
+                    'product': product,
+                }
+                return render(request, 'appointments/book_product.html', context)
             
             # Log product pre-order booking
             from .models import HistoryLog
@@ -541,8 +553,7 @@ def book_product(request, product_id):
                 }
             )
             
-            # Deduct stock only when staff confirms the pre-order
-            # Stock will be deducted when appointment status changes to 'confirmed'
+            # Stock is deducted (and the reservation dropped) when staff confirms the pre-order
             
             # Create notification
             Notification.objects.create(
@@ -1193,14 +1204,18 @@ def submit_feedback(request, appointment_id):
             messages.error(request, 'You have already submitted feedback for this appointment.')
             return redirect('appointments:my_appointments')
         
-        # Create feedback
-        Feedback.objects.create(
-            appointment=appointment,
-            patient=request.user,
-            rating=rating,
-            attendant_rating=attendant_rating_int,
-            comment=comment
-        )
+        # Create feedback; the attendant's and service's rating aggregates
+        # are updated in the same transaction
+        from .ratings import record_feedback
+        with transaction.atomic():
+            feedback = Feedback.objects.create(
+                appointment=appointment,
+                patient=request.user,
+                rating=rating,
+                attendant_rating=attendant_rating_int,
+                comment=comment
+            )
+            record_feedback(feedback, appointment)
         
         messages.success(request, 'Thank you for your feedback!')
         return redirect('appointments:my_appointments')
@@ -1210,48 +1225,48 @@ def submit_feedback(request, appointment_id):
 
 @csrf_exempt
 @require_http_methods(["GET"])
-def get_notifications_api(request):
+async def get_notifications_api(request):
     """API endpoint to get notifications (replaces get_notifications.php)"""
-    if not request.user.is_authenticated:
+    user = await request.auser()
+    if not user.is_authenticated:
         return JsonResponse({'success': False, 'error': 'Not authenticated'})
     
     try:
         from django.db.models import Q
         
-        if request.user.user_type == 'admin':
+        if user.user_type == 'admin':
             # For admin/staff, show all system notifications (where patient is null)
             notifications = Notification.objects.filter(patient__isnull=True, is_read=False).order_by('-created_at')[:10]
-        elif request.user.user_type == 'owner':
+        elif user.user_type == 'owner':
             # For owner, show all system notifications (where patient is null)
             notifications = Notification.objects.filter(patient__isnull=True, is_read=False).order_by('-created_at')[:10]
-        elif request.user.user_type == 'attendant':
+        elif user.user_type == 'attendant':
             # For attendant, show notifications assigned to them or system notifications
             notifications = Notification.objects.filter(
-                (Q(patient=request.user) | Q(patient__isnull=True)),
+                (Q(patient=user) | Q(patient__isnull=True)),
                 is_read=False
             ).order_by('-created_at')[:10]
         else:
             # For patients, show their notifications
-            notifications = Notification.objects.filter(patient=request.user, is_read=False).order_by('-created_at')[:10]
-        
-        # Count unread notifications
-        unread_count = notifications.count()
+            notifications = Notification.objects.filter(patient=user, is_read=False).order_by('-created_at')[:10]
         
         # Format notifications
-        notifications_data = []
-        for notification in notifications:
-            notifications_data.append({
+        notifications_data = [
+            {
                 'notification_id': notification.id,
                 'title': notification.title,
                 'message': notification.message,
                 'is_read': notification.is_read,
                 'created_at_formatted': notification.created_at.strftime('%Y-%m-%d %H:%M')
-            })
+            }
+            async for notification in notifications
+        ]
         
         return JsonResponse({
             'success': True,
             'notifications': notifications_data,
-            'unread_count': unread_count
+            # Unread notifications in the (at most 10) shown
+            'unread_count': len(notifications_data)
         })
     
     except Exception as e:
@@ -1260,15 +1275,15 @@ def get_notifications_api(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def update_notifications_api(request):
+async def update_notifications_api(request):
     """API endpoint to update notifications (replaces update_notifications.php)"""
-    if not request.user.is_authenticated:
+    user = await request.auser()
+    if not user.is_authenticated:
         return JsonResponse({'success': False, 'error': 'Not authenticated'})
     
     try:
         # Handle both JSON and form data
         if request.content_type == 'application/json':
-            import json
             data = json.loads(request.body)
             action = data.get('action')
             notification_id = data.get('notification_id')
@@ -1278,24 +1293,24 @@ def update_notifications_api(request):
         
         if action == 'mark_read':
             if notification_id:
-                notification = get_object_or_404(Notification, id=notification_id)
+                notification = await aget_object_or_404(Notification, id=notification_id)
                 # Allow admin, owner, or the notification's patient to mark as read
-                if request.user.user_type in ('admin', 'owner'):
+                if user.user_type in ('admin', 'owner'):
                     # For admin/owner, only allow marking system notifications (patient is None)
-                    if notification.patient is None:
+                    if notification.patient_id is None:
                         notification.is_read = True
-                        notification.save()
+                        await notification.asave()
                         return JsonResponse({'success': True})
-                elif notification.patient == request.user:
+                elif notification.patient_id == user.id:
                     notification.is_read = True
-                    notification.save()
+                    await notification.asave()
                     return JsonResponse({'success': True})
         
         elif action == 'mark_all_read':
-            if request.user.user_type in ('admin', 'owner'):
-                Notification.objects.filter(patient__isnull=True).update(is_read=True)
+            if user.user_type in ('admin', 'owner'):
+                await Notification.objects.filter(patient__isnull=True).aupdate(is_read=True)
             else:
-                Notification.objects.filter(patient=request.user).update(is_read=True)
+                await Notification.objects.filter(patient=user).aupdate(is_read=True)
             return JsonResponse({'success': True})
         
         return JsonResponse({'success': False, 'error': 'Invalid action'})
@@ -8,6 +8,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from accounts.models import User, Attendant
 from appointments.models import Appointment, Notification
+from products.inventory import fulfil_preorder
 import json
 
 
@@ -22,29 +23,9 @@ def attendant_dashboard(request):
     """Attendant dashboard - View appointments they are in charge of"""
     today = timezone.now().date()
     
-    # Get the Attendant object associated with this user
-    # Try to find by exact name match first, then case-insensitive
-    attendant_obj = None
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
-        # Try case-insensitive match
-        try:
-            attendant_obj = Attendant.objects.filter(
-                first_name__iexact=request.user.first_name,
-                last_name__iexact=request.user.last_name
-            ).first()
-        except:
-            attendant_obj = None
-    except Attendant.MultipleObjectsReturned:
-        # If multiple attendants with same name, get the first one
-        attendant_obj = Attendant.objects.filter(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        ).first()
+    # Get the Attendant object associated with this user (matched by exact
+    # name first, then case-insensitive; cached per user)
+    attendant_obj = request.principal.attendant
     
     # Get today's appointments - show all appointments for today that have an attendant assigned
     # This ensures all appointments made by patients are visible to attendants
@@ -93,10 +74,9 @@ def attendant_dashboard(request):
             attendant_rating__isnull=False
         ).select_related('patient', 'appointment').order_by('-created_at')[:5]
         
-        feedback_count = Feedback.objects.filter(
-            appointment__attendant=attendant_obj,
-            attendant_rating__isnull=False
-        ).count()
+        # Kept up to date by submit_feedback (appointments.ratings)
+        from appointments.ratings import rating_summary
+        feedback_count = rating_summary('attendant', attendant_obj.id).rating_count
     else:
         # If no attendant object found, don't show any feedback
         # This ensures privacy - only show feedback when we can verify the attendant
@@ -124,13 +104,8 @@ def attendant_dashboard(request):
 def attendant_appointments(request):
     """Attendant appointments management - Only shows appointments assigned to this attendant"""
     # Get the Attendant object associated with this user
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
-        attendant_obj = None
+    attendant_obj = request.principal.attendant
+    if attendant_obj is None:
         messages.warning(request, 'No attendant profile found. Please contact staff to set up your attendant profile.')
     
     # Get filter parameters
@@ -177,17 +152,13 @@ def attendant_appointment_detail(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
     
     # Get the Attendant object associated with this user
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
+    attendant_obj = request.principal.attendant
+    if attendant_obj is None:
         messages.error(request, 'No attendant profile found. Please contact staff.')
         return redirect('attendant:dashboard')
     
     # Verify appointment is assigned to this attendant
-    if appointment.attendant != attendant_obj:
+    if appointment.attendant_id != attendant_obj.id:
         messages.error(request, 'You can only view appointments assigned to you.')
         return redirect('attendant:appointments')
     
@@ -221,17 +192,13 @@ def attendant_confirm_appointment(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
     
     # Get the Attendant object associated with this user
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
+    attendant_obj = request.principal.attendant
+    if attendant_obj is None:
         messages.error(request, 'No attendant profile found. Please contact staff.')
         return redirect('attendant:dashboard')
     
     # Verify appointment is assigned to this attendant
-    if appointment.attendant != attendant_obj:
+    if appointment.attendant_id != attendant_obj.id:
         messages.error(request, 'You can only confirm appointments assigned to you.')
         return redirect('attendant:appointments')
     
@@ -239,12 +206,9 @@ def attendant_confirm_appointment(request, appointment_id):
         appointment.status = 'confirmed'
         appointment.save()
         
-        # If this is a product pre-order, deduct stock
-        if appointment.product:
-            product = appointment.product
-            if product.stock > 0:
-                product.stock -= 1
-                product.save()
+        # If this is a product pre-order, deduct stock and drop its reservation
+        if appointment.product_id:
+            fulfil_preorder(appointment.product_id, appointment.id, request.user)
         
         # Create notification for patient
         Notification.objects.create(
@@ -269,25 +233,27 @@ def attendant_complete_appointment(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
     
     # Get the Attendant object associated with this user
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
+    attendant_obj = request.principal.attendant
+    if attendant_obj is None:
         messages.error(request, 'No attendant profile found. Please contact staff.')
         return redirect('attendant:dashboard')
     
     # Verify appointment is assigned to this attendant
-    if appointment.attendant != attendant_obj:
+    if appointment.attendant_id != attendant_obj.id:
         messages.error(request, 'You can only complete appointments assigned to you.')
         return redirect('attendant:appointments')
     
     if appointment.status in ['pending', 'confirmed']:
+        was_pending = appointment.status == 'pending'
         # Mark appointment as completed
         appointment.status = 'completed'
         appointment.save()
         
+        # A pre-order completed without being confirmed first still holds its
+        # reservation: hand the unit over now
+        if was_pending and appointment.product_id:
+            fulfil_preorder(appointment.product_id, appointment.id, request.user)
+        
         # Save treatment details (if provided via POST, otherwise create basic record)
         from appointments.models import Treatment
         
@@ -354,12 +320,8 @@ def attendant_patient_profile(request, patient_id):
     patient = get_object_or_404(User, id=patient_id, user_type='patient')
     
     # Get the Attendant object associated with this user
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
+    attendant_obj = request.principal.attendant
+    if attendant_obj is None:
         messages.error(request, 'No attendant profile found. Please contact staff.')
         return redirect('attendant:dashboard')
     
@@ -391,12 +353,8 @@ def attendant_patient_profile(request, patient_id):
 def attendant_history(request):
     """Attendant view own history of completed appointments only"""
     # Get the Attendant object associated with this user
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
+    attendant_obj = request.principal.attendant
+    if attendant_obj is None:
         messages.error(request, 'No attendant profile found. Please contact staff.')
         return redirect('attendant:dashboard')
     
@@ -417,23 +375,9 @@ def attendant_history(request):
 @user_passes_test(is_attendant, login_url='/accounts/login/attendant/')
 def attendant_feedback(request):
     """Attendant view own feedback from patients - ONLY shows feedback for their own appointments"""
-    # Get the Attendant object associated with this user
-    # Try to find by exact name match first
-    attendant_obj = None
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
-        # Try to find by case-insensitive match
-        try:
-            attendant_obj = Attendant.objects.filter(
-                first_name__iexact=request.user.first_name,
-                last_name__iexact=request.user.last_name
-            ).first()
-        except:
-            pass
+    # Get the Attendant object associated with this user (matched by exact
+    # name first, then case-insensitive; cached per user)
+    attendant_obj = request.principal.attendant
     
     if not attendant_obj:
         messages.error(request, 'No attendant profile found. Please contact staff to set up your attendant profile.')
@@ -482,10 +426,18 @@ def attendant_feedback(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
+    # Overall and recent averages from the stored aggregates, not the filtered list
+    from appointments.ratings import rating_summary, recent_average, RECENT_DAYS
+    recent_rating, recent_count = recent_average('attendant', attendant_obj.id)
+    
     context = {
         'feedbacks': page_obj,
         'page_obj': page_obj,
         'attendant_obj': attendant_obj,
+        'rating_summary': rating_summary('attendant', attendant_obj.id),
+        'recent_rating': recent_rating,
+        'recent_count': recent_count,
+        'recent_days': RECENT_DAYS,
         'rating_filter': rating_filter,
         'date_from': date_from,
         'date_to': date_to,
@@ -503,20 +455,13 @@ def attendant_schedule(request):
     from datetime import datetime
     
     # Get the Attendant object associated with this user
-    try:
-        attendant_obj = Attendant.objects.get(
-            first_name=request.user.first_name,
-            last_name=request.user.last_name
-        )
-    except Attendant.DoesNotExist:
+    attendant_obj = request.principal.attendant
+    if attendant_obj is None:
         messages.error(request, 'No attendant profile found. Please contact staff.')
         return redirect('attendant:dashboard')
     
     # Get or create attendant profile with work schedule
-    try:
-        profile = request.user.attendant_profile
-    except AttendantProfile.DoesNotExist:
-        profile = None
+    profile = request.principal.attendant_profile
     
     if request.method == 'POST':
         work_days = request.POST.getlist('work_days')
@@ -699,9 +644,8 @@ def request_leave(request):
     from datetime import timedelta
     
     # Get attendant profile
-    try:
-        profile = request.user.attendant_profile
-    except:
+    profile = request.principal.attendant_profile
+    if profile is None:
         messages.error(request, 'No attendant profile found. Please contact staff.')
         return redirect('attendant:dashboard')
     
@@ -771,9 +715,8 @@ def view_leave_requests(request):
     from accounts.models import AttendantLeaveRequest
     
     # Get attendant profile
-    try:
-        profile = request.user.attendant_profile
-    except:
+    profile = request.principal.attendant_profile
+    if profile is None:
         messages.error(request, 'No attendant profile found. Please contact staff.')
         return redirect('attendant:dashboard')
     
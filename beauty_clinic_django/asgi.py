@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'beauty_clinic_django.settings')
+# Settings adapt database connection handling to the server mode
+os.environ.setdefault('SERVER_MODE', 'asgi')
 
 application = get_asgi_application()
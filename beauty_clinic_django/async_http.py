@@ -0,0 +1,38 @@
+"""
+Shared async HTTP client for outbound API calls made from async views.
+
+Under ASGI (start.sh, SERVER_MODE=asgi) the SMS and email sends await the
+network instead of holding a worker: async_client() hands out one
+httpx.AsyncClient per event loop, so keep-alive connections to the SMS and
+Mailtrap APIs are reused across requests.
+
+    response = await async_client().post(url, json=payload)
+"""
+import asyncio
+import weakref
+
+DEFAULT_TIMEOUT = 30
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+
+# A client is bound to the loop it was first used on
+_clients = weakref.WeakKeyDictionary()
+
+
+def async_client():
+    """httpx.AsyncClient for the running event loop"""
+    # Imported on first use to keep it out of startup time
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        _clients[loop] = client
+    return client
@@ -0,0 +1,160 @@
+"""
+Read-replica routing.
+
+When DATABASE_REPLICA_URL is set, settings add a 'replica' database alias.
+Reads are sent there only inside a replica_reads() scope, which wraps the
+read-heavy code that tolerates a little replication lag: AnalyticsService,
+the analytics/report views, history logs and exports. Everything else keeps
+reading from the primary.
+
+    with replica_reads():
+        overview = AnalyticsService().get_business_overview()
+
+    @replica_reads()
+    def owner_view_history_log(request): ...
+
+Read-your-writes: as soon as a request writes anything, the rest of that
+request reads from the primary, and ReplicaRoutingMiddleware sets a short-lived
+cookie (REPLICA_STICKY_SECONDS) so the follow-up request (usually the redirect
+after a POST) does too.
+
+Failover: without a 'replica' alias every read goes to the primary. When the
+replica cannot be reached it is skipped for REPLICA_RETRY_SECONDS.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+STICKY_COOKIE = 'db_primary'
+
+_replica_scope = ContextVar('replica_scope', default=0)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote', default=False)
+
+# Monotonic time until which the replica is considered down (per process)
+_replica_down_until = 0.0
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def replica_available():
+    """Whether the replica is configured and was reachable the last time it was tried"""
+    global _replica_down_until
+    if not replica_configured():
+        return False
+    if time.monotonic() < _replica_down_until:
+        return False
+    try:
+        connections[REPLICA_ALIAS].ensure_connection()
+    except OperationalError:
+        _replica_down_until = time.monotonic() + getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+        logger.warning('Read replica unavailable, reading from the primary', exc_info=True)
+        return False
+    return True
+
+
+def read_replica_alias():
+    """Alias for a lag-tolerant read outside the router, e.g. an export's `using`"""
+    return REPLICA_ALIAS if replica_available() else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def replica_reads():
+    """Send reads inside this block to the replica (also usable as a decorator)"""
+    token = _replica_scope.set(_replica_scope.get() + 1)
+    try:
+        yield
+    finally:
+        _replica_scope.reset(token)
+
+
+def reads_from_replica():
+    """Whether a read right now would be routed to the replica"""
+    return (
+        _replica_scope.get() > 0
+        and not _wrote.get()
+        and not _pinned_to_primary.get()
+        and replica_available()
+    )
+
+
+class ReplicaRouter:
+    """Route scoped reads to the replica; writes and migrations stay on the primary"""
+
+    def db_for_read(self, model, **hints):
+        if reads_from_replica():
+            return REPLICA_ALIAS
+        # Django's default: the instance's database, else 'default'
+        return None
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        # Not None: Django would fall back to the instance's database, so an
+        # object loaded inside replica_reads() would be saved to the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Per-request read-your-writes state for ReplicaRouter (sync and async)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self._start(request)
+        try:
+            return self._finish(self.get_response(request))
+        finally:
+            self._reset(tokens)
+
+    async def __acall__(self, request):
+        # The async ORM runs queries in threads; asgiref copies context
+        # variable changes (_wrote) back to this coroutine
+        tokens = self._start(request)
+        try:
+            return self._finish(await self.get_response(request))
+        finally:
+            self._reset(tokens)
+
+    def _start(self, request):
+        return _wrote.set(False), _pinned_to_primary.set(STICKY_COOKIE in request.COOKIES)
+
+    def _finish(self, response):
+        if _wrote.get() and replica_configured():
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def _reset(self, tokens):
+        wrote_token, pinned_token = tokens
+        _pinned_to_primary.reset(pinned_token)
+        _wrote.reset(wrote_token)
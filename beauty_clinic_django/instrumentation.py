@@ -0,0 +1,214 @@
+"""
+Per-request query and timing instrumentation.
+
+QueryInstrumentationMiddleware records, for every request:
+
+- the number of SQL queries and the total time spent in the database
+- the slowest statements
+- repeated query fingerprints (the same SQL with different parameters,
+  usually an N+1 loop in a view or template)
+- time spent rendering templates (includes queries run lazily from templates)
+
+and reports them as a Server-Timing header (visible in the browser dev tools)
+plus one structured log line on the 'beauty_clinic_django.instrumentation'
+logger. Enable with QUERY_INSTRUMENTATION = True (default: DEBUG).
+
+Query budgets can be set per view, either with the @query_budget decorator or
+in settings (keys are URL names such as 'owner:dashboard', or '*'):
+
+    QUERY_BUDGETS = {'owner:dashboard': 60, 'appointments:admin_appointments': {'queries': 40, 'db_ms': 200}}
+
+Exceeding a budget logs a warning, or raises QueryBudgetExceeded when
+QUERY_BUDGET_STRICT is True (use it in tests to fail on regressions).
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_COUNT = 3
+DUPLICATE_THRESHOLD = 3
+SQL_PREVIEW_LENGTH = 200
+
+_active_profile = ContextVar('query_profile', default=None)
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries (or DB time) than its budget allows"""
+
+
+def query_budget(queries=None, db_ms=None):
+    """View decorator declaring the query budget of a view"""
+    def decorator(view_func):
+        view_func.query_budget = {'queries': queries, 'db_ms': db_ms}
+        return view_func
+    return decorator
+
+
+def fingerprint(sql):
+    """SQL with parameters already out of line; collapse IN lists and whitespace"""
+    return _WHITESPACE_RE.sub(' ', _IN_LIST_RE.sub('IN (...)', sql)).strip()
+
+
+class RequestProfile:
+    """Collects queries (as a DB execute wrapper) and template render time"""
+
+    def __init__(self):
+        self.queries = []
+        self.template_seconds = 0.0
+        self.total_seconds = 0.0
+        self._in_template = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_ms(self):
+        return sum(duration for _, duration in self.queries) * 1000
+
+    def slowest(self, count=SLOW_QUERY_COUNT):
+        ranked = sorted(self.queries, key=lambda q: q[1], reverse=True)[:count]
+        return [{'ms': round(duration * 1000, 2), 'sql': sql[:SQL_PREVIEW_LENGTH]} for sql, duration in ranked]
+
+    def duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return [
+            {'count': count, 'sql': sql[:SQL_PREVIEW_LENGTH]}
+            for sql, count in counts.most_common()
+            if count >= threshold
+        ]
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f};desc="templates"',
+            f'total;dur={self.total_seconds * 1000:.1f}',
+        ])
+
+    def summary(self):
+        return {
+            'queries': self.query_count,
+            'db_ms': round(self.db_ms, 2),
+            'template_ms': round(self.template_seconds * 1000, 2),
+            'total_ms': round(self.total_seconds * 1000, 2),
+            'slowest': self.slowest(),
+            'duplicates': self.duplicates(),
+        }
+
+
+_template_timer_installed = False
+
+
+def install_template_timer():
+    """Time the outermost Django template render of each request"""
+    global _template_timer_installed
+    if _template_timer_installed:
+        return
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+
+    def render(self, context=None, request=None):
+        profile = _active_profile.get()
+        if profile is None or profile._in_template:
+            return original_render(self, context, request)
+        profile._in_template = True
+        start = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            profile.template_seconds += time.perf_counter() - start
+            profile._in_template = False
+
+    Template.render = render
+    _template_timer_installed = True
+
+
+def _normalize_budget(budget):
+    if budget is None:
+        return None
+    if isinstance(budget, int):
+        return {'queries': budget, 'db_ms': None}
+    return {'queries': budget.get('queries'), 'db_ms': budget.get('db_ms')}
+
+
+def check_budget(view_name, profile, budget):
+    """Return a list of budget violations (empty when within budget)"""
+    budget = _normalize_budget(budget)
+    if not budget:
+        return []
+    problems = []
+    if budget['queries'] is not None and profile.query_count > budget['queries']:
+        problems.append(f"{profile.query_count} queries (budget {budget['queries']})")
+    if budget['db_ms'] is not None and profile.db_ms > budget['db_ms']:
+        problems.append(f"{profile.db_ms:.1f}ms in the database (budget {budget['db_ms']}ms)")
+    return problems
+
+
+class QueryInstrumentationMiddleware:
+    """Record queries and render time per request; see the module docstring"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install_template_timer()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        profile.total_seconds = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else request.path
+        response['Server-Timing'] = profile.server_timing()
+
+        summary = profile.summary()
+        logger.info(
+            'request %s %s %s',
+            request.method, view_name,
+            json.dumps({'path': request.path, 'status': response.status_code, **summary}),
+            extra={'view_name': view_name, 'query_profile': summary},
+        )
+
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = getattr(request, '_query_budget', None) or budgets.get(view_name, budgets.get('*'))
+        problems = check_budget(view_name, profile, budget)
+        if problems:
+            message = f"Query budget exceeded for {view_name}: {'; '.join(problems)}"
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={'view_name': view_name, 'query_profile': summary})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = getattr(view_func, 'query_budget', None)
+        return None
@@ -0,0 +1,258 @@
+"""
+Opt-in request profiling on real traffic.
+
+RequestProfilerMiddleware runs a single request under a profiler when asked to:
+
+- by an owner or superuser session, with ?_profile=sample (or ?_profile=cprofile)
+- by anyone presenting a signed X-Profile-Token header, minted with
+  `python manage.py profile_token` (tokens expire, see REQUEST_PROFILING_TOKEN_MAX_AGE)
+
+Two profilers are available:
+
+- sample: a background thread snapshots the request thread's stack every
+  REQUEST_PROFILING_INTERVAL seconds and writes collapsed stacks
+  ("frame;frame;frame count" per line), which flamegraph.pl, speedscope and
+  inferno read directly. Low overhead, suitable for slow production pages.
+- cprofile: deterministic cProfile, written as a pstats dump
+  (python -m pstats, snakeviz). Exact call counts, but slows the request down.
+
+Profiles are written to ProfileStore (REQUEST_PROFILING_DIR), which keeps the
+last REQUEST_PROFILING_KEEP profiles with their view name, path, user and
+timing. Owners browse and download them at /owner/profiles/. The response of a
+profiled request carries the profile id in the X-Profile-Id header.
+
+Enable with REQUEST_PROFILING = True (default: False).
+"""
+import cProfile
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE_TOKEN'
+TOKEN_SALT = 'beauty_clinic_django.profiling'
+MODES = ('sample', 'cprofile')
+EXTENSIONS = {'sample': 'collapsed', 'cprofile': 'pstats'}
+
+DEFAULT_INTERVAL = 0.005
+DEFAULT_KEEP = 50
+DEFAULT_TOKEN_MAX_AGE = 3600
+
+
+def make_profile_token(mode='sample'):
+    """Signed value for the X-Profile-Token header"""
+    if mode not in MODES:
+        raise ValueError(f'Unknown profiling mode {mode!r}, expected one of {MODES}')
+    return signing.dumps({'mode': mode}, salt=TOKEN_SALT)
+
+
+def read_profile_token(token):
+    """Profiling mode from a token, or None when it is invalid or expired"""
+    max_age = getattr(settings, 'REQUEST_PROFILING_TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE)
+    try:
+        mode = signing.loads(token, salt=TOKEN_SALT, max_age=max_age).get('mode')
+    except (signing.BadSignature, AttributeError):
+        return None
+    return mode if mode in MODES else None
+
+
+def can_profile(user):
+    """Owners and superusers may profile their own requests"""
+    return user.is_authenticated and (user.is_superuser or user.user_type == 'owner')
+
+
+def requested_mode(request):
+    """Profiling mode asked for by this request, or None"""
+    token = request.META.get(PROFILE_HEADER)
+    if token:
+        return read_profile_token(token)
+    value = request.GET.get(PROFILE_PARAM)
+    if value is None:
+        return None
+    user = getattr(request, 'user', None)
+    if user is None or not can_profile(user):
+        return None
+    return value if value in MODES else 'sample'
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[-1]
+    # ';' separates frames in the collapsed format
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+
+
+class SamplingProfiler:
+    """Samples the stack of the thread that started it from a background thread"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        lines = [f'{stack} {count}' for stack, count in self.samples.most_common()]
+        Path(path).write_text('\n'.join(lines) + '\n' if lines else '')
+
+    @property
+    def sample_count(self):
+        return sum(self.samples.values())
+
+
+class DeterministicProfiler:
+    """cProfile wrapper with the same start/stop/write interface"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(str(path))
+
+
+def make_profiler(mode):
+    if mode == 'cprofile':
+        return DeterministicProfiler()
+    return SamplingProfiler(getattr(settings, 'REQUEST_PROFILING_INTERVAL', DEFAULT_INTERVAL))
+
+
+class ProfileStore:
+    """
+    Directory of profiles: <id>.json metadata next to <id>.collapsed or <id>.pstats.
+
+    Ids start with a timestamp, so sorting them sorts by age; only the newest
+    `keep` profiles are kept.
+    """
+
+    def __init__(self, directory=None, keep=None):
+        self.directory = Path(directory or getattr(settings, 'REQUEST_PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+        self.keep = keep or getattr(settings, 'REQUEST_PROFILING_KEEP', DEFAULT_KEEP)
+
+    def new_id(self):
+        return f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{secrets.token_hex(2)}"
+
+    def data_path(self, profile_id, mode):
+        return self.directory / f'{profile_id}.{EXTENSIONS[mode]}'
+
+    def save(self, profiler, meta):
+        """Write a finished profiler and its metadata; returns the profile id"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = self.new_id()
+        profiler.write(self.data_path(profile_id, meta['mode']))
+        meta = dict(meta, id=profile_id, filename=self.data_path(profile_id, meta['mode']).name)
+        (self.directory / f'{profile_id}.json').write_text(json.dumps(meta, indent=2))
+        self.prune()
+        return profile_id
+
+    def list(self):
+        """Metadata of stored profiles, newest first"""
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob('*.json'), reverse=True):
+            try:
+                profiles.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def get(self, profile_id):
+        """(metadata, data path) for a profile id, or None"""
+        if not profile_id or not all(c.isalnum() or c == '-' for c in profile_id):
+            return None
+        meta_path = self.directory / f'{profile_id}.json'
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+        data_path = self.data_path(profile_id, meta['mode'])
+        return (meta, data_path) if data_path.exists() else None
+
+    def delete(self, profile_id):
+        for path in self.directory.glob(f'{profile_id}.*'):
+            path.unlink(missing_ok=True)
+
+    def prune(self):
+        ids = sorted((path.stem for path in self.directory.glob('*.json')), reverse=True)
+        for profile_id in ids[self.keep:]:
+            self.delete(profile_id)
+
+
+class RequestProfilerMiddleware:
+    """Profile requests that ask for it; see the module docstring"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.store = ProfileStore()
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        profiler = make_profiler(mode)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        meta = {
+            'mode': mode,
+            'view_name': match.view_name if match else '',
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'user': user.get_username() if user is not None and user.is_authenticated else '',
+            'created': datetime.now().isoformat(timespec='seconds'),
+        }
+        if mode == 'sample':
+            meta['samples'] = profiler.sample_count
+        response['X-Profile-Id'] = self.store.save(profiler, meta)
+        return response
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
+import sys
 import dj_database_url
 from decouple import config, Csv
 
@@ -64,17 +66,37 @@ INSTALLED_APPS = [
     'allauth.socialaccount.providers.google',
 ]
 
+# Running the test suite: `manage.py test`, or pytest (pytest-django)
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    # The migration history can't be replayed on an empty database (appointments
+    # 0013 and 0014 both create the treatments table), so the test database is
+    # built straight from the models. Data migrations are tested on their own
+    # against it (packages and analytics tests)
+    MIGRATION_MODULES = {app.rsplit('.', 1)[-1]: None for app in INSTALLED_APPS}
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add WhiteNoise for static files
+    # WhiteNoise static files, async-capable so ASGI requests stay on the event loop
+    'beauty_clinic_django.static_files.StaticFilesMiddleware',
+    # Query count / DB time / template time per request (QUERY_INSTRUMENTATION).
+    # Sync-only like the profiler below: under ASGI, enabling either runs the
+    # views in threads, so keep them off on the ASGI workers except to debug
+    'beauty_clinic_django.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # request.principal: cached role / attendant record / profile per user
+    'accounts.principal.PrincipalMiddleware',
+    # Read-your-writes for the read replica router
+    'beauty_clinic_django.db_routers.ReplicaRoutingMiddleware',
     # Required by django-allauth
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Opt-in per-request profiling for owners / signed header (REQUEST_PROFILING)
+    'beauty_clinic_django.profiling.RequestProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'beauty_clinic_django.urls'
@@ -96,21 +118,52 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'beauty_clinic_django.wsgi.application'
+# 'asgi' when served by uvicorn (set by asgi.py / start.sh), otherwise 'wsgi'
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 DATABASE_URL = config('DATABASE_URL', default=None)
+# Optional read replica for analytics, reports, history logs and exports
+# (beauty_clinic_django/db_routers.py)
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default=None)
+
+# PostgreSQL connection pool (psycopg 3 with psycopg_pool). Pooled connections
+# are shared by all threads of a worker; without psycopg_pool installed each
+# thread keeps its own persistent connection instead.
+DB_POOL = config('DB_POOL', default=True, cast=bool)
+DB_POOL_MIN_SIZE = config('DB_POOL_MIN_SIZE', default=2, cast=int)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=int)
+
+
+def _database_config(url):
+    database = dj_database_url.parse(
+        url,
+        # Under ASGI sync ORM calls run in per-request threads, so persistent
+        # connections would pile up; use the pool (below) instead
+        conn_max_age=0 if SERVER_MODE == 'asgi' else 600,
+        conn_health_checks=True,
+    )
+    if (DB_POOL and database['ENGINE'] == 'django.db.backends.postgresql'
+            and importlib.util.find_spec('psycopg_pool') is not None):
+        # Django does not allow persistent connections together with a pool
+        database['CONN_MAX_AGE'] = 0
+        database['CONN_HEALTH_CHECKS'] = False
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
+    return database
+
 
 if DATABASE_URL:
     # Production database (PostgreSQL on Render)
     DATABASES = {
-        'default': dj_database_url.parse(
-            DATABASE_URL,
-            conn_max_age=600,
-            conn_health_checks=True,
-        )
+        'default': _database_config(DATABASE_URL)
     }
 else:
     # Development database (SQLite)
@@ -121,6 +174,97 @@ else:
         }
     }
 
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = _database_config(DATABASE_REPLICA_URL)
+    # Tests run against the primary only
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['beauty_clinic_django.db_routers.ReplicaRouter']
+# After a write, keep reading from the primary for this many seconds
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+# How long to skip an unreachable replica before trying it again
+REPLICA_RETRY_SECONDS = config('REPLICA_RETRY_SECONDS', default=30, cast=int)
+
+
+# Cache shared by all workers: Redis when REDIS_URL is set, otherwise files on
+# local disk. Used for the catalog page/fragment cache (services/catalog_cache.py)
+# and image derivative lookups.
+REDIS_URL = config('REDIS_URL', default=None)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'beauty_clinic',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / '.cache')),
+            'KEY_PREFIX': 'beauty_clinic',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+# Anonymous catalog pages (versioned, invalidated on catalog saves)
+CATALOG_PAGE_CACHE_TIMEOUT = config('CATALOG_PAGE_CACHE_TIMEOUT', default=60 * 15, cast=int)
+
+# Sessions are read from the shared cache and written through to the database
+# (cached_db), so an authenticated page does not query the session table.
+# SESSION_ENGINE=django.contrib.sessions.backends.signed_cookies keeps the
+# session in the (signed, not encrypted) cookie instead, with no server storage.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+# Per-user role / attendant principal (accounts/principal.py)
+PRINCIPAL_CACHE_TIMEOUT = config('PRINCIPAL_CACHE_TIMEOUT', default=60 * 60, cast=int)
+# Owner/analytics dashboard sections served as JSON (analytics/sections.py)
+ANALYTICS_SECTION_CACHE_TIMEOUT = config('ANALYTICS_SECTION_CACHE_TIMEOUT', default=60 * 5, cast=int)
+# Signup-cohort retention counts, versioned by patient/appointment changes (analytics/cohorts.py)
+ANALYTICS_COHORT_CACHE_TIMEOUT = config('ANALYTICS_COHORT_CACHE_TIMEOUT', default=60 * 60, cast=int)
+# Worker processes for `manage.py populate_analytics` partitions (analytics/refresh.py)
+ANALYTICS_REFRESH_WORKERS = config('ANALYTICS_REFRESH_WORKERS', default=2, cast=int)
+
+# Query instrumentation (beauty_clinic_django/instrumentation.py): Server-Timing
+# header and a log line per request. Budgets are keyed by URL name, e.g.
+# {'owner:dashboard': 60, '*': 200}; QUERY_BUDGET_STRICT raises instead of warning.
+QUERY_INSTRUMENTATION = config('QUERY_INSTRUMENTATION', default=DEBUG, cast=bool)
+QUERY_BUDGETS = {}
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+
+# Request profiling (beauty_clinic_django/profiling.py): owners add ?_profile=sample
+# or ?_profile=cprofile, scripts send an X-Profile-Token from `manage.py profile_token`.
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=False, cast=bool)
+REQUEST_PROFILING_DIR = config('REQUEST_PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+REQUEST_PROFILING_KEEP = config('REQUEST_PROFILING_KEEP', default=50, cast=int)
+REQUEST_PROFILING_INTERVAL = config('REQUEST_PROFILING_INTERVAL', default=0.005, cast=float)
+REQUEST_PROFILING_TOKEN_MAX_AGE = config('REQUEST_PROFILING_TOKEN_MAX_AGE', default=3600, cast=int)
+
+# Cold-start budget (beauty_clinic_django/startup.py, `manage.py profile_startup`):
+# `manage.py check` plus a fresh process serving its first request, in ms. The
+# budget test only runs with COLD_START_TEST=1 (it times real subprocesses).
+COLD_START_BUDGET_MS = config('COLD_START_BUDGET_MS', default=5000, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'null': {
+            'class': 'logging.NullHandler',
+        },
+    },
+    'loggers': {
+        # Request log lines would interleave with the test runner's output
+        'beauty_clinic_django.instrumentation': {
+            'handlers': ['null' if TESTING else 'console'],
+            'level': config('QUERY_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -163,6 +307,28 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are hashed while streaming so duplicates reuse the stored file
+# (services/uploads.py)
+FILE_UPLOAD_HANDLERS = [
+    'services.uploads.HashingMemoryFileUploadHandler',
+    'services.uploads.HashingTemporaryFileUploadHandler',
+]
+# Spool uploads locally and push them to storage from background threads.
+# 'auto' enables this only for remote (non-filesystem) storages.
+UPLOAD_BACKGROUND_TRANSFER = config('UPLOAD_BACKGROUND_TRANSFER', default='auto')
+UPLOAD_SPOOL_DIR = config('UPLOAD_SPOOL_DIR', default=os.path.join(BASE_DIR, 'upload_spool'))
+UPLOAD_TRANSFER_WORKERS = config('UPLOAD_TRANSFER_WORKERS', default=2, cast=int)
+
+# Protected downloads (medical documents, backups) - accounts/protected_files.py
+# Set to 'x-accel' (nginx) or 'x-sendfile' (Apache) to let the front server
+# stream the bytes after Django has authorized the request.
+PROTECTED_FILES_OFFLOAD = config('PROTECTED_FILES_OFFLOAD', default='')
+# Local directory -> nginx `internal` location, used with 'x-accel'
+PROTECTED_FILES_ACCEL_LOCATIONS = {
+    MEDIA_ROOT: '/_protected/media/',
+    os.path.join(BASE_DIR, 'backups'): '/_protected/backups/',
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -233,6 +399,10 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='Skinovation Beauty Cl
 
 # Mailtrap API Configuration
 MAILTRAP_API_TOKEN = config('MAILTRAP_API_TOKEN', default='')
+# Async sends (accounts.email_service.asend_mail) post to this Mailtrap API URL,
+# e.g. https://send.api.mailtrap.io/api/send or
+# https://sandbox.api.mailtrap.io/api/send/<inbox_id>; empty uses EMAIL_BACKEND
+MAILTRAP_API_URL = config('MAILTRAP_API_URL', default='')
 
 # Password Reset Settings
 PASSWORD_RESET_TIMEOUT = 3600  # 1 hour
@@ -0,0 +1,154 @@
+"""
+Cold-start measurement.
+
+A Render free-plan instance starts from scratch after idling, so the time to
+import Django, every app and the URLconf is paid by a real visitor. These
+helpers run a fresh interpreter and report:
+
+- import_profile(): `python -X importtime` of django.setup() plus the URLconf,
+  grouped per top-level package (own import time, and cumulative time of the
+  package's first import including what it pulled in)
+- measure_cold_start(): wall time of `manage.py check` and of a fresh process
+  serving its first request
+
+Used by `manage.py profile_startup` and the cold-start budget test.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+# Renders a full page (middleware, URLconf, templates) without needing data
+DEFAULT_FIRST_REQUEST_PATH = '/accounts/login/owner/'
+
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+# Import the project the way the first request does: apps, then the URLconf
+_SETUP_SCRIPT = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+
+_FIRST_REQUEST_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+setup = time.perf_counter()
+response = Client().get(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({"status": response.status_code, "setup_ms": (setup - started) * 1000,
+                  "request_ms": (done - setup) * 1000}))
+'''
+
+
+def _environment(extra=None):
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'beauty_clinic_django.settings')
+    # Per-request logging would be measured too
+    env['QUERY_INSTRUMENTATION'] = 'False'
+    env.update(extra or {})
+    return env
+
+
+def parse_importtime(output):
+    """(self_us, cumulative_us, depth, module) for each line of -X importtime output"""
+    rows = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            rows.append((int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+    return rows
+
+
+def _import_tree(rows):
+    """Rebuild the import tree from -X importtime's post-order output"""
+    roots = []
+    pending = []  # (depth, node) still waiting for their parent
+    for self_us, cumulative_us, depth, module in rows:
+        node = {'module': module, 'self_us': self_us, 'cumulative_us': cumulative_us, 'children': []}
+        while pending and pending[-1][0] > depth:
+            node['children'].insert(0, pending.pop()[1])
+        pending.append((depth, node))
+    roots.extend(node for _, node in pending)
+    return roots
+
+
+def aggregate_by_package(rows):
+    """
+    Per top-level package: own import time (sum of its modules' self time),
+    cumulative time of its imports including the dependencies they pulled in
+    first, and module count; most expensive cumulative first.
+    """
+    packages = defaultdict(lambda: {'self_ms': 0.0, 'cumulative_ms': 0.0, 'modules': 0})
+
+    stack = [(node, frozenset()) for node in _import_tree(rows)]
+    while stack:
+        node, outer_packages = stack.pop()
+        package = node['module'].split('.')[0]
+        entry = packages[package]
+        entry['self_ms'] += node['self_us'] / 1000
+        entry['modules'] += 1
+        # Count a subtree once: not again for a module nested in the same package
+        if package not in outer_packages:
+            entry['cumulative_ms'] += node['cumulative_us'] / 1000
+        stack.extend((child, outer_packages | {package}) for child in node['children'])
+
+    ranked = sorted(packages.items(), key=lambda item: item[1]['cumulative_ms'], reverse=True)
+    return [{'package': package, **values} for package, values in ranked]
+
+
+def import_profile(env=None):
+    """Import time rows of a fresh django.setup() + URLconf import"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _SETUP_SCRIPT],
+        cwd=settings.BASE_DIR, env=_environment(env), capture_output=True, text=True, check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Importing the project failed:\n{result.stderr[-2000:]}')
+    return parse_importtime(result.stderr)
+
+
+def project_packages():
+    """Top-level packages of this project (first-party apps)"""
+    return {app.split('.')[0] for app in settings.INSTALLED_APPS if (settings.BASE_DIR / app.split('.')[0]).is_dir()} | {
+        'beauty_clinic_django'}
+
+
+def measure_cold_start(path=DEFAULT_FIRST_REQUEST_PATH, env=None):
+    """Wall times (ms) of `manage.py check` and of a fresh process's first request"""
+    env = _environment(env)
+    started = time.perf_counter()
+    check = subprocess.run(
+        [sys.executable, 'manage.py', 'check'],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=False,
+    )
+    check_ms = (time.perf_counter() - started) * 1000
+    if check.returncode != 0:
+        raise RuntimeError(f'manage.py check failed:\n{check.stderr[-2000:]}')
+
+    started = time.perf_counter()
+    first = subprocess.run(
+        [sys.executable, '-c', _FIRST_REQUEST_SCRIPT, path],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=False,
+    )
+    first_request_ms = (time.perf_counter() - started) * 1000
+    if first.returncode != 0:
+        raise RuntimeError(f'First request to {path} failed:\n{first.stderr[-2000:]}')
+    detail = json.loads(first.stdout.strip().splitlines()[-1])
+    return {
+        'check_ms': round(check_ms, 1),
+        'first_request_ms': round(first_request_ms, 1),
+        'first_request_status': detail['status'],
+        'setup_ms': round(detail['setup_ms'], 1),
+        'request_ms': round(detail['request_ms'], 1),
+        'total_ms': round(check_ms + first_request_ms, 1),
+    }
@@ -0,0 +1,35 @@
+"""
+WhiteNoise middleware that also runs natively under ASGI.
+
+WhiteNoiseMiddleware is sync-only; under ASGI Django would run it, and
+everything below it in MIDDLEWARE, in a thread per request, which defeats the
+async views. Looking a static file up is an in-memory dict hit (a stat with
+WHITENOISE_AUTOREFRESH in development), so the async path does it on the
+event loop and only awaits the rest of the stack for non-static requests.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
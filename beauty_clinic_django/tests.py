@@ -0,0 +1,235 @@
+import asyncio
+import contextvars
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .db_routers import STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, _wrote, replica_reads
+from .instrumentation import (
+    QueryBudgetExceeded, QueryInstrumentationMiddleware, RequestProfile, _active_profile, check_budget,
+    fingerprint,
+)
+from .startup import aggregate_by_package, import_profile, measure_cold_start, parse_importtime
+from .profiling import (
+    PROFILE_HEADER, ProfileStore, RequestProfilerMiddleware, make_profile_token, requested_mode,
+)
+
+
+def _run_queries(profile, statements):
+    for sql, params in statements:
+        profile(lambda *args: None, sql, params, False, {})
+
+
+class QueryProfileTests(SimpleTestCase):
+    """Query recording, N+1 fingerprints and budgets"""
+
+    def test_repeated_statements_are_reported_as_duplicates(self):
+        profile = RequestProfile()
+        _run_queries(profile, [('SELECT * FROM "users" WHERE "users"."id" = %s', (i,)) for i in range(5)])
+        _run_queries(profile, [('SELECT * FROM "services" WHERE "id" IN (%s, %s)', (1, 2))])
+        self.assertEqual(profile.query_count, 6)
+        self.assertEqual(profile.duplicates(), [{'count': 5, 'sql': 'SELECT * FROM "users" WHERE "users"."id" = %s'}])
+
+    def test_in_lists_share_a_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT 1 WHERE id IN (%s)'),
+        )
+
+    def test_budget_violations(self):
+        profile = RequestProfile()
+        _run_queries(profile, [('SELECT 1', ())] * 4)
+        self.assertEqual(check_budget('x', profile, 5), [])
+        self.assertEqual(check_budget('x', profile, {'queries': 3}), ['4 queries (budget 3)'])
+
+    @override_settings(QUERY_INSTRUMENTATION=True, QUERY_BUDGET_STRICT=True, QUERY_BUDGETS={'*': 0})
+    def test_middleware_header_and_strict_budget(self):
+        request = RequestFactory().get('/')
+        middleware = QueryInstrumentationMiddleware(lambda r: HttpResponse('ok'))
+        with override_settings(QUERY_BUDGETS={}):
+            response = middleware(request)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        def view(request):
+            # Record a query on the active profile without needing a database
+            _run_queries(_active_profile.get(), [('SELECT 1', ())])
+            return HttpResponse('ok')
+
+        with self.assertRaises(QueryBudgetExceeded):
+            QueryInstrumentationMiddleware(view)(RequestFactory().get('/'))
+
+
+class RequestProfilingTests(SimpleTestCase):
+    """Who may profile, both profilers and the bounded store"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.factory = RequestFactory()
+
+    def _request(self, query='', user=None, **headers):
+        request = self.factory.get('/owner/' + query, **headers)
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_only_owners_and_valid_tokens_may_profile(self):
+        owner = SimpleNamespace(is_authenticated=True, is_superuser=False, user_type='owner')
+        patient = SimpleNamespace(is_authenticated=True, is_superuser=False, user_type='patient')
+        self.assertEqual(requested_mode(self._request('?_profile=cprofile', owner)), 'cprofile')
+        self.assertEqual(requested_mode(self._request('?_profile=1', owner)), 'sample')
+        self.assertIsNone(requested_mode(self._request('?_profile=sample', patient)))
+        self.assertIsNone(requested_mode(self._request()))
+        headers = {PROFILE_HEADER: make_profile_token('cprofile')}
+        self.assertEqual(requested_mode(self._request(**headers)), 'cprofile')
+        self.assertIsNone(requested_mode(self._request(**{PROFILE_HEADER: 'forged'})))
+
+    def test_profiles_are_stored_and_pruned(self):
+        def slow_view(request):
+            time.sleep(0.03)
+            return HttpResponse('ok')
+
+        with override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_DIR=self.directory.name,
+                               REQUEST_PROFILING_KEEP=2, REQUEST_PROFILING_INTERVAL=0.001):
+            middleware = RequestProfilerMiddleware(slow_view)
+            self.assertNotIn('X-Profile-Id', middleware(self._request()))
+            ids = [
+                middleware(self._request(**{PROFILE_HEADER: make_profile_token(mode)}))['X-Profile-Id']
+                for mode in ('sample', 'cprofile', 'sample')
+            ]
+            store = ProfileStore()
+
+        self.assertEqual([p['id'] for p in store.list()], sorted(ids[1:], reverse=True))
+        self.assertIsNone(store.get(ids[0]))
+        meta, path = store.get(ids[2])
+        self.assertGreater(meta['samples'], 0)
+        self.assertIn('slow_view', path.read_text())
+        self.assertTrue(store.get(ids[1])[1].name.endswith('.pstats'))
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """Scoped replica reads, read-your-writes and failover"""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        # Creating the test database already wrote in this context
+        self.addCleanup(_wrote.reset, _wrote.set(False))
+
+    def test_without_a_replica_everything_reads_from_the_primary(self):
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(None))
+
+    @mock.patch('beauty_clinic_django.db_routers.replica_available', return_value=True)
+    def test_only_scoped_reads_go_to_the_replica(self, _):
+        self.assertIsNone(self.router.db_for_read(None))
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(None), 'replica')
+        self.assertFalse(self.router.allow_migrate('replica', 'appointments'))
+
+    @mock.patch('beauty_clinic_django.db_routers.replica_available', return_value=True)
+    def test_objects_read_from_the_replica_are_written_to_the_primary(self, _):
+        def load_and_save():
+            with replica_reads():
+                instance = SimpleNamespace(_state=SimpleNamespace(db=self.router.db_for_read(None)))
+                return instance._state.db, self.router.db_for_write(None, instance=instance)
+
+        # In a copied context, so the write does not pin later tests to the primary
+        self.assertEqual(contextvars.copy_context().run(load_and_save), ('replica', 'default'))
+
+    @mock.patch('beauty_clinic_django.db_routers.replica_configured', return_value=True)
+    @mock.patch('beauty_clinic_django.db_routers.replica_available', return_value=True)
+    def test_reads_stick_to_the_primary_after_a_write(self, *_):
+        seen = []
+
+        def view(request):
+            with replica_reads():
+                seen.append(self.router.db_for_read(None))
+                self.router.db_for_write(None)
+                seen.append(self.router.db_for_read(None))
+            return HttpResponse('ok')
+
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(RequestFactory().post('/'))
+        self.assertEqual(seen, ['replica', None])
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        # The follow-up request carries the cookie and reads from the primary
+        request = RequestFactory().get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        seen.clear()
+        middleware(request)
+        self.assertEqual(seen[0], None)
+
+
+class AsyncServingTests(SimpleTestCase):
+    """The always-on middleware runs natively under ASGI"""
+
+    @override_settings(DEBUG=True)
+    def test_asgi_stack_is_not_adapted_to_threads(self):
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            ASGIHandler()
+        adapted = [line for line in logs.output if 'adapted for middleware' in line]
+        # Only the opt-in, sync-only instrumentation/profiling middleware,
+        # which then drop out with MiddlewareNotUsed
+        self.assertTrue(all('instrumentation' in line or 'profiling' in line for line in adapted), adapted)
+
+    @mock.patch('beauty_clinic_django.db_routers.replica_configured', return_value=True)
+    @mock.patch('beauty_clinic_django.db_routers.replica_available', return_value=True)
+    def test_async_writes_stick_to_the_primary(self, *_):
+        router = ReplicaRouter()
+
+        async def view(request):
+            # The async ORM routes queries from a worker thread
+            await sync_to_async(router.db_for_write)(None)
+            return HttpResponse('ok')
+
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().post('/')))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+
+IMPORTTIME_SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     certifi.core
+import time:        50 |        150 |   certifi
+import time:       300 |        300 |     mailtrap.models
+import time:       200 |        650 |   mailtrap.api
+import time:        10 |        660 | mailtrap
+import time:        40 |         40 | accounts
+"""
+
+
+class StartupTests(SimpleTestCase):
+    """Import profile aggregation and the cold-start budget"""
+
+    def test_import_time_is_grouped_per_package(self):
+        rows = parse_importtime(IMPORTTIME_SAMPLE)
+        self.assertEqual(rows[0], (100, 100, 2, 'certifi.core'))
+        packages = {p['package']: p for p in aggregate_by_package(rows)}
+        # mailtrap's cumulative time includes certifi, which it imported first
+        self.assertAlmostEqual(packages['mailtrap']['cumulative_ms'], 0.66)
+        self.assertAlmostEqual(packages['mailtrap']['self_ms'], 0.51)
+        self.assertAlmostEqual(packages['certifi']['cumulative_ms'], 0.15)
+        self.assertEqual(list(packages)[0], 'mailtrap')
+
+    def test_heavy_integrations_load_on_first_use(self):
+        imported = {module.split('.')[0] for *_, module in import_profile()}
+        self.assertFalse(imported & {'mailtrap', 'httpx', 'pydantic'})
+
+    @skipUnless(os.environ.get('COLD_START_TEST'), 'wall-clock check; set COLD_START_TEST=1 to run it')
+    def test_cold_start_fits_the_budget(self):
+        result = measure_cold_start()
+        self.assertEqual(result['first_request_status'], 200)
+        self.assertLessEqual(
+            result['total_ms'], settings.COLD_START_BUDGET_MS,
+            f'Cold start over budget, see `manage.py profile_startup --cold-start`: {result}',
+        )
@@ -6,8 +6,10 @@ from django.contrib import messages
 from django.views.decorators.cache import never_cache
 from django.views.decorators.http import require_http_methods
 from django.http import HttpResponse
+from services.catalog_cache import cache_catalog_page
 
 
+@cache_catalog_page
 def home(request):
     """Home page view"""
     # Redirect admin users to admin dashboard
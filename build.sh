@@ -15,11 +15,18 @@ python manage.py migrate || {
     python fix_migrations.py || python manage.py migrate
 }
 
-# Create superuser if it doesn't exist (non-interactive)
-python manage.py create_superuser || true
-
+# Restore from a portable NDJSON backup (export_backup_data) if it exists.
+# It loads into PostgreSQL or SQLite alike, streaming in bulk batches.
+# Rows that already exist are kept, so redeploys do not overwrite live data.
+if [ -f "backups/db_backup_for_render.ndjson.gz" ]; then
+    echo "NDJSON backup file found. Restoring from backup..."
+    python manage.py load_backup_data --backup-file backups/db_backup_for_render.ndjson.gz --ignore-conflicts || {
+        echo "Warning: Backup restore had issues, will try sample data instead..."
+        python manage.py populate_data --force || true
+    }
+    echo "Backup restoration completed."
 # Restore from JSON backup if it exists (for Render PostgreSQL)
-if [ -f "backups/db_backup_for_render.json" ]; then
+elif [ -f "backups/db_backup_for_render.json" ]; then
     echo "JSON backup file found. Restoring from backup..."
     python manage.py load_backup_data --backup-file backups/db_backup_for_render.json || {
         echo "Warning: Backup restore had issues, will try sample data instead..."
@@ -28,7 +35,7 @@ if [ -f "backups/db_backup_for_render.json" ]; then
     echo "Backup restoration completed."
 elif [ -f "backups/db_backup_20251120_024926.sqlite3" ]; then
     echo "SQLite backup file found (not compatible with PostgreSQL)."
-    echo "Please convert to JSON format first."
+    echo "Please convert it first: DATABASE_URL=sqlite:///backups/db_backup_20251120_024926.sqlite3 python manage.py export_backup_data --output backups/db_backup_for_render.ndjson.gz"
     echo "Populating with sample data instead..."
     python manage.py populate_data --force || true
 else
@@ -43,6 +50,11 @@ else
     echo "Data population completed."
 fi
 
+# Create superuser if it doesn't exist (non-interactive). After the restore:
+# created first, it would take user id 1 and --ignore-conflicts would then
+# skip the backup's own first user
+python manage.py create_superuser || true
+
 # Limit patients to 500 to prevent system slowdown
 echo "Limiting patients to 500 for optimal performance..."
 python manage.py limit_patients --max=500 || {
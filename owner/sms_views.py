@@ -2,7 +2,8 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.http import JsonResponse
-from services.utils import send_sms_notification
+from asgiref.sync import sync_to_async
+from services.utils import asend_sms_notification
 from accounts.models import User
 from appointments.models import SMSHistory
 
@@ -12,14 +13,15 @@ def is_owner(user):
 
 @login_required
 @user_passes_test(is_owner)
-def sms_test(request):
+async def sms_test(request):
     """SMS testing page for owner"""
+    user = await request.auser()
     if request.method == 'POST':
         phone_number = request.POST.get('phone_number')
         message = request.POST.get('message')
         
         if phone_number and message:
-            result = send_sms_notification(phone_number, message, user=request.user)
+            result = await asend_sms_notification(phone_number, message, user=user)
             
             if result['success']:
                 messages.success(request, 'SMS sent successfully!')
@@ -37,25 +39,26 @@ def sms_test(request):
     ).exclude(phone='')[:10]
     
     # Get SMS history for the current user
-    sms_history = SMSHistory.objects.filter(sender=request.user)[:20]
+    sms_history = SMSHistory.objects.filter(sender=user)[:20]
     
     context = {
         'recent_patients': recent_patients,
         'sms_history': sms_history,
     }
     
-    return render(request, 'owner/sms_test.html', context)
+    # The template evaluates the querysets, so render off the event loop
+    return await sync_to_async(render)(request, 'owner/sms_test.html', context)
 
 @login_required
 @user_passes_test(is_owner)
-def send_test_sms(request):
+async def send_test_sms(request):
     """AJAX endpoint to send test SMS"""
     if request.method == 'POST':
         phone_number = request.POST.get('phone_number')
         message = request.POST.get('message')
         
         if phone_number and message:
-            result = send_sms_notification(phone_number, message, user=request.user)
+            result = await asend_sms_notification(phone_number, message, user=await request.auser())
             return JsonResponse(result)
         else:
             return JsonResponse({
@@ -62,4 +62,8 @@ urlpatterns = [
     # Database Backup Management
     path('backup-database/', views.owner_backup_database, name='backup_database'),
     path('backup-database/download/<str:filename>/', views.owner_download_backup, name='download_backup'),
+    
+    # Request profiles (RequestProfilerMiddleware)
+    path('profiles/', views.owner_request_profiles, name='request_profiles'),
+    path('profiles/<str:profile_id>/download/', views.owner_download_profile, name='download_profile'),
 ]
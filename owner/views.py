@@ -8,9 +8,14 @@ from django.core.paginator import Paginator
 from datetime import datetime, timedelta
 from accounts.models import User
 from appointments.models import Appointment, ClosedDay
+from appointments.ratings import average_subquery
 from services.models import Service, ServiceImage, ServiceCategory, HistoryLog
+from services.uploads import store_upload
+from beauty_clinic_django.db_routers import replica_reads
 from products.models import Product, ProductImage
+from products.inventory import release_preorders, set_stock
 from packages.models import Package
+from analytics.exports import filter_appointments, filter_history_logs
 from analytics.models import PatientAnalytics, ServiceAnalytics, BusinessAnalytics, TreatmentCorrelation, PatientSegment
 
 
@@ -48,16 +53,17 @@ def is_owner(user):
 @login_required(login_url='/accounts/login/owner/')
 @user_passes_test(is_owner, login_url='/accounts/login/owner/')
 def owner_dashboard(request):
-    """Owner comprehensive dashboard with advanced analytics"""
-    from analytics.services import AnalyticsService
+    """
+    Owner comprehensive dashboard with advanced analytics. The analytics
+    blocks load separately as JSON sections (analytics/sections.py); this
+    view renders the shell with the filters and the filtered status breakdown.
+    """
     from appointments.models import Notification, Appointment
     from accounts.models import Attendant
     from django.db.models import Q, Count, Sum
     from datetime import timedelta
     from django.utils import timezone
     
-    analytics_service = AnalyticsService()
-    
     # Get filter parameters from request
     date_range = request.GET.get('date_range', '30')
     status_filter = request.GET.get('status', '')
@@ -93,15 +99,6 @@ def owner_dashboard(request):
     else:
         filter_end_date = today
     
-    # Get comprehensive analytics data
-    business_overview = analytics_service.get_business_overview()
-    revenue_analytics = analytics_service.get_revenue_analytics()
-    patient_analytics = analytics_service.get_patient_analytics()
-    service_analytics = analytics_service.get_service_analytics()
-    treatment_correlations = analytics_service.get_treatment_correlations()
-    business_insights = analytics_service.get_business_insights()
-    diagnostic_metrics = analytics_service.get_diagnostic_metrics()
-    
     # Get filtered appointments for status breakdown
     appointments_qs = Appointment.objects.filter(
         appointment_date__gte=filter_start_date,
@@ -136,13 +133,6 @@ def owner_dashboard(request):
         attendants = []
     
     context = {
-        'business_overview': business_overview,
-        'revenue_analytics': revenue_analytics,
-        'patient_analytics': patient_analytics,
-        'service_analytics': service_analytics,
-        'treatment_correlations': treatment_correlations,
-        'business_insights': business_insights,
-        'diagnostic_metrics': diagnostic_metrics,
         'notification_count': notification_count,
         'status_breakdown': status_breakdown,
         'attendants': attendants,
@@ -209,21 +199,8 @@ def owner_appointments(request):
     # Start with all appointments - latest bookings first (by creation time, then appointment date/time)
     appointments = Appointment.objects.all().order_by('-created_at', '-appointment_date', '-appointment_time')
     
-    # Apply filters
-    if status_filter:
-        appointments = appointments.filter(status=status_filter)
-    
-    if date_filter:
-        appointments = appointments.filter(appointment_date=date_filter)
-    
-    if search_query:
-        appointments = appointments.filter(
-            Q(patient__first_name__icontains=search_query) |
-            Q(patient__last_name__icontains=search_query) |
-            Q(service__service_name__icontains=search_query) |
-            Q(product__product_name__icontains=search_query) |
-            Q(package__package_name__icontains=search_query)
-        )
+    # Apply filters (shared with the appointments export)
+    appointments = filter_appointments(appointments, status_filter, date_filter, search_query)
     
     context = {
         'appointments': appointments,
@@ -254,6 +231,8 @@ def owner_cancel_appointment(request, appointment_id):
         # Get reason from POST or set default
         reason = request.POST.get('reason', '').strip() if request.method == 'POST' else 'Cancelled by owner'
         
+        # A pending pre-order's reserved unit goes back on sale
+        release_preorders([appointment], request.user)
         appointment.status = 'cancelled'
         appointment.save()
         
@@ -390,7 +369,7 @@ def owner_services(request):
         completed_bookings=Count('appointments', filter=Q(appointments__status='completed')),
         cancelled_bookings=Count('appointments', filter=Q(appointments__status='cancelled')),
         total_revenue=Sum('appointments__service__price', filter=Q(appointments__status='completed')),
-        avg_rating=Avg('appointments__feedback__rating', filter=Q(appointments__feedback__isnull=False))
+        avg_rating=average_subquery('service')
     ).order_by('-total_revenue')
     
     context = {
@@ -442,6 +421,7 @@ def owner_products(request):
 
 @login_required(login_url='/accounts/login/owner/')
 @user_passes_test(is_owner, login_url='/accounts/login/owner/')
+@replica_reads()
 def owner_analytics(request):
     """Owner comprehensive analytics dashboard"""
     from analytics.services import AnalyticsService
@@ -685,10 +665,14 @@ def owner_manage_products(request):
             price = request.POST.get('price')
             if price:
                 product.price = price
+            # Stock goes through the ledger; a full save would overwrite concurrent reservations
+            product.save(update_fields=['product_name', 'description', 'price', 'updated_at'])
             stock = request.POST.get('stock') or request.POST.get('stock_quantity')
             if stock is not None:
-                product.stock = stock
-            product.save()
+                try:
+                    set_stock(product.id, max(int(stock), 0), request.user)
+                except ValueError:
+                    messages.error(request, 'Please enter a valid whole number for the stock.')
             log_history('Product', product.product_name, 'Edited', request.user.get_full_name() or request.user.username,
                        f'Updated: {old_name} -> {product.product_name}', product.id)
             messages.success(request, 'Product updated successfully!')
@@ -698,7 +682,7 @@ def owner_manage_products(request):
             product = get_object_or_404(Product, id=product_id)
             product_name = product.product_name
             product.archived = True
-            product.save()
+            product.save(update_fields=['archived', 'updated_at'])
             log_history('Product', product_name, 'Deleted', request.user.get_full_name() or request.user.username,
                        f'Product archived', product.id)
             messages.success(request, 'Product archived successfully!')
@@ -774,6 +758,7 @@ def owner_manage_patient_profiles(request):
 
 @login_required(login_url='/accounts/login/owner/')
 @user_passes_test(is_owner, login_url='/accounts/login/owner/')
+@replica_reads()
 def owner_view_history_log(request):
     """Owner view history log with filtering"""
     from services.models import HistoryLog
@@ -789,34 +774,10 @@ def owner_view_history_log(request):
     
     history_logs = HistoryLog.objects.all()
     
-    # Filter by patient (search in details or performed_by)
-    if patient_filter:
-        history_logs = history_logs.filter(
-            Q(details__icontains=patient_filter) |
-            Q(performed_by__icontains=patient_filter)
-        )
-    
-    # Filter by treatment/service (search in name or details)
-    if treatment_filter:
-        history_logs = history_logs.filter(
-            Q(name__icontains=treatment_filter) |
-            Q(details__icontains=treatment_filter)
-        )
-    
-    # Filter by attendant (search in details or performed_by)
-    if attendant_filter:
-        history_logs = history_logs.filter(
-            Q(details__icontains=attendant_filter) |
-            Q(performed_by__icontains=attendant_filter)
-        )
-    
-    # Filter by year
-    if year_filter:
-        history_logs = history_logs.filter(datetime__year=year_filter)
-    
-    # Filter by type (Service, Product, Package)
-    if type_filter:
-        history_logs = history_logs.filter(type=type_filter)
+    # Apply filters (shared with the history export)
+    history_logs = filter_history_logs(
+        history_logs, patient_filter, treatment_filter, attendant_filter, year_filter, type_filter,
+    )
     
     history_logs = history_logs.order_by('-datetime')
     
@@ -863,12 +824,10 @@ def owner_manage_service_images(request):
                 if is_primary:
                     ServiceImage.objects.filter(service=service, is_primary=True).update(is_primary=False)
                 
-                ServiceImage.objects.create(
-                    service=service,
-                    image=image,
-                    alt_text=alt_text,
-                    is_primary=is_primary
-                )
+                service_image = ServiceImage(service=service, alt_text=alt_text, is_primary=is_primary)
+                # Hashed while uploading; identical files reuse the stored copy
+                service_image.image = store_upload(service_image, 'image', image)
+                service_image.save()
                 messages.success(request, f'Image uploaded successfully for {service.service_name}')
             else:
                 messages.error(request, 'Please select an image to upload')
@@ -899,12 +858,10 @@ def owner_manage_product_images(request):
                 if is_primary:
                     ProductImage.objects.filter(product=product, is_primary=True).update(is_primary=False)
                 
-                ProductImage.objects.create(
-                    product=product,
-                    image=image,
-                    alt_text=alt_text,
-                    is_primary=is_primary
-                )
+                product_image = ProductImage(product=product, alt_text=alt_text, is_primary=is_primary)
+                # Hashed while uploading; identical files reuse the stored copy
+                product_image.image = store_upload(product_image, 'image', image)
+                product_image.save()
                 messages.success(request, f'Image uploaded successfully for {product.product_name}')
             else:
                 messages.error(request, 'Please select an image to upload')
@@ -1277,7 +1234,8 @@ def owner_approve_cancellation(request, cancellation_request_id):
         cancellation_request.status = 'approved'
         cancellation_request.save()
         
-        # Cancel the appointment
+        # Cancel the appointment (a pending pre-order's reserved unit goes back on sale)
+        release_preorders([appointment], request.user)
         appointment.status = 'cancelled'
         appointment.save()
         
@@ -1498,11 +1456,11 @@ def owner_backup_database(request):
 @login_required(login_url='/accounts/login/owner/')
 @user_passes_test(is_owner, login_url='/accounts/login/owner/')
 def owner_download_backup(request, filename):
-    """Download a backup file"""
-    from django.http import FileResponse, Http404
+    """Download a backup file (resumable: supports Range requests)"""
+    from django.http import Http404
     from django.conf import settings
     from pathlib import Path
-    import os
+    from accounts.protected_files import serve_file
     
     backup_dir = Path(settings.BASE_DIR) / 'backups'
     backup_path = backup_dir / filename
@@ -1512,8 +1470,7 @@ def owner_download_backup(request, filename):
         raise Http404("Backup file not found.")
     
     if not (filename.startswith('db_backup_') and 
-            (filename.endswith('.sqlite3') or filename.endswith('.sql') or 
-             filename.endswith('.sqlite3.gz') or filename.endswith('.sql.gz'))):
+            filename.endswith(('.sqlite3', '.sql', '.sqlite3.gz', '.sql.gz', '.ndjson', '.ndjson.gz'))):
         raise Http404("Invalid backup file.")
     
     # Ensure the file is within the backup directory (prevent directory traversal)
@@ -1522,9 +1479,43 @@ def owner_download_backup(request, filename):
     except ValueError:
         raise Http404("Invalid backup file path.")
     
-    response = FileResponse(
-        open(backup_path, 'rb'),
-        content_type='application/octet-stream'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    return serve_file(request, backup_path, filename=filename, content_type='application/octet-stream')
+
+
+@login_required(login_url='/accounts/login/owner/')
+@user_passes_test(is_owner, login_url='/accounts/login/owner/')
+def owner_request_profiles(request):
+    """Recent request profiles captured by RequestProfilerMiddleware"""
+    from django.conf import settings
+    from beauty_clinic_django.profiling import ProfileStore
+    
+    store = ProfileStore()
+    if request.method == 'POST' and 'delete_profile' in request.POST:
+        if store.get(request.POST.get('profile_id')):
+            store.delete(request.POST['profile_id'])
+            messages.success(request, 'Profile deleted.')
+        else:
+            messages.error(request, 'Profile not found.')
+        return redirect('owner:request_profiles')
+    
+    context = {
+        'profiles': store.list(),
+        'profiling_enabled': settings.REQUEST_PROFILING,
+        'keep': store.keep,
+    }
+    return render(request, 'owner/request_profiles.html', context)
+
+
+@login_required(login_url='/accounts/login/owner/')
+@user_passes_test(is_owner, login_url='/accounts/login/owner/')
+def owner_download_profile(request, profile_id):
+    """Download a collapsed-stack or pstats profile"""
+    from django.http import Http404
+    from accounts.protected_files import serve_file
+    from beauty_clinic_django.profiling import ProfileStore
+    
+    found = ProfileStore().get(profile_id)
+    if found is None:
+        raise Http404("Profile not found.")
+    _, path = found
+    return serve_file(request, path, filename=path.name, content_type='application/octet-stream')
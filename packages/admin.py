@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import Package, PackageBooking, PackageAppointment
+from django.contrib import admin, messages
+from .models import Package, PackageBooking, PackageAppointment, PackageSessionUse
+from .sessions import NoSessionsRemaining, complete_package_appointment
 
 
 @admin.register(Package)
@@ -15,8 +16,8 @@ class PackageAdmin(admin.ModelAdmin):
 @admin.register(PackageBooking)
 class PackageBookingAdmin(admin.ModelAdmin):
     """Admin for PackageBooking model"""
-    list_display = ('patient', 'package', 'sessions_remaining', 'valid_until', 'created_at')
-    list_filter = ('created_at', 'valid_until')
+    list_display = ('patient', 'package', 'sessions_remaining', 'status', 'valid_until', 'created_at')
+    list_filter = ('status', 'created_at', 'valid_until')
     search_fields = ('patient__first_name', 'patient__last_name', 'package__package_name')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'updated_at')
@@ -29,4 +30,27 @@ class PackageAppointmentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'appointment_date', 'created_at')
     search_fields = ('booking__patient__first_name', 'booking__patient__last_name', 'booking__package__package_name')
     ordering = ('-appointment_date', '-appointment_time')
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+    actions = ['complete_appointments']
+
+    @admin.action(description='Mark completed (uses one package session)')
+    def complete_appointments(self, request, queryset):
+        completed = 0
+        for appointment in queryset:
+            try:
+                if complete_package_appointment(appointment, request.user) is not None:
+                    completed += 1
+            except NoSessionsRemaining:
+                self.message_user(request, f'{appointment}: no package sessions left.', messages.ERROR)
+        self.message_user(request, f'{completed} package appointment(s) completed.')
+
+
+@admin.register(PackageSessionUse)
+class PackageSessionUseAdmin(admin.ModelAdmin):
+    """Admin for the package session ledger (read-only)"""
+    list_display = ('booking', 'appointment', 'sessions_remaining_after', 'performed_by', 'created_at')
+    ordering = ('-created_at',)
+    readonly_fields = ('booking', 'appointment', 'sessions_remaining_after', 'performed_by', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
\ No newline at end of file
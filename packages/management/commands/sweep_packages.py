@@ -0,0 +1,39 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from packages.sessions import BATCH_SIZE, REMINDER_DAYS, sweep_package_bookings
+
+
+class Command(BaseCommand):
+    help = 'Move package bookings into their grace period or expiry and remind patients of packages expiring soon (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Treat this day as today, YYYY-MM-DD (default: today)')
+        parser.add_argument('--reminder-days', type=int, default=REMINDER_DAYS,
+                            help=f'Remind patients this many days before valid_until (default: {REMINDER_DAYS})')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Bookings per UPDATE / notification insert (default: {BATCH_SIZE})')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what is due')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['reminder_days'] < 0:
+            raise CommandError('--reminder-days must not be negative')
+
+        started = time.monotonic()
+        counts = sweep_package_bookings(
+            today=options['date'],
+            reminder_days=options['reminder_days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'due' if options['dry_run'] else 'moved'
+        self.stdout.write(f"  all sessions used: {counts['used_up']} {verb}")
+        self.stdout.write(f"  expired:           {counts['expired']} {verb}")
+        self.stdout.write(f"  grace period:      {counts['grace']} {verb}")
+        self.stdout.write(f"  expiry reminders:  {counts['reminded']} {'due' if options['dry_run'] else 'sent'}")
+        self.stdout.write(self.style.SUCCESS(f'✓ Package sweep finished in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0002_package_archived'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='packagebooking',
+            index=models.Index(fields=['patient', '-created_at'], name='pkgbooking_patient_idx'),
+        ),
+    ]
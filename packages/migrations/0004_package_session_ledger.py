@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def backfill_status(apps, schema_editor):
+    # Same rules as packages.sessions.sweep_package_bookings, without reminders
+    PackageBooking = apps.get_model('packages', 'PackageBooking')
+    today = timezone.localdate()
+    PackageBooking.objects.filter(sessions_remaining__lte=0).update(status='used_up')
+    PackageBooking.objects.filter(status='active').filter(
+        Q(grace_period_until__lt=today) | Q(grace_period_until__isnull=True, valid_until__lt=today)
+    ).update(status='expired')
+    PackageBooking.objects.filter(status='active', valid_until__lt=today, grace_period_until__gte=today).update(status='grace')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0003_package_booking_patient_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageSessionUse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sessions_remaining_after', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'package_session_uses',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='packagebooking',
+            name='expiry_reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='packagebooking',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('grace', 'In Grace Period'), ('expired', 'Expired'), ('used_up', 'All Sessions Used')], default='active', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='packagebooking',
+            index=models.Index(fields=['status', 'valid_until'], name='pkgbooking_status_valid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagebooking',
+            index=models.Index(fields=['status', 'grace_period_until'], name='pkgbooking_status_grace_idx'),
+        ),
+        migrations.AddField(
+            model_name='packagesessionuse',
+            name='appointment',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='session_use', to='packages.packageappointment'),
+        ),
+        migrations.AddField(
+            model_name='packagesessionuse',
+            name='booking',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_uses', to='packages.packagebooking'),
+        ),
+        migrations.AddField(
+            model_name='packagesessionuse',
+            name='performed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='package_session_uses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_status, migrations.RunPython.noop),
+    ]
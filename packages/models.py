@@ -26,17 +26,37 @@ class PackageBooking(models.Model):
     """Model for package bookings"""
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='package_bookings')
     package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='bookings')
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('grace', 'In Grace Period'),
+        ('expired', 'Expired'),
+        ('used_up', 'All Sessions Used'),
+    ]
+
     sessions_remaining = models.IntegerField(blank=True, null=True)
     valid_until = models.DateField(blank=True, null=True)
     grace_period_until = models.DateField(blank=True, null=True)
+    # Kept current by packages.sessions (session use and the nightly sweep_packages)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    expiry_reminder_sent_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.patient.full_name} - {self.package.package_name}"
 
+    @property
+    def can_book_sessions(self):
+        return self.status in ('active', 'grace') and (self.sessions_remaining or 0) > 0
+
     class Meta:
         db_table = 'package_bookings'
+        indexes = [
+            models.Index(fields=['patient', '-created_at'], name='pkgbooking_patient_idx'),
+            # sweep_packages: bookings of a status by expiry date
+            models.Index(fields=['status', 'valid_until'], name='pkgbooking_status_valid_idx'),
+            models.Index(fields=['status', 'grace_period_until'], name='pkgbooking_status_grace_idx'),
+        ]
 
 
 class PackageAppointment(models.Model):
@@ -60,4 +80,20 @@ class PackageAppointment(models.Model):
         return f"{self.booking.patient.full_name} - {self.appointment_date} {self.appointment_time}"
 
     class Meta:
-        db_table = 'package_appointments'
\ No newline at end of file
+        db_table = 'package_appointments'
+
+
+class PackageSessionUse(models.Model):
+    """Ledger of package sessions used, one row per completed package appointment"""
+    booking = models.ForeignKey(PackageBooking, on_delete=models.CASCADE, related_name='session_uses')
+    appointment = models.OneToOneField(PackageAppointment, on_delete=models.CASCADE, related_name='session_use')
+    sessions_remaining_after = models.IntegerField()
+    performed_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='package_session_uses')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Session used on booking {self.booking_id} ({self.sessions_remaining_after} left)"
+
+    class Meta:
+        db_table = 'package_session_uses'
+        ordering = ['-created_at']
@@ -0,0 +1,157 @@
+"""
+Package session ledger and expiry.
+
+A PackageBooking's status (active, grace, expired, used_up) is stored, not
+re-derived from its dates on every page:
+
+- complete_package_appointment() marks a package appointment completed and
+  uses one of the booking's sessions with a conditional
+  UPDATE ... WHERE sessions_remaining > 0, so two completions racing for the
+  last session cannot both succeed. Each use writes a PackageSessionUse row.
+- sweep_package_bookings() (`manage.py sweep_packages`, run nightly) moves
+  bookings past valid_until into their grace period and past
+  grace_period_until to expired, and sends one reminder to patients whose
+  package expires soon. Every step is an UPDATE / bulk_create over a batch of
+  ids picked with the status indexes, never a loop over bookings.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import PackageAppointment, PackageBooking, PackageSessionUse
+
+USABLE_STATUSES = ('active', 'grace')
+REMINDER_DAYS = 7
+BATCH_SIZE = 1000
+
+
+class NoSessionsRemaining(Exception):
+    """The booking has no sessions left, or is no longer usable"""
+
+
+def complete_package_appointment(appointment, performed_by=None):
+    """
+    Complete a package appointment and use one session of its booking.
+    Returns the sessions left, or None if the appointment was already
+    completed or cancelled. Raises NoSessionsRemaining (and changes nothing)
+    if the booking has none left.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if not PackageAppointment.objects.filter(
+            id=appointment.id, status__in=('pending', 'confirmed'),
+        ).update(status='completed', updated_at=now):
+            return None
+        used = PackageBooking.objects.filter(
+            id=appointment.booking_id, status__in=USABLE_STATUSES, sessions_remaining__gt=0,
+        ).update(sessions_remaining=F('sessions_remaining') - 1, updated_at=now)
+        if not used:
+            raise NoSessionsRemaining(appointment.booking_id)
+        # The booking row stays locked by the UPDATE until commit
+        remaining = PackageBooking.objects.filter(id=appointment.booking_id).values_list(
+            'sessions_remaining', flat=True,
+        ).get()
+        if remaining == 0:
+            PackageBooking.objects.filter(id=appointment.booking_id, sessions_remaining=0).update(status='used_up')
+        PackageSessionUse.objects.create(
+            booking_id=appointment.booking_id, appointment_id=appointment.id,
+            sessions_remaining_after=remaining, performed_by=performed_by,
+        )
+    appointment.status = 'completed'
+    return remaining
+
+
+def booking_status(sessions_remaining, valid_until, grace_period_until, today):
+    """The status the sweep would give a booking on today (bookings written in bulk set it themselves)"""
+    if sessions_remaining is not None and sessions_remaining <= 0:
+        return 'used_up'
+    if valid_until is None or valid_until >= today:
+        return 'active'
+    if grace_period_until is None or grace_period_until < today:
+        return 'expired'
+    return 'grace'
+
+
+def used_up_bookings():
+    return PackageBooking.objects.filter(status__in=USABLE_STATUSES, sessions_remaining__lte=0)
+
+
+def expired_bookings(today):
+    return PackageBooking.objects.filter(status__in=USABLE_STATUSES).filter(
+        Q(grace_period_until__lt=today)
+        | Q(grace_period_until__isnull=True, valid_until__lt=today)
+    )
+
+
+def grace_bookings(today):
+    return PackageBooking.objects.filter(status='active', valid_until__lt=today, grace_period_until__gte=today)
+
+
+def reminder_due_bookings(today, days=REMINDER_DAYS):
+    return PackageBooking.objects.filter(
+        status='active', sessions_remaining__gt=0, expiry_reminder_sent_at__isnull=True,
+        valid_until__gte=today, valid_until__lte=today + timedelta(days=days),
+    )
+
+
+def _transition(bookings, status, batch_size):
+    """Set status on the bookings a queryset matches, batch_size rows per UPDATE"""
+    total = 0
+    while True:
+        ids = list(bookings.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        # Re-filtered, so rows another run already moved are left alone
+        changed = bookings.filter(id__in=ids).update(status=status, updated_at=timezone.now())
+        if not changed:
+            return total
+        total += changed
+
+
+def _send_reminders(bookings, batch_size):
+    """One in-app notification per booking, written batch_size at a time"""
+    from appointments.models import Notification
+
+    sent = 0
+    while True:
+        batch = list(bookings.order_by('id').values(
+            'id', 'patient_id', 'package__package_name', 'valid_until', 'sessions_remaining',
+        )[:batch_size])
+        if not batch:
+            return sent
+        with transaction.atomic():
+            bookings.filter(id__in=[row['id'] for row in batch]).update(expiry_reminder_sent_at=timezone.now())
+            Notification.objects.bulk_create([
+                Notification(
+                    type='package',
+                    title='Package Expiring Soon',
+                    message=(
+                        f"Your {row['package__package_name']} package expires on "
+                        f"{row['valid_until'].strftime('%B %d, %Y')} with {row['sessions_remaining']} "
+                        f"session{'s' if row['sessions_remaining'] != 1 else ''} left. Book your remaining sessions soon."
+                    ),
+                    patient_id=row['patient_id'],
+                )
+                for row in batch
+            ])
+        sent += len(batch)
+
+
+def sweep_package_bookings(today=None, reminder_days=REMINDER_DAYS, batch_size=BATCH_SIZE, dry_run=False):
+    """Apply due status transitions and expiry reminders; returns the count of each"""
+    today = today or timezone.localdate()
+    steps = [
+        ('used_up', used_up_bookings()),
+        ('expired', expired_bookings(today)),
+        ('grace', grace_bookings(today)),
+    ]
+    if dry_run:
+        counts = {status: bookings.count() for status, bookings in steps}
+        counts['reminded'] = reminder_due_bookings(today, reminder_days).count()
+        return counts
+
+    counts = {status: _transition(bookings, status, batch_size) for status, bookings in steps}
+    counts['reminded'] = _send_reminders(reminder_due_bookings(today, reminder_days), batch_size)
+    return counts
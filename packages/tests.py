@@ -0,0 +1,141 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.db.migrations.loader import MigrationLoader
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Attendant, User
+from appointments.models import Notification
+from packages.models import Package, PackageAppointment, PackageBooking, PackageSessionUse
+from packages.sessions import NoSessionsRemaining, complete_package_appointment, sweep_package_bookings
+
+
+class PackageBookingStatusTests(SimpleTestCase):
+    """Sessions can be booked only on usable bookings with sessions left"""
+
+    def test_can_book_sessions(self):
+        self.assertTrue(PackageBooking(status='active', sessions_remaining=2).can_book_sessions)
+        self.assertTrue(PackageBooking(status='grace', sessions_remaining=1).can_book_sessions)
+        self.assertFalse(PackageBooking(status='active', sessions_remaining=0).can_book_sessions)
+        self.assertFalse(PackageBooking(status='active', sessions_remaining=None).can_book_sessions)
+        self.assertFalse(PackageBooking(status='expired', sessions_remaining=3).can_book_sessions)
+
+
+class SweepPackagesCommandTests(SimpleTestCase):
+    def test_rejects_invalid_batch_size(self):
+        with self.assertRaises(CommandError):
+            call_command('sweep_packages', batch_size=0)
+
+
+class PackageLedgerTestCase(TestCase):
+    """A patient, attendant and package to book against"""
+
+    today = date(2025, 6, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('patient', password='x', user_type='patient')
+        cls.attendant = Attendant.objects.create(first_name='A', last_name='B', shift_date=cls.today,
+                                                 shift_time=time(9))
+        cls.package = Package.objects.create(package_name='Glow', price=Decimal('3000.00'), sessions=3,
+                                             duration_days=90, grace_period_days=14)
+
+    def booking(self, sessions_remaining=3, valid_until=None, **fields):
+        valid_until = valid_until or self.today + timedelta(days=60)
+        return PackageBooking.objects.create(
+            patient=self.patient, package=self.package, sessions_remaining=sessions_remaining,
+            valid_until=valid_until, grace_period_until=valid_until + timedelta(days=14), **fields,
+        )
+
+    def appointment(self, booking, status='confirmed'):
+        return PackageAppointment.objects.create(booking=booking, attendant=self.attendant, status=status,
+                                                 appointment_date=self.today, appointment_time=time(10))
+
+
+class CompletePackageAppointmentTests(PackageLedgerTestCase):
+    """Session use against the test database"""
+
+    def test_last_session_uses_up_the_booking(self):
+        booking = self.booking(sessions_remaining=1)
+        appointment = self.appointment(booking)
+        self.assertEqual(complete_package_appointment(appointment), 0)
+        booking.refresh_from_db()
+        self.assertEqual((booking.sessions_remaining, booking.status), (0, 'used_up'))
+        self.assertEqual(PackageSessionUse.objects.get().sessions_remaining_after, 0)
+
+    def test_completing_twice_changes_nothing(self):
+        booking = self.booking()
+        appointment = self.appointment(booking)
+        self.assertEqual(complete_package_appointment(appointment), 2)
+        self.assertIsNone(complete_package_appointment(appointment))
+        booking.refresh_from_db()
+        self.assertEqual(booking.sessions_remaining, 2)
+        self.assertEqual(PackageSessionUse.objects.count(), 1)
+
+    def test_no_sessions_left_rolls_back(self):
+        booking = self.booking(sessions_remaining=0)
+        appointment = self.appointment(booking)
+        with self.assertRaises(NoSessionsRemaining):
+            complete_package_appointment(appointment)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'confirmed')
+        self.assertFalse(PackageSessionUse.objects.exists())
+
+
+class SweepPackageBookingsTests(PackageLedgerTestCase):
+    """Nightly status transitions and reminders against the test database"""
+
+    def test_status_transitions(self):
+        used_up = self.booking(sessions_remaining=0)
+        grace = self.booking(valid_until=self.today - timedelta(days=1))
+        expired = self.booking(valid_until=self.today - timedelta(days=30))
+        active = self.booking()
+        counts = sweep_package_bookings(today=self.today, batch_size=1)
+        self.assertEqual(counts, {'used_up': 1, 'expired': 1, 'grace': 1, 'reminded': 0})
+        statuses = dict(PackageBooking.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[b.id] for b in (used_up, grace, expired, active)], ['used_up', 'grace', 'expired', 'active'],
+        )
+
+    def test_dry_run_changes_nothing(self):
+        self.booking(valid_until=self.today - timedelta(days=30))
+        self.assertEqual(sweep_package_bookings(today=self.today, dry_run=True)['expired'], 1)
+        self.assertEqual(PackageBooking.objects.get().status, 'active')
+
+    def test_one_reminder_per_expiring_booking(self):
+        expiring = self.booking(valid_until=self.today + timedelta(days=3))
+        self.booking(valid_until=self.today + timedelta(days=3), sessions_remaining=0, status='used_up')
+        self.booking()
+        self.assertEqual(sweep_package_bookings(today=self.today)['reminded'], 1)
+        self.assertEqual(sweep_package_bookings(today=self.today)['reminded'], 0)
+        expiring.refresh_from_db()
+        self.assertIsNotNone(expiring.expiry_reminder_sent_at)
+        notification = Notification.objects.get(type='package')
+        self.assertEqual(notification.patient_id, self.patient.id)
+        self.assertIn('June 04, 2025 with 3 sessions left', notification.message)
+
+
+class StatusBackfillMigrationTests(PackageLedgerTestCase):
+    """The status backfill of packages 0004, run on bookings saved before it"""
+
+    def test_backfill_matches_the_sweep(self):
+        # The suite builds tables from the models; load the real migration
+        with override_settings(MIGRATION_MODULES={}):
+            loader = MigrationLoader(None, ignore_no_migrations=True)
+        migration = loader.get_migration('packages', '0004_package_session_ledger')
+        apps = loader.project_state(('packages', '0004_package_session_ledger')).apps
+
+        self.today = timezone.localdate()
+        used_up = self.booking(sessions_remaining=0)
+        grace = self.booking(valid_until=self.today - timedelta(days=1))
+        expired = self.booking(valid_until=self.today - timedelta(days=30))
+        active = self.booking()
+        # backfill_status only runs queries, no schema changes
+        migration.operations[-1].code(apps, None)
+
+        statuses = dict(PackageBooking.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[b.id] for b in (used_up, grace, expired, active)], ['used_up', 'grace', 'expired', 'active'],
+        )
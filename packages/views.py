@@ -2,8 +2,10 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from .models import Package, PackageBooking, PackageAppointment
+from services.catalog_cache import cache_catalog_page, catalog_version
 
 
+@cache_catalog_page
 def packages_list(request):
     """List all packages with filtering"""
     # Get filter parameters
@@ -51,11 +53,13 @@ def packages_list(request):
         'page_obj': page_obj,
         'price_filter': price_filter,
         'category_filter': category_filter,
+        'catalog_version': catalog_version(),
     }
     
     return render(request, 'packages/packages_list.html', context)
 
 
+@cache_catalog_page
 def package_detail(request, package_id):
     """Package detail view"""
     package = get_object_or_404(Package, id=package_id)
@@ -70,7 +74,8 @@ def package_detail(request, package_id):
 @login_required
 def my_packages(request):
     """User's package bookings"""
-    bookings = PackageBooking.objects.filter(patient=request.user).order_by('-created_at')
+    # Status is kept current by packages.sessions, nothing to derive per booking
+    bookings = PackageBooking.objects.filter(patient=request.user).select_related('package').order_by('-created_at')
     
     context = {
         'bookings': bookings,
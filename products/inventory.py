@@ -0,0 +1,223 @@
+"""
+Inventory ledger.
+
+Every change to a product's stock goes through this module as one UPDATE with
+F() expressions, guarded by a condition in the WHERE clause, so concurrent
+pre-orders and restocks cannot lose each other's changes or oversell:
+
+- reserve_stock(): a pre-order (book_product) holds a unit while pending; it
+  fails with InsufficientStock once stock - reserved reaches zero
+- fulfil_preorder(): confirming (or completing straight from pending) a
+  pre-order takes the unit off the shelf and drops its reservation
+- release_preorders(): cancelling pending pre-orders returns their units
+- restock() / set_stock(): staff stock updates
+
+Each change writes a StockMovement row and shifts the single InventorySummary
+row (units, valuation, low and out-of-stock counts) by the same delta, so the
+inventory page reads its totals from one row instead of scanning products.
+Stock movements also refresh the cached catalog pages, which show stock.
+Saving or deleting a Product directly (catalog edits) rebuilds the summary
+after commit; `manage.py rebuild_inventory` rebuilds it and recounts
+reservations from the pending pre-orders.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from services.catalog_cache import bump_catalog_version
+
+from .models import InventorySummary, Product, StockMovement
+
+LOW_STOCK_THRESHOLD = 10
+SUMMARY_ID = 1
+
+
+class InsufficientStock(Exception):
+    """No unreserved stock left for a pre-order"""
+
+
+def _is_low(stock):
+    return stock < LOW_STOCK_THRESHOLD
+
+
+def _is_out(stock):
+    return stock <= 0
+
+
+def _record(product_id, kind, quantity=0, reserved_change=0, stock_after=None, appointment_id=None, performed_by=None):
+    # Catalog pages show stock; the UPDATEs here bypass the signals that refresh them
+    transaction.on_commit(bump_catalog_version)
+    return StockMovement.objects.create(
+        product_id=product_id, kind=kind, quantity=quantity, reserved_change=reserved_change,
+        stock_after=stock_after, appointment_id=appointment_id, performed_by=performed_by,
+    )
+
+
+def rebuild_summary():
+    """Recompute the summary row from the products table"""
+    value = ExpressionWrapper(F('price') * F('stock'), output_field=DecimalField(max_digits=16, decimal_places=2))
+    totals = Product.objects.aggregate(
+        total_products=Count('id'),
+        total_units=Coalesce(Sum('stock'), 0),
+        total_value=Coalesce(Sum(value), Value(Decimal('0')), output_field=DecimalField(max_digits=16, decimal_places=2)),
+        low_stock_count=Count('id', filter=Q(stock__lt=LOW_STOCK_THRESHOLD)),
+        out_of_stock_count=Count('id', filter=Q(stock__lte=0)),
+    )
+    summary, _ = InventorySummary.objects.update_or_create(id=SUMMARY_ID, defaults=totals)
+    return summary
+
+
+def get_summary():
+    """The inventory summary row, built on first use"""
+    summary = InventorySummary.objects.filter(id=SUMMARY_ID).first()
+    return summary if summary is not None else rebuild_summary()
+
+
+def _shift_summary(price, old_stock, new_stock):
+    """Apply one product's stock change to the summary row"""
+    delta = new_stock - old_stock
+    if not delta:
+        return
+    updated = InventorySummary.objects.filter(id=SUMMARY_ID).update(
+        total_units=F('total_units') + delta,
+        total_value=F('total_value') + price * delta,
+        low_stock_count=F('low_stock_count') + (_is_low(new_stock) - _is_low(old_stock)),
+        out_of_stock_count=F('out_of_stock_count') + (_is_out(new_stock) - _is_out(old_stock)),
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        # Sees this transaction's change, so nothing is applied twice
+        rebuild_summary()
+
+
+def _change_stock(product_id, delta, reserved_change=0):
+    """
+    Shift stock by delta (and reserved by reserved_change) in one conditional
+    UPDATE: stock may not go below zero, nor reserved below zero. Returns
+    (old_stock, new_stock, price), or None if the condition failed.
+    Call inside a transaction.
+    """
+    products = Product.objects.filter(id=product_id)
+    if delta < 0:
+        products = products.filter(stock__gte=-delta)
+    if reserved_change < 0:
+        products = products.filter(reserved__gte=-reserved_change)
+    if not products.update(
+        stock=F('stock') + delta, reserved=F('reserved') + reserved_change, updated_at=timezone.now(),
+    ):
+        return None
+    # The row stays locked by the UPDATE until commit, so this reads our own change
+    new_stock, price = Product.objects.filter(id=product_id).values_list('stock', 'price').get()
+    return new_stock - delta, new_stock, price
+
+
+def reserve_stock(product_id, appointment_id=None, performed_by=None, quantity=1):
+    """Hold units for a pending pre-order; raises InsufficientStock if none are free"""
+    with transaction.atomic():
+        reserved = Product.objects.filter(id=product_id, stock__gte=F('reserved') + quantity).update(
+            reserved=F('reserved') + quantity, updated_at=timezone.now(),
+        )
+        if not reserved:
+            raise InsufficientStock(product_id)
+        _record(product_id, 'reserve', reserved_change=quantity, appointment_id=appointment_id, performed_by=performed_by)
+
+
+def fulfil_preorder(product_id, appointment_id=None, performed_by=None, quantity=1):
+    """
+    Take a confirmed pre-order's units off the shelf and drop its reservation.
+    Pre-orders placed before reservations existed hold none, so only stock is
+    deducted for them. Returns the new stock, or None if none was left (the
+    reservation is still dropped: the pre-order no longer waits for it).
+    """
+    with transaction.atomic():
+        reserved_change = -quantity
+        change = _change_stock(product_id, -quantity, reserved_change)
+        if change is None:
+            reserved_change = 0
+            change = _change_stock(product_id, -quantity)
+        if change is None:
+            if Product.objects.filter(id=product_id, reserved__gte=quantity).update(
+                reserved=F('reserved') - quantity, updated_at=timezone.now(),
+            ):
+                _record(product_id, 'release', reserved_change=-quantity,
+                        appointment_id=appointment_id, performed_by=performed_by)
+            return None
+        old_stock, new_stock, price = change
+        _record(product_id, 'fulfil', -quantity, reserved_change, new_stock, appointment_id, performed_by)
+        _shift_summary(price, old_stock, new_stock)
+    return new_stock
+
+
+def release_preorders(appointments, performed_by=None):
+    """Return the reserved units of pending product pre-orders that are being cancelled"""
+    pending = [a for a in appointments if a.product_id and a.status == 'pending']
+    if not pending:
+        return
+    with transaction.atomic():
+        for product_id, quantity in Counter(a.product_id for a in pending).items():
+            Product.objects.filter(id=product_id).update(
+                reserved=Greatest(F('reserved') - quantity, 0), updated_at=timezone.now(),
+            )
+        transaction.on_commit(bump_catalog_version)
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product_id=a.product_id, kind='release', reserved_change=-1,
+                appointment_id=a.id, performed_by=performed_by,
+            )
+            for a in pending
+        ])
+
+
+def restock(product_id, quantity, performed_by=None):
+    """Add units on hand; returns the new stock"""
+    with transaction.atomic():
+        old_stock, new_stock, price = _change_stock(product_id, quantity)
+        _record(product_id, 'restock', quantity, stock_after=new_stock, performed_by=performed_by)
+        _shift_summary(price, old_stock, new_stock)
+    return new_stock
+
+
+def set_stock(product_id, quantity, performed_by=None):
+    """Set the units on hand to a counted total; returns the new stock"""
+    with transaction.atomic():
+        old_stock, price = Product.objects.select_for_update().filter(id=product_id).values_list('stock', 'price').get()
+        if old_stock == quantity:
+            return quantity
+        Product.objects.filter(id=product_id).update(stock=quantity, updated_at=timezone.now())
+        _record(product_id, 'set', quantity - old_stock, stock_after=quantity, performed_by=performed_by)
+        _shift_summary(price, old_stock, quantity)
+    return quantity
+
+
+def rebuild_reservations():
+    """Recount reserved units from pending pre-orders; returns the number of products changed"""
+    from appointments.models import Appointment
+
+    pending = dict(
+        Appointment.objects.filter(status='pending', product__isnull=False)
+        .values('product_id').annotate(total=Count('id')).values_list('product_id', 'total')
+    )
+    changed = []
+    for product in Product.objects.only('id', 'reserved'):
+        reserved = pending.get(product.id, 0)
+        if product.reserved != reserved:
+            product.reserved = reserved
+            changed.append(product)
+    Product.objects.bulk_update(changed, ['reserved'], batch_size=500)
+    return len(changed)
+
+
+# Catalog edits save Product directly; rebuild once the edit has committed
+def _product_changed(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(rebuild_summary)
+
+
+def connect_inventory_signals():
+    post_save.connect(_product_changed, sender=Product, dispatch_uid='inventory-summary-product')
+    post_delete.connect(_product_changed, sender=Product, dispatch_uid='inventory-summary-product')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.inventory import rebuild_reservations, rebuild_summary
+
+
+class Command(BaseCommand):
+    help = 'Recount reserved stock from pending pre-orders and rebuild the inventory summary row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--summary-only', action='store_true',
+                            help='Only rebuild the summary, leave reservations as they are')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not options['summary_only']:
+                changed = rebuild_reservations()
+                self.stdout.write(f'Reservations corrected on {changed} product{"s" if changed != 1 else ""}')
+            summary = rebuild_summary()
+
+        self.stdout.write(
+            f'{summary.total_products} products, {summary.total_units} units, '
+            f'value ₱{summary.total_value:,.2f}, {summary.low_stock_count} low, '
+            f'{summary.out_of_stock_count} out of stock'
+        )
+        self.stdout.write(self.style.SUCCESS('✓ Inventory summary rebuilt'))
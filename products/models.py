@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 
@@ -7,6 +8,7 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
+    reserved = models.IntegerField(default=0, help_text='Units held by pending pre-orders')
     product_image = models.ImageField(upload_to='products/', blank=True, null=True)
     archived = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -15,9 +17,18 @@ class Product(models.Model):
     def __str__(self):
         return self.product_name
 
+    @property
+    def available_stock(self):
+        """Units that can still be pre-ordered"""
+        return max(self.stock - self.reserved, 0)
+
     class Meta:
         db_table = 'products'
         ordering = ['product_name']
+        indexes = [
+            # Low and out-of-stock lists on the inventory page
+            models.Index(fields=['stock'], name='product_stock_idx'),
+        ]
 
 
 class ProductImage(models.Model):
@@ -33,4 +44,49 @@ class ProductImage(models.Model):
 
     class Meta:
         db_table = 'product_images'
-        ordering = ['-is_primary', '-created_at']
\ No newline at end of file
+        ordering = ['-is_primary', '-created_at']
+
+class StockMovement(models.Model):
+    """Ledger entry for a change to a product's stock or reservations (see products.inventory)"""
+    KIND_CHOICES = [
+        ('restock', 'Restock'),
+        ('set', 'Stock count set'),
+        ('reserve', 'Reserved for pre-order'),
+        ('release', 'Reservation released'),
+        ('fulfil', 'Pre-order fulfilled'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.IntegerField(default=0, help_text='Change to the units on hand')
+    reserved_change = models.IntegerField(default=0, help_text='Change to the units reserved')
+    stock_after = models.IntegerField(blank=True, null=True)
+    appointment_id = models.IntegerField(blank=True, null=True)
+    performed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='stock_movements')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.product_id}: {self.quantity:+d}"
+
+    class Meta:
+        db_table = 'stock_movements'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', '-created_at'], name='stockmove_product_idx'),
+        ]
+
+
+class InventorySummary(models.Model):
+    """Single row of inventory totals, kept current by products.inventory"""
+    total_products = models.IntegerField(default=0)
+    total_units = models.BigIntegerField(default=0)
+    total_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    low_stock_count = models.IntegerField(default=0)
+    out_of_stock_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Inventory: {self.total_products} products, {self.total_units} units"
+
+    class Meta:
+        db_table = 'inventory_summary'
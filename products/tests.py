@@ -1,3 +1,122 @@
-from django.test import TestCase
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db.models.expressions import CombinedExpression
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from products import inventory
+from products.models import Product
+
+
+class AvailableStockTests(SimpleTestCase):
+    """Units left for pre-orders once reservations are held"""
+
+    def test_reserved_units_are_not_available(self):
+        self.assertEqual(Product(stock=12, reserved=5).available_stock, 7)
+        self.assertEqual(Product(stock=3, reserved=5).available_stock, 0)
+
+
+class SummaryShiftTests(SimpleTestCase):
+    """Incremental updates of the inventory summary row"""
+
+    def shift(self, price, old_stock, new_stock):
+        with mock.patch.object(inventory.InventorySummary.objects, 'filter') as summary_filter:
+            summary_filter.return_value.update.return_value = 1
+            inventory._shift_summary(price, old_stock, new_stock)
+        if not summary_filter.called:
+            return None
+        changes = summary_filter.return_value.update.call_args.kwargs
+        # F('field') + delta: keep the delta
+        return {
+            field: value.rhs.value for field, value in changes.items() if isinstance(value, CombinedExpression)
+        }
+
+    def test_crossing_into_low_and_out_of_stock(self):
+        self.assertEqual(self.shift(Decimal('250.00'), 12, 0), {
+            'total_units': -12, 'total_value': Decimal('-3000.00'),
+            'low_stock_count': 1, 'out_of_stock_count': 1,
+        })
+
+    def test_restock_out_of_stock_product(self):
+        self.assertEqual(self.shift(Decimal('100.00'), 0, 4), {
+            'total_units': 4, 'total_value': Decimal('400.00'),
+            'low_stock_count': 0, 'out_of_stock_count': -1,
+        })
+
+    def test_no_change_skips_the_update(self):
+        self.assertIsNone(self.shift(Decimal('100.00'), 5, 5))
+
+
+class PreorderReservationTests(TestCase):
+    """Reservations held by pending pre-orders, against the test database"""
+
+    def setUp(self):
+        self.product = Product.objects.create(product_name='Serum', price=Decimal('500.00'), stock=3)
+
+    def refresh(self):
+        self.product.refresh_from_db()
+        return self.product.stock, self.product.reserved
+
+    def movements(self):
+        return list(self.product.stock_movements.order_by('id').values_list('kind', 'quantity', 'reserved_change'))
+
+    def test_reserve_holds_a_unit_without_taking_it(self):
+        inventory.reserve_stock(self.product.id, appointment_id=1)
+        self.assertEqual(self.refresh(), (3, 1))
+        self.assertEqual(self.movements(), [('reserve', 0, 1)])
+
+    def test_fulfil_takes_the_unit_and_drops_the_reservation(self):
+        inventory.reserve_stock(self.product.id, appointment_id=1)
+        self.assertEqual(inventory.fulfil_preorder(self.product.id, appointment_id=1), 2)
+        self.assertEqual(self.refresh(), (2, 0))
+        self.assertEqual(inventory.get_summary().total_units, 2)
+
+    def test_fulfil_without_stock_still_drops_the_reservation(self):
+        inventory.reserve_stock(self.product.id, appointment_id=1)
+        Product.objects.filter(id=self.product.id).update(stock=0)
+        self.assertIsNone(inventory.fulfil_preorder(self.product.id, appointment_id=1))
+        self.assertEqual(self.refresh(), (0, 0))
+        self.assertEqual(self.movements()[-1], ('release', 0, -1))
+
+    def test_release_returns_pending_reservations_only(self):
+        inventory.reserve_stock(self.product.id, appointment_id=1)
+        inventory.reserve_stock(self.product.id, appointment_id=2)
+        inventory.release_preorders([
+            SimpleNamespace(id=1, product_id=self.product.id, status='pending'),
+            SimpleNamespace(id=2, product_id=self.product.id, status='confirmed'),
+        ])
+        self.assertEqual(self.refresh(), (3, 1))
+
+    def test_last_unit_cannot_be_reserved_twice(self):
+        Product.objects.filter(id=self.product.id).update(stock=1)
+        inventory.reserve_stock(self.product.id, appointment_id=1)
+        with self.assertRaises(inventory.InsufficientStock):
+            inventory.reserve_stock(self.product.id, appointment_id=2)
+        self.assertEqual(self.refresh(), (1, 1))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CompletePendingPreorderTests(TestCase):
+    """Completing a pre-order straight from pending hands over its reserved unit"""
+
+    def test_admin_complete(self):
+        from datetime import date, time
+
+        from accounts.models import Attendant, User
+        from appointments.models import Appointment
+
+        product = Product.objects.create(product_name='Serum', price=Decimal('500.00'), stock=2)
+        patient = User.objects.create_user('patient', password='x', user_type='patient')
+        admin = User.objects.create_user('admin', password='x', user_type='admin')
+        attendant = Attendant.objects.create(first_name='A', last_name='B', shift_date=date(2025, 1, 1),
+                                             shift_time=time(9))
+        appointment = Appointment.objects.create(patient=patient, attendant=attendant, product=product,
+                                                 appointment_date=date(2025, 1, 2), appointment_time=time(10))
+        inventory.reserve_stock(product.id, appointment.id)
+
+        self.client.force_login(admin)
+        self.client.get(f'/appointments/admin/complete/{appointment.id}/')
+
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (1, 0))
@@ -1,8 +1,10 @@
 from django.shortcuts import render
 from django.core.paginator import Paginator
 from .models import Product
+from services.catalog_cache import cache_catalog_page, catalog_version
 
 
+@cache_catalog_page
 def products_list(request):
     """List all products"""
     products = Product.objects.filter(archived=False).order_by('product_name')
@@ -15,11 +17,13 @@ def products_list(request):
     context = {
         'products': page_obj,
         'page_obj': page_obj,
+        'catalog_version': catalog_version(),
     }
     
     return render(request, 'products/products_list.html', context)
 
 
+@cache_catalog_page
 def product_detail(request, product_id):
     """Product detail view"""
     from django.shortcuts import get_object_or_404
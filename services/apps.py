@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'services'
+
+    def ready(self):
+        from .catalog_cache import connect_catalog_signals
+        from .signals import connect_image_signals
+        connect_image_signals()
+        connect_catalog_signals()
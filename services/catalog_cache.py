@@ -0,0 +1,109 @@
+"""
+Versioned caching for the public catalog (services, products, packages).
+
+All catalog cache keys include a catalog version number stored in the cache.
+Saving or deleting a Service, ServiceCategory, Product, Package or one of
+their images bumps the version (after the transaction commits), so every
+cached page and fragment becomes unreachable at once and simply expires; no
+key has to be tracked or deleted.
+
+Two layers use the version:
+
+- @cache_catalog_page caches whole responses for anonymous GET requests
+  (CATALOG_PAGE_CACHE_TIMEOUT). Responses that set cookies, requests carrying
+  flash messages and non-200 responses are never cached.
+- Templates wrap the catalog grids in {% cache %} with catalog_version in the
+  vary-on list, which serves logged-in users who bypass the page cache.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+VERSION_KEY = 'catalog:version'
+PAGE_KEY_PREFIX = 'catalog:page'
+DEFAULT_PAGE_TIMEOUT = 60 * 15
+
+
+def catalog_version():
+    """Current catalog version (starts at 1, never expires)"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog page and fragment"""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing (evicted or never read): start a new version line
+        cache.set(VERSION_KEY, 2, timeout=None)
+        return 2
+
+
+def _invalidate_on_commit(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+def catalog_models():
+    from packages.models import Package
+    from products.models import Product, ProductImage
+    from services.models import ImageDerivative, Service, ServiceCategory, ServiceImage
+
+    # ImageDerivative: pages switch to srcset markup once derivatives exist
+    return (Service, ServiceCategory, ServiceImage, Product, ProductImage, Package, ImageDerivative)
+
+
+def connect_catalog_signals():
+    for model in catalog_models():
+        uid = f'catalog-cache-{model._meta.label_lower}'
+        post_save.connect(_invalidate_on_commit, sender=model, dispatch_uid=uid)
+        post_delete.connect(_invalidate_on_commit, sender=model, dispatch_uid=uid)
+
+
+def page_cache_key(request):
+    # Query parameters in a canonical order so ?a=1&b=2 and ?b=2&a=1 share a key
+    query = '&'.join(f'{key}={value}' for key, value in sorted(request.GET.items()))
+    url = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'{PAGE_KEY_PREFIX}:{catalog_version()}:{url}'
+
+
+def _cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def cache_catalog_page(view_func):
+    """Serve anonymous GETs of a catalog page from the shared cache"""
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable_request(request):
+            return view_func(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        response = cache.get(key)
+        if response is not None:
+            return response
+
+        response = view_func(request, *args, **kwargs)
+        if (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        ):
+            cache.set(key, response, getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', DEFAULT_PAGE_TIMEOUT))
+        return response
+    return wrapper
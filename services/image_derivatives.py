@@ -0,0 +1,192 @@
+"""
+Responsive image derivatives for service and product photos.
+
+Every uploaded image is resized with Pillow to a few fixed widths and encoded
+as WebP and JPEG. Derivatives are keyed by the SHA-256 of the original file,
+so the same photo uploaded twice (or attached to several services) is only
+processed and stored once:
+
+    derivatives/ab/abcdef.../320.webp
+    derivatives/ab/abcdef.../320.jpg
+    ...
+
+Files go through default_storage, so the same code works with MEDIA_ROOT on
+disk and with remote storages such as Cloudinary. The ImageDerivative table
+maps an original file name to its hash and the widths that were generated.
+"""
+import hashlib
+import io
+import logging
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (320, 640, 1024)
+DERIVATIVE_ROOT = 'derivatives'
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# (extension, Pillow format, mime type)
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+
+CACHE_TIMEOUT = 60 * 60 * 24
+FAILURE_CACHE_TIMEOUT = 60 * 10
+
+HASH_READ_SIZE = 1024 * 1024
+
+
+def image_sources():
+    """(model, field name) pairs whose uploads get derivatives"""
+    from products.models import Product, ProductImage
+    from .models import Service, ServiceImage
+
+    return [
+        (Service, 'image'),
+        (ServiceImage, 'image'),
+        (Product, 'product_image'),
+        (ProductImage, 'image'),
+    ]
+
+
+def derivative_name(content_hash, width, ext):
+    return f'{DERIVATIVE_ROOT}/{content_hash[:2]}/{content_hash}/{width}.{ext}'
+
+
+def _cache_key(source_name):
+    return 'image-derivative:' + hashlib.sha1(source_name.encode('utf-8')).hexdigest()
+
+
+def hash_file(name, storage=None):
+    """SHA-256 of a stored file, read in blocks"""
+    storage = storage or default_storage
+    digest = hashlib.sha256()
+    with storage.open(name, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode(image, pil_format):
+    buffer = io.BytesIO()
+    if pil_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            # JPEG has no alpha channel: flatten onto white
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def build_derivatives(source_name, storage=None, widths=DERIVATIVE_WIDTHS):
+    """
+    Generate the derivatives of one stored image.
+
+    Returns (content_hash, widths) without touching the database, so it can
+    run in worker processes. Widths larger than the original are replaced by
+    the original width (images are never upscaled).
+    """
+    storage = storage or default_storage
+    content_hash = hash_file(source_name, storage)
+
+    with storage.open(source_name, 'rb') as f:
+        with Image.open(f) as original:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+
+    targets = sorted({min(width, original.width) for width in widths})
+    for width in targets:
+        names = [(derivative_name(content_hash, width, ext), pil_format) for ext, pil_format, _ in FORMATS]
+        if all(storage.exists(name) for name, _ in names):
+            continue
+        height = max(1, round(original.height * width / original.width))
+        resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+        for name, pil_format in names:
+            if not storage.exists(name):
+                storage.save(name, ContentFile(_encode(resized, pil_format)))
+    return content_hash, targets
+
+
+def record_derivatives(source_name, content_hash, widths):
+    """Store the name -> hash mapping and prime the cache"""
+    from .models import ImageDerivative
+
+    ImageDerivative.objects.update_or_create(
+        source_name=source_name,
+        defaults={'content_hash': content_hash, 'widths': list(widths)},
+    )
+    entry = {'hash': content_hash, 'widths': list(widths)}
+    cache.set(_cache_key(source_name), entry, CACHE_TIMEOUT)
+    return entry
+
+
+def ensure_derivatives(source_name, storage=None):
+    """Generate and record derivatives for a stored image. Returns the entry or None"""
+    try:
+        content_hash, widths = build_derivatives(source_name, storage)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning('Could not build image derivatives for %s: %s', source_name, e)
+        cache.set(_cache_key(source_name), False, FAILURE_CACHE_TIMEOUT)
+        return None
+    return record_derivatives(source_name, content_hash, widths)
+
+
+def get_derivatives(field_file, generate=True):
+    """
+    Return {'hash': ..., 'widths': [...]} for an image field value, or None.
+
+    Looks in the cache, then the database, and (when generate is True) builds
+    the derivatives on first use.
+    """
+    if not field_file or not getattr(field_file, 'name', None):
+        return None
+    source_name = field_file.name
+    key = _cache_key(source_name)
+
+    entry = cache.get(key)
+    if entry is False:
+        return None
+    if entry:
+        return entry
+
+    from .models import ImageDerivative
+
+    row = ImageDerivative.objects.filter(source_name=source_name).values('content_hash', 'widths').first()
+    if row:
+        entry = {'hash': row['content_hash'], 'widths': row['widths']}
+        cache.set(key, entry, CACHE_TIMEOUT)
+        return entry
+
+    if not generate:
+        return None
+    return ensure_derivatives(source_name, field_file.storage)
+
+
+def srcset(entry, ext, storage=None):
+    """srcset attribute value for one format"""
+    storage = storage or default_storage
+    return ', '.join(
+        f"{storage.url(derivative_name(entry['hash'], width, ext))} {width}w"
+        for width in entry['widths']
+    )
+
+
+def forget_derivatives(source_name):
+    """Drop the mapping for a replaced/deleted original (files stay shared)"""
+    from .models import ImageDerivative
+
+    ImageDerivative.objects.filter(source_name=source_name).delete()
+    cache.delete(_cache_key(source_name))
@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from PIL import Image, UnidentifiedImageError
+
+from services.image_derivatives import build_derivatives, image_sources, record_derivatives
+from services.models import ImageDerivative
+
+
+def _build(source_name):
+    """Worker: resize/encode only; the parent process writes the database rows"""
+    try:
+        content_hash, widths = build_derivatives(source_name)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        return source_name, None, str(e)
+    return source_name, (content_hash, widths), None
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive WebP/JPEG derivatives for existing service and product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (default: CPU count, 1 = no pool)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild images that already have derivatives recorded',
+        )
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field_name in image_sources():
+            names.update(
+                name for name in model.objects.exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True)
+            )
+        if not options['force']:
+            names -= set(ImageDerivative.objects.filter(source_name__in=names).values_list('source_name', flat=True))
+        names = sorted(names)
+
+        if not names:
+            self.stdout.write(self.style.SUCCESS('All images already have derivatives.'))
+            return
+
+        self.stdout.write(f'Generating derivatives for {len(names)} image(s)...')
+        built = failed = 0
+
+        def collect(source_name, result, error):
+            nonlocal built, failed
+            if error:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'  ✗ {source_name}: {error}'))
+                return
+            record_derivatives(source_name, *result)
+            built += 1
+
+        workers = max(1, options['workers'])
+        if workers == 1:
+            for name in names:
+                collect(*_build(name))
+        else:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_build, name) for name in names]
+                for future in as_completed(futures):
+                    collect(*future.result())
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Built derivatives for {built} image(s), {failed} failed'))
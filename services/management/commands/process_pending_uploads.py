@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from services.models import UploadedBlob
+from services.uploads import transfer_blob
+
+
+class Command(BaseCommand):
+    help = 'Transfer spooled uploads that are still pending (e.g. after a restart) to storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also retry uploads marked as failed whose spool file still exists',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            UploadedBlob.objects.filter(status=UploadedBlob.STATUS_FAILED).exclude(spool_path='').update(
+                status=UploadedBlob.STATUS_PENDING, attempts=0
+            )
+
+        blobs = list(UploadedBlob.objects.filter(status=UploadedBlob.STATUS_PENDING).order_by('created_at'))
+        if not blobs:
+            self.stdout.write(self.style.SUCCESS('No pending uploads.'))
+            return
+
+        stored = 0
+        for blob in blobs:
+            if not os.path.exists(blob.spool_path):
+                self.stdout.write(self.style.WARNING(f'  ✗ {blob.name}: spool file {blob.spool_path} is missing'))
+                blob.status = UploadedBlob.STATUS_FAILED
+                blob.error = 'Spool file missing'
+                blob.save(update_fields=['status', 'error'])
+                continue
+            if transfer_blob(blob.pk):
+                stored += 1
+                self.stdout.write(f'  ✓ {blob.name}')
+            else:
+                self.stdout.write(self.style.WARNING(f'  ✗ {blob.name}: transfer failed'))
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Transferred {stored} of {len(blobs)} pending upload(s)'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0006_image_derivative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='app_label.model.field the file belongs to', max_length=100)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('size', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending transfer'), ('stored', 'Stored'), ('failed', 'Failed')], default='stored', max_length=10)),
+                ('spool_path', models.CharField(blank=True, max_length=500)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('stored_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'uploaded_blobs',
+                'unique_together': {('scope', 'content_hash')},
+            },
+        ),
+    ]
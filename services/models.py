@@ -77,4 +77,48 @@ class HistoryLog(models.Model):
 
     class Meta:
         db_table = 'history_log'
-        ordering = ['-datetime']
\ No newline at end of file
+        ordering = ['-datetime']
+
+class ImageDerivative(models.Model):
+    """Responsive derivatives generated for an uploaded image (see image_derivatives.py)"""
+    source_name = models.CharField(max_length=255, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    widths = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source_name} ({self.content_hash[:12]})"
+
+    class Meta:
+        db_table = 'image_derivatives'
+
+
+class UploadedBlob(models.Model):
+    """One stored upload per (field, content hash); see uploads.py"""
+    STATUS_PENDING = 'pending'
+    STATUS_STORED = 'stored'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending transfer'),
+        (STATUS_STORED, 'Stored'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    scope = models.CharField(max_length=100, help_text="app_label.model.field the file belongs to")
+    content_hash = models.CharField(max_length=64)
+    name = models.CharField(max_length=255, db_index=True)
+    size = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_STORED)
+    spool_path = models.CharField(max_length=500, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    stored_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+    class Meta:
+        db_table = 'uploaded_blobs'
+        unique_together = ['scope', 'content_hash']
@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, post_save
+
+from .image_derivatives import ensure_derivatives, forget_derivatives, get_derivatives, image_sources
+from .uploads import is_pending, upload_scope, upload_stored
+
+
+def _build_on_save(field_name):
+    def handler(sender, instance, raw=False, **kwargs):
+        if raw:
+            # loaddata / backup restores: originals may not be in storage yet
+            return
+        field_file = getattr(instance, field_name)
+        if not field_file or is_pending(field_file.name):
+            # Background uploads are handled by _build_on_store once transferred
+            return
+        get_derivatives(field_file, generate=True)
+    return handler
+
+
+def _forget_on_delete(field_name):
+    def handler(sender, instance, **kwargs):
+        field_file = getattr(instance, field_name)
+        if field_file:
+            forget_derivatives(field_file.name)
+    return handler
+
+
+def _build_on_store(sender, name, scope, **kwargs):
+    for model, field_name in image_sources():
+        if upload_scope(model, field_name) == scope:
+            ensure_derivatives(name, model._meta.get_field(field_name).storage)
+            return
+
+
+def connect_image_signals():
+    for model, field_name in image_sources():
+        uid = f'image-derivatives-{model._meta.label_lower}'
+        post_save.connect(_build_on_save(field_name), sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(_forget_on_delete(field_name), sender=model, weak=False, dispatch_uid=uid)
+    upload_stored.connect(_build_on_store, dispatch_uid='image-derivatives-upload-stored')
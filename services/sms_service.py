@@ -1,8 +1,9 @@
-import requests
 import json
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
+from beauty_clinic_django.async_http import async_client
+
 class IPROGSMSService:
     """
     IPROG SMS API Service for sending SMS notifications
@@ -55,6 +56,9 @@ class IPROGSMSService:
             'message': message
         }
         
+        # Imported on first send: requests adds noticeably to startup time
+        import requests
+
         try:
             # Debug logging
             print(f"SMS API Debug - URL: {url}")
@@ -71,19 +75,7 @@ class IPROGSMSService:
                     response_data = response.json()
                     print(f"SMS API Debug - Response Data: {response_data}")
                     
-                    # Check if the API response indicates success
-                    if response_data.get('status') == 200:
-                        return {
-                            'success': True,
-                            'data': response_data,
-                            'message': response_data.get('message', 'SMS sent successfully')
-                        }
-                    else:
-                        return {
-                            'success': False,
-                            'error': f"API Error: {response_data.get('message', 'Unknown error')}",
-                            'message': f"Failed to send SMS: {response_data.get('message', 'Unknown error')}"
-                        }
+                    return self._api_result(response_data)
                 except json.JSONDecodeError:
                     return {
                         'success': False,
@@ -108,6 +100,66 @@ class IPROGSMSService:
                 'message': f'Unexpected error occurred: {str(e)}'
             }
     
+    async def asend_sms(self, phone, message, sender_id="BEAUTY"):
+        """
+        Async send_sms for async views: awaits the IPROG SMS API with the
+        shared httpx client instead of blocking the worker.
+
+        Returns the same dict as send_sms.
+        """
+        if self.disabled:
+            return {
+                'success': False,
+                'error': 'SMS service disabled - missing API key',
+                'message': 'SMS service is not configured. Please set IPROG_SMS_API_KEY in environment variables.'
+            }
+
+        import httpx
+
+        payload = {
+            'api_token': self.api_key,
+            'phone_number': self._format_phone(phone),
+            'message': message
+        }
+
+        try:
+            response = await async_client().post(
+                f"{self.base_url}/api/v1/sms_messages",
+                headers={'Content-Type': 'application/json'},
+                json=payload,
+                timeout=30,
+            )
+            response.raise_for_status()
+            try:
+                return self._api_result(response.json())
+            except json.JSONDecodeError:
+                return {
+                    'success': False,
+                    'error': 'Invalid JSON response',
+                    'message': 'Failed to send SMS: Invalid response from server'
+                }
+        except httpx.HTTPError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'message': f'Failed to send SMS: {str(e)}'
+            }
+
+    def _api_result(self, response_data):
+        """Result dict from the JSON body of a 200 response"""
+        # Check if the API response indicates success
+        if response_data.get('status') == 200:
+            return {
+                'success': True,
+                'data': response_data,
+                'message': response_data.get('message', 'SMS sent successfully')
+            }
+        return {
+            'success': False,
+            'error': f"API Error: {response_data.get('message', 'Unknown error')}",
+            'message': f"Failed to send SMS: {response_data.get('message', 'Unknown error')}"
+        }
+
     def _format_phone(self, phone):
         """
         Format phone number for IPROG SMS API
@@ -178,6 +230,8 @@ class IPROGSMSService:
             print("API Test - SMS service is disabled (missing API key)")
             return False
             
+        import requests
+
         try:
             # Test with a dummy phone number to check API connectivity
             test_payload = {
@@ -202,13 +256,32 @@ class IPROGSMSService:
             print(f"API Test - Error: {str(e)}")
             return False
 
-# Global SMS service instance
-try:
-    sms_service = IPROGSMSService()
-except Exception:
-    # Create a disabled instance if initialization fails
-    sms_service = IPROGSMSService.__new__(IPROGSMSService)
-    sms_service.disabled = True
-    sms_service.api_key = None
-    sms_service.sender_id = 'BEAUTY'
-    sms_service.base_url = "https://sms.iprogtech.com"
+def _create_sms_service():
+    try:
+        return IPROGSMSService()
+    except Exception:
+        # Create a disabled instance if initialization fails
+        service = IPROGSMSService.__new__(IPROGSMSService)
+        service.disabled = True
+        service.api_key = None
+        service.sender_id = 'BEAUTY'
+        service.base_url = "https://sms.iprogtech.com"
+        return service
+
+
+_sms_service = None
+
+
+def get_sms_service():
+    """Global SMS service instance, created on first use"""
+    global _sms_service
+    if _sms_service is None:
+        _sms_service = _create_sms_service()
+    return _sms_service
+
+
+def __getattr__(name):
+    # `from services.sms_service import sms_service` still works
+    if name == 'sms_service':
+        return get_sms_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
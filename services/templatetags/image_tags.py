@@ -0,0 +1,39 @@
+from django import template
+from django.utils.html import format_html
+
+from services.image_derivatives import FORMATS, derivative_name, get_derivatives, srcset
+
+register = template.Library()
+
+DEFAULT_SIZES = '(max-width: 576px) 100vw, (max-width: 992px) 50vw, 33vw'
+
+
+@register.simple_tag
+def responsive_image(image, alt='', css_class='', style='', sizes=DEFAULT_SIZES):
+    """
+    Render a <picture> with WebP and JPEG srcsets for an ImageField value.
+
+    Usage: {% responsive_image service.image alt=service.service_name css_class="card-img-top" %}
+    Falls back to a plain <img> of the original when derivatives are unavailable.
+    """
+    if not image:
+        return ''
+    entry = get_derivatives(image)
+    if not entry:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="lazy">',
+            image.url, css_class, alt, style,
+        )
+
+    storage = image.storage
+    sources = {ext: srcset(entry, ext, storage) for ext, _, _ in FORMATS}
+    widths = entry['widths']
+    # Middle width as the plain src for browsers without srcset support
+    fallback = storage.url(derivative_name(entry['hash'], widths[len(widths) // 2], 'jpg'))
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" style="{}" loading="lazy">'
+        '</picture>',
+        sources['webp'], sizes, fallback, sources['jpg'], sizes, css_class, alt, style,
+    )
@@ -1,3 +1,181 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import httpx
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from PIL import Image
+
+from .catalog_cache import bump_catalog_version, cache_catalog_page, catalog_version
+
+from .sms_service import IPROGSMSService
+from .image_derivatives import build_derivatives, derivative_name, srcset
+from .uploads import _scope_field, _target_name, file_sha256, upload_scope
+
+
+class ImageDerivativeTests(SimpleTestCase):
+    """Pillow derivative pipeline against a throwaway storage"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = FileSystemStorage(location=self.tmp.name, base_url='/media/')
+
+    def save_image(self, name, size=(800, 600), mode='RGBA'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 120, 80, 255) if mode == 'RGBA' else (200, 120, 80)).save(buffer, 'PNG')
+        return self.storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_builds_webp_and_jpeg_without_upscaling(self):
+        name = self.save_image('services/a.png')
+        content_hash, widths = build_derivatives(name, self.storage)
+        self.assertEqual(widths, [320, 640, 800])
+        for width in widths:
+            for ext in ('webp', 'jpg'):
+                with self.storage.open(derivative_name(content_hash, width, ext), 'rb') as f, Image.open(f) as img:
+                    self.assertEqual(img.width, width)
+
+    def test_identical_uploads_share_derivatives(self):
+        first = self.save_image('services/a.png')
+        second = self.save_image('products/b.png')
+        self.assertEqual(build_derivatives(first, self.storage)[0], build_derivatives(second, self.storage)[0])
+
+    def test_srcset_lists_every_width(self):
+        entry = {'hash': 'ab' * 32, 'widths': [320, 640]}
+        value = srcset(entry, 'webp', self.storage)
+        self.assertEqual(value, f"/media/derivatives/ab/{'ab' * 32}/320.webp 320w, /media/derivatives/ab/{'ab' * 32}/640.webp 640w")
+
+
+class HashingUploadHandlerTests(SimpleTestCase):
+    """Uploads carry their SHA-256 from the streaming upload handlers"""
+
+    def upload(self, data):
+        request = RequestFactory().post('/', {'file': SimpleUploadedFile('doc.pdf', data)})
+        return request.FILES['file']
+
+    def test_small_upload_is_hashed_in_memory(self):
+        data = b'%PDF-1.4 small'
+        self.assertEqual(self.upload(data).sha256, hashlib.sha256(data).hexdigest())
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_large_upload_is_hashed_on_disk(self):
+        data = b'x' * 300_000
+        uploaded = self.upload(data)
+        self.assertTrue(hasattr(uploaded, 'temporary_file_path'))
+        self.assertEqual(uploaded.sha256, hashlib.sha256(data).hexdigest())
+
+    def test_fallback_hash_without_handlers(self):
+        data = b'abc' * 1000
+        self.assertEqual(file_sha256(SimpleUploadedFile('a.bin', data)), hashlib.sha256(data).hexdigest())
+
+
+
+class UploadScopeTests(SimpleTestCase):
+    """Medical documents are only deduplicated within one patient"""
+
+    def document(self, patient_id):
+        from accounts.models import MedicalHistory
+
+        return MedicalHistory(patient_id=patient_id)
+
+    def test_medical_documents_are_scoped_per_patient(self):
+        from accounts.models import MedicalHistory
+
+        self.assertEqual(upload_scope(MedicalHistory, 'file', self.document(7)), 'accounts.medicalhistory.file/7')
+        self.assertNotEqual(upload_scope(MedicalHistory, 'file', self.document(8)),
+                            upload_scope(MedicalHistory, 'file', self.document(7)))
+        self.assertEqual(_scope_field('accounts.medicalhistory.file/7'),
+                         (MedicalHistory, MedicalHistory._meta.get_field('file')))
+
+    def test_other_fields_are_scoped_per_field(self):
+        from .models import ServiceImage
+
+        self.assertEqual(upload_scope(ServiceImage, 'image', ServiceImage()), 'services.serviceimage.image')
+
+    def test_patients_never_get_the_same_file_name(self):
+        from accounts.models import MedicalHistory
+
+        field = MedicalHistory._meta.get_field('file')
+        upload = SimpleUploadedFile('results.pdf', b'%PDF')
+        names = {
+            _target_name(doc, field, upload_scope(MedicalHistory, 'file', doc), upload, 'ab' * 32)
+            for doc in (self.document(7), self.document(8))
+        }
+        self.assertEqual(len(names), 2)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CatalogCacheTests(SimpleTestCase):
+    """Versioned page cache for anonymous catalog traffic"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+        @cache_catalog_page
+        def view(request):
+            self.calls += 1
+            response = HttpResponse(f'render {self.calls}')
+            if request.GET.get('cookie'):
+                response.set_cookie('x', '1')
+            return response
+        self.view = view
+
+    def get(self, query='', user=None):
+        request = RequestFactory().get('/services/' + query)
+        request.user = user or AnonymousUser()
+        return self.view(request)
+
+    def test_anonymous_hits_are_served_from_cache_until_the_catalog_changes(self):
+        self.assertEqual(self.get('?page=2&category=1').content, b'render 1')
+        self.assertEqual(self.get('?category=1&page=2').content, b'render 1')
+        version = catalog_version()
+        bump_catalog_version()
+        self.assertEqual(catalog_version(), version + 1)
+        self.assertEqual(self.get('?page=2&category=1').content, b'render 2')
+
+    def test_logged_in_users_and_cookie_setting_responses_bypass_the_cache(self):
+        from types import SimpleNamespace
+        user = SimpleNamespace(is_authenticated=True)
+        self.get(user=user)
+        self.get(user=user)
+        self.get('?cookie=1')
+        self.get('?cookie=1')
+        self.assertEqual(self.calls, 4)
+
+
+@override_settings(IPROG_SMS_API_KEY='test-key')
+class AsyncSMSTests(SimpleTestCase):
+    """asend_sms awaits the SMS API and returns send_sms's result dict"""
+
+    def send(self, handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with mock.patch('services.sms_service.async_client', return_value=client):
+            return asyncio.run(IPROGSMSService().asend_sms('09123456789', 'Hello'))
+
+    def test_successful_send(self):
+        sent = []
+
+        def handler(request):
+            sent.append(request)
+            return httpx.Response(200, json={'status': 200, 'message': 'queued'})
+
+        result = self.send(handler)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['message'], 'queued')
+        self.assertIn(b'"phone_number":"639123456789"', sent[0].content.replace(b' ', b''))
+
+    def test_api_and_http_errors(self):
+        result = self.send(lambda request: httpx.Response(200, json={'status': 500, 'message': 'No credits'}))
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], 'API Error: No credits')
+        result = self.send(lambda request: httpx.Response(502))
+        self.assertFalse(result['success'])
@@ -0,0 +1,293 @@
+"""
+Deduplicated uploads with optional background transfer to remote storage.
+
+Upload handlers hash files while Django streams them in (file.sha256), so
+store_upload() can look the content up in the UploadedBlob table and reuse the
+existing stored file instead of writing it again. Deduplication is scoped per
+model field, so e.g. medical documents are never shared with product photos,
+and fields listed in PARTITIONED_FIELDS are further scoped per owner: reusing
+another patient's stored document would hand out their file name (which holds
+the original file name) and reveal that they uploaded the same file.
+
+When background transfer is on (by default only for non-filesystem storages
+such as Cloudinary) the upload is copied to a local spool directory, the row
+is saved straight away with its final name, and a worker thread pushes the
+file to storage after the transaction commits. Transfers still pending after
+a restart are picked up by `manage.py process_pending_uploads`.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HASH_READ_SIZE = 1024 * 1024
+
+# field scope -> attribute of the instance that owns the file
+PARTITIONED_FIELDS = {
+    'accounts.medicalhistory.file': 'patient_id',
+}
+
+# Sent once a file is available in storage (immediately for synchronous
+# writes, from the worker thread for background transfers).
+# Arguments: name, scope
+upload_stored = Signal()
+
+
+class HashingUploadMixin:
+    """Compute the SHA-256 of an upload as its chunks arrive"""
+
+    def new_file(self, *args, **kwargs):
+        # Set up first: the memory handler raises StopFutureHandlers from new_file
+        self._sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # The memory handler passes large files on to the next handler
+        if getattr(self, 'activated', True):
+            self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self._sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_sha256(uploaded_file):
+    """Hash computed by the upload handlers, or hash the file now"""
+    digest = getattr(uploaded_file, 'sha256', None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in uploaded_file.chunks(HASH_READ_SIZE):
+        sha.update(chunk)
+    uploaded_file.seek(0)
+    return sha.hexdigest()
+
+
+def upload_scope(model, field_name, instance=None):
+    """Dedup scope: app_label.model.field, plus /<owner> for PARTITIONED_FIELDS"""
+    scope = f'{model._meta.label_lower}.{field_name}'
+    owner_attr = PARTITIONED_FIELDS.get(scope)
+    if owner_attr and instance is not None:
+        scope = f'{scope}/{getattr(instance, owner_attr)}'
+    return scope
+
+
+def _scope_field(scope):
+    from django.apps import apps
+
+    label, field_name = scope.split('/', 1)[0].rsplit('.', 1)
+    model = apps.get_model(label)
+    return model, model._meta.get_field(field_name)
+
+
+def background_transfer_enabled(storage):
+    mode = str(getattr(settings, 'UPLOAD_BACKGROUND_TRANSFER', 'auto')).lower()
+    if mode in ('1', 'true', 'yes', 'on'):
+        return True
+    if mode in ('0', 'false', 'no', 'off'):
+        return False
+    return not isinstance(storage, FileSystemStorage)
+
+
+def spool_dir():
+    return getattr(settings, 'UPLOAD_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'upload_spool'))
+
+
+def _target_name(instance, field, scope, uploaded_file, content_hash):
+    """upload_to directory + short hash + original (sanitised) file name"""
+    generated = field.generate_filename(instance, os.path.basename(uploaded_file.name))
+    directory, basename = os.path.split(generated)
+    if '/' in scope:
+        # Partitioned: owners uploading the same file must not get the same name
+        content_hash = hashlib.sha256(f'{scope}:{content_hash}'.encode()).hexdigest()
+    return '/'.join(part for part in (directory, content_hash[:12], basename) if part)
+
+
+def store_upload(instance, field_name, uploaded_file):
+    """
+    Store an uploaded file for instance.<field_name> and return its storage name.
+
+    Assign the result to the field (or pass it to objects.create()) instead of
+    the UploadedFile itself. Identical content already stored for the same
+    field (and owner, for PARTITIONED_FIELDS) is reused without writing anything.
+    """
+    from .models import UploadedBlob
+
+    field = instance._meta.get_field(field_name)
+    storage = field.storage
+    scope = upload_scope(type(instance), field_name, instance)
+    content_hash = file_sha256(uploaded_file)
+
+    existing = UploadedBlob.objects.filter(scope=scope, content_hash=content_hash).exclude(
+        status=UploadedBlob.STATUS_FAILED
+    ).first()
+    if existing:
+        return existing.name
+
+    name = _target_name(instance, field, scope, uploaded_file, content_hash)
+    background = background_transfer_enabled(storage)
+    spool_path = ''
+    if background:
+        spool_path = os.path.join(spool_dir(), scope, content_hash)
+        os.makedirs(os.path.dirname(spool_path), exist_ok=True)
+        uploaded_file.seek(0)
+        with open(spool_path, 'wb') as spool:
+            shutil.copyfileobj(uploaded_file, spool, HASH_READ_SIZE)
+    else:
+        name = storage.save(name, uploaded_file)
+
+    try:
+        with transaction.atomic():
+            blob, created = UploadedBlob.objects.update_or_create(
+                scope=scope,
+                content_hash=content_hash,
+                defaults={
+                    'name': name,
+                    'size': uploaded_file.size,
+                    'status': UploadedBlob.STATUS_PENDING if background else UploadedBlob.STATUS_STORED,
+                    'spool_path': spool_path,
+                    'stored_at': None if background else timezone.now(),
+                },
+            )
+    except IntegrityError:
+        # A concurrent request stored the same content first
+        blob = UploadedBlob.objects.get(scope=scope, content_hash=content_hash)
+        if not background and blob.name != name:
+            storage.delete(name)
+        return blob.name
+
+    if background:
+        blob_id = blob.pk
+        transaction.on_commit(lambda: enqueue_transfer(blob_id))
+    else:
+        upload_stored.send(sender=UploadedBlob, name=name, scope=scope)
+    return name
+
+
+def is_pending(name):
+    """True while a file is still waiting in the spool for its transfer"""
+    from .models import UploadedBlob
+
+    return UploadedBlob.objects.filter(name=name, status=UploadedBlob.STATUS_PENDING).exists()
+
+
+def pending_spool_path(field_file):
+    """Local spool copy of a file whose transfer is still pending, else ''"""
+    from .models import UploadedBlob
+
+    if not field_file:
+        return ''
+    scope = upload_scope(type(field_file.instance), field_file.field.name, field_file.instance)
+    blob = UploadedBlob.objects.filter(
+        scope=scope, name=field_file.name, status=UploadedBlob.STATUS_PENDING,
+    ).only('spool_path').first()
+    return blob.spool_path if blob else ''
+
+
+def release_upload(field_file):
+    """Delete a stored file unless another row still references it"""
+    from .models import UploadedBlob
+
+    if not field_file:
+        return
+    name = field_file.name
+    model, field_name = type(field_file.instance), field_file.field.name
+    others = model._default_manager.filter(**{field_name: name})
+    if field_file.instance.pk is not None:
+        others = others.exclude(pk=field_file.instance.pk)
+    if others.exists():
+        return
+    scope = upload_scope(model, field_name, field_file.instance)
+    UploadedBlob.objects.filter(scope=scope, name=name).delete()
+    field_file.delete(save=False)
+
+
+def transfer_blob(blob_id):
+    """Push a spooled upload to its storage. Returns True once stored"""
+    from .models import UploadedBlob
+
+    blob = UploadedBlob.objects.filter(pk=blob_id, status=UploadedBlob.STATUS_PENDING).first()
+    if blob is None:
+        return False
+    model, field = _scope_field(blob.scope)
+    storage = field.storage
+    spool_path = blob.spool_path
+
+    try:
+        with open(spool_path, 'rb') as f:
+            stored_name = storage.save(blob.name, File(f, name=os.path.basename(blob.name)))
+    except Exception as e:
+        logger.exception('Transfer of %s failed', blob.name)
+        blob.attempts += 1
+        if blob.attempts >= getattr(settings, 'UPLOAD_TRANSFER_MAX_ATTEMPTS', 5):
+            blob.status = UploadedBlob.STATUS_FAILED
+        blob.error = str(e)[:500]
+        blob.save(update_fields=['attempts', 'status', 'error'])
+        return False
+
+    with transaction.atomic():
+        if stored_name != blob.name:
+            # The storage picked a different name: repoint the rows using it
+            model._default_manager.filter(**{field.name: blob.name}).update(**{field.name: stored_name})
+            blob.name = stored_name
+        blob.status = UploadedBlob.STATUS_STORED
+        blob.stored_at = timezone.now()
+        blob.spool_path = ''
+        blob.error = ''
+        blob.save(update_fields=['name', 'status', 'stored_at', 'spool_path', 'error'])
+
+    try:
+        os.remove(spool_path)
+    except OSError:
+        pass
+    upload_stored.send(sender=UploadedBlob, name=stored_name, scope=blob.scope)
+    return True
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run_transfer(blob_id):
+    close_old_connections()
+    try:
+        transfer_blob(blob_id)
+    finally:
+        # Pool threads are long-lived; don't keep a connection open per thread
+        connection.close()
+
+
+def enqueue_transfer(blob_id):
+    """Queue a transfer on the shared worker threads"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'UPLOAD_TRANSFER_WORKERS', 2),
+                thread_name_prefix='upload-transfer',
+            )
+    return _executor.submit(_run_transfer, blob_id)
@@ -1,5 +1,5 @@
 from django.conf import settings
-from .sms_service import sms_service
+from .sms_service import get_sms_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,7 +26,7 @@ def send_sms_notification(phone, message, sender_id=None, user=None):
     
     try:
         sender = sender_id or getattr(settings, 'SMS_SENDER_ID', 'BEAUTY')
-        result = sms_service.send_sms(phone, message, sender)
+        result = get_sms_service().send_sms(phone, message, sender)
         
         # Save to SMS history if user is provided
         if user:
@@ -67,6 +67,61 @@ def send_sms_notification(phone, message, sender_id=None, user=None):
             'message': 'Failed to send SMS notification'
         }
 
+async def asend_sms_notification(phone, message, sender_id=None, user=None):
+    """
+    Async send_sms_notification for async views: the API call awaits the
+    shared httpx client and SMS history is written with the async ORM.
+
+    Takes the same arguments and returns the same dict as send_sms_notification.
+    """
+    if not getattr(settings, 'SMS_ENABLED', True):
+        logger.info("SMS notifications are disabled")
+        return {
+            'success': False,
+            'message': 'SMS notifications are disabled'
+        }
+
+    from appointments.models import SMSHistory
+
+    try:
+        sender = sender_id or getattr(settings, 'SMS_SENDER_ID', 'BEAUTY')
+        result = await get_sms_service().asend_sms(phone, message, sender)
+
+        if user:
+            await SMSHistory.objects.acreate(
+                sender=user,
+                phone_number=phone,
+                message=message,
+                status='sent' if result['success'] else 'failed',
+                message_id=result.get('message_id'),
+                api_response=result
+            )
+
+        if result['success']:
+            logger.info(f"SMS sent successfully to {phone}")
+        else:
+            logger.error(f"Failed to send SMS to {phone}: {result.get('error', 'Unknown error')}")
+
+        return result
+
+    except Exception as e:
+        logger.error(f"Error sending SMS to {phone}: {str(e)}")
+
+        if user:
+            await SMSHistory.objects.acreate(
+                sender=user,
+                phone_number=phone,
+                message=message,
+                status='failed',
+                api_response={'error': str(e)}
+            )
+
+        return {
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to send SMS notification'
+        }
+
 def send_appointment_sms(appointment, sms_type='confirmation', **kwargs):
     """
     Send appointment-related SMS notifications
@@ -86,13 +141,13 @@ def send_appointment_sms(appointment, sms_type='confirmation', **kwargs):
     
     try:
         if sms_type == 'confirmation':
-            result = sms_service.send_appointment_confirmation(appointment)
+            result = get_sms_service().send_appointment_confirmation(appointment)
         elif sms_type == 'reminder':
-            result = sms_service.send_appointment_reminder(appointment)
+            result = get_sms_service().send_appointment_reminder(appointment)
         elif sms_type == 'cancellation':
-            result = sms_service.send_cancellation_notification(appointment)
+            result = get_sms_service().send_cancellation_notification(appointment)
         elif sms_type in ['reassignment', 'attendant_reassignment']:
-            result = sms_service.send_attendant_reassignment(
+            result = get_sms_service().send_attendant_reassignment(
                 appointment,
                 previous_attendant=kwargs.get('previous_attendant')
             )
@@ -129,7 +184,7 @@ def send_package_sms(package_booking):
         }
     
     try:
-        result = sms_service.send_package_confirmation(package_booking)
+        result = get_sms_service().send_package_confirmation(package_booking)
         return result
         
     except Exception as e:
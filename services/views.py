@@ -4,8 +4,10 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from .models import Service, ServiceCategory
 from .forms import ServiceForm
+from .catalog_cache import cache_catalog_page, catalog_version
 
 
+@cache_catalog_page
 def services_list(request):
     """List all services with optional category filtering"""
     category_id = request.GET.get('category')
@@ -31,11 +33,13 @@ def services_list(request):
         'page_obj': page_obj,
         'categories': categories,
         'selected_category': category,
+        'catalog_version': catalog_version(),
     }
     
     return render(request, 'services/services_list.html', context)
 
 
+@cache_catalog_page
 def service_detail(request, service_id):
     """Service detail view"""
     service = get_object_or_404(Service, id=service_id)
@@ -0,0 +1,26 @@
+#!/usr/bin/env bash
+# Start the web server
+#
+# SERVER_MODE=asgi (default): uvicorn worker processes serving
+#   beauty_clinic_django.asgi. The async views (notifications API, password
+#   reset, SMS test-send) await outbound HTTP on the event loop, so a few
+#   workers serve many concurrent slow requests.
+# SERVER_MODE=wsgi: gunicorn sync workers.
+#
+# WEB_CONCURRENCY sets the number of worker processes, PORT the listen port.
+set -o errexit
+
+export SERVER_MODE="${SERVER_MODE:-asgi}"
+
+if [ "$SERVER_MODE" = "wsgi" ]; then
+    exec gunicorn beauty_clinic_django.wsgi:application
+fi
+
+# Django has no lifespan events; Render terminates TLS in front of the app
+exec uvicorn beauty_clinic_django.asgi:application \
+    --host 0.0.0.0 \
+    --port "${PORT:-8000}" \
+    --workers "${WEB_CONCURRENCY:-2}" \
+    --lifespan off \
+    --proxy-headers \
+    --forwarded-allow-ips '*'
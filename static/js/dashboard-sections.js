@@ -0,0 +1,113 @@
+// Dashboard sections: fill every [data-section-url] placeholder from its JSON
+// endpoint (analytics/sections.py). All sections are requested at once; the
+// browser revalidates each with its ETag, so unchanged ones come back as 304.
+(function() {
+    const SEGMENT_COLORS = ['#28a745', '#17a2b8', '#ffc107', '#dc3545', '#667eea', '#6c757d'];
+    const requests = {};
+
+    function titleCase(value) {
+        return String(value || 'unclassified').replace(/_/g, ' ').replace(/\b\w/g, c => c.toUpperCase());
+    }
+
+    const charts = {
+        'revenue-trend': function(canvas, data) {
+            const months = data.monthly_revenue || [];
+            return new Chart(canvas, {
+                type: 'line',
+                data: {
+                    labels: months.map(m => m.month),
+                    datasets: [{
+                        label: 'Appointments',
+                        data: months.map(m => m.appointments),
+                        borderColor: '#667eea',
+                        backgroundColor: 'rgba(102, 126, 234, 0.1)',
+                        borderWidth: 3,
+                        fill: true,
+                        tension: 0.4,
+                        yAxisID: 'y'
+                    }, {
+                        label: 'Revenue (₱)',
+                        data: months.map(m => m.revenue),
+                        borderColor: '#28a745',
+                        borderWidth: 2,
+                        fill: false,
+                        tension: 0.4,
+                        yAxisID: 'revenue'
+                    }]
+                },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    plugins: { legend: { display: true, position: 'top' } },
+                    scales: {
+                        y: { beginAtZero: true },
+                        revenue: { beginAtZero: true, position: 'right', grid: { drawOnChartArea: false } }
+                    }
+                }
+            });
+        },
+        'segments': function(canvas, data) {
+            const segments = data.segments || [];
+            return new Chart(canvas, {
+                type: 'doughnut',
+                data: {
+                    labels: segments.map(s => titleCase(s.segment)),
+                    datasets: [{
+                        data: segments.map(s => s.count),
+                        backgroundColor: SEGMENT_COLORS,
+                        borderColor: 'white',
+                        borderWidth: 2
+                    }]
+                },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    plugins: { legend: { position: 'bottom' } }
+                }
+            });
+        }
+    };
+
+    function fetchSection(url) {
+        // Placeholders sharing a section share one request
+        if (!requests[url]) {
+            requests[url] = fetch(url, {
+                credentials: 'same-origin',
+                headers: { 'Accept': 'application/json' }
+            }).then(function(response) {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.json();
+            });
+        }
+        return requests[url];
+    }
+
+    function drawCharts(element, data) {
+        if (typeof Chart === 'undefined') {
+            return;
+        }
+        element.querySelectorAll('canvas[data-chart]').forEach(function(canvas) {
+            const draw = charts[canvas.dataset.chart];
+            if (draw) {
+                draw(canvas, data);
+            }
+        });
+    }
+
+    function loadSection(element) {
+        return fetchSection(element.dataset.sectionUrl).then(function(payload) {
+            element.innerHTML = payload.html;
+            drawCharts(element, payload.data);
+            element.dispatchEvent(new CustomEvent('section:loaded', { bubbles: true, detail: payload }));
+        }).catch(function(error) {
+            console.error('Dashboard section failed to load', element.dataset.sectionUrl, error);
+            element.innerHTML = '<p class="text-muted" style="font-size: 0.85rem;">This section could not be loaded. Refresh to try again.</p>';
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('[data-section-url]').forEach(loadSection);
+    });
+})();
@@ -0,0 +1,107 @@
+"""
+Benchmark cases: hot views through the Django test client and direct service calls.
+
+Each setup function receives the shared context built by run.py and returns
+func(iteration) which is what gets timed.
+"""
+from datetime import timedelta
+
+from django.test import Client
+from django.urls import reverse
+
+from harness import Case
+
+
+def _client(user=None):
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+def _get(client, url, expected=200):
+    def run(iteration):
+        response = client.get(url)
+        if response.status_code != expected:
+            raise AssertionError(f'GET {url} returned {response.status_code}')
+    return run
+
+
+def services_list(ctx):
+    return _get(_client(), reverse('services:list'))
+
+
+def booking_page(ctx):
+    return _get(_client(ctx['patient']), reverse('appointments:book_service', args=[ctx['service_id']]))
+
+
+def booking_submit(ctx):
+    client = _client(ctx['patient'])
+    url = reverse('appointments:book_service', args=[ctx['service_id']])
+
+    def run(iteration):
+        # A fresh slot per iteration (8 hourly slots, Monday to Saturday) so
+        # every run takes the success path
+        slot_day = iteration // 8
+        day = ctx['first_booking_day'] + timedelta(weeks=slot_day // 6, days=slot_day % 6)
+        response = client.post(url, {
+            'appointment_date': day.isoformat(),
+            'appointment_time': f'{10 + iteration % 8:02d}:00',
+            'attendant': ctx['attendant_id'],
+        })
+        if response.status_code not in (200, 302):
+            raise AssertionError(f'POST {url} returned {response.status_code}')
+    return run
+
+
+def owner_dashboard(ctx):
+    return _get(_client(ctx['owner']), reverse('owner:dashboard'))
+
+
+def admin_patients(ctx):
+    return _get(_client(ctx['admin']), reverse('appointments:admin_patients'))
+
+
+def notifications_api(ctx):
+    return _get(_client(ctx['patient']), reverse('appointments:get_notifications_api'))
+
+
+def notifications_mark_read(ctx):
+    client = _client(ctx['patient'])
+    url = reverse('appointments:update_notifications_api')
+    ids = ctx['notification_ids']
+
+    def run(iteration):
+        client.post(url, {'action': 'mark_read', 'notification_id': ids[iteration % len(ids)]})
+    return run
+
+
+def analytics(method_name):
+    def setup(ctx):
+        from analytics.services import AnalyticsService
+
+        def run(iteration):
+            getattr(AnalyticsService(), method_name)()
+        return run
+    return setup
+
+
+CASES = [
+    Case('services_list', services_list, 'Public services catalog page'),
+    Case('booking_page', booking_page, 'Patient opens the service booking form'),
+    Case('booking_submit', booking_submit, 'Patient books a service'),
+    Case('owner_dashboard', owner_dashboard, 'Owner dashboard with all analytics widgets'),
+    Case('admin_patients', admin_patients, 'Staff patient list'),
+    Case('notifications_api', notifications_api, 'Notification dropdown JSON API'),
+    Case('notifications_mark_read', notifications_mark_read, 'Mark a notification as read'),
+] + [
+    Case(f'analytics.{name}', analytics(name), f'AnalyticsService.{name}()')
+    for name in (
+        'get_business_overview',
+        'get_revenue_analytics',
+        'get_patient_analytics',
+        'get_service_analytics',
+        'get_treatment_correlations',
+        'get_business_insights',
+    )
+]
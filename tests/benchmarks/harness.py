@@ -0,0 +1,139 @@
+"""
+Measurement, result files and baseline comparison for the benchmark suite.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from django.db import connection
+
+RESULT_VERSION = 1
+
+# Metrics compared against the baseline, with how they are aggregated
+COMPARED_METRICS = ('wall_ms', 'queries', 'peak_kb')
+
+
+class Case:
+    """A named benchmark: setup(ctx) returns the callable that is timed"""
+
+    def __init__(self, name, setup, description=''):
+        self.name = name
+        self.setup = setup
+        self.description = description
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries; unlike connection.queries it has no length cap"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(func, repeat=5, warmup=1):
+    """
+    Time func() `repeat` times after `warmup` calls.
+
+    Returns the median wall time, the query count of the last run and the
+    peak memory allocated by Python during one extra traced run (tracing
+    slows code down, so it is kept out of the timed runs).
+    """
+    for i in range(warmup):
+        func(i)
+
+    timings = []
+    queries = 0
+    for i in range(repeat):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            func(warmup + i)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = counter.count
+
+    tracemalloc.start()
+    try:
+        func(warmup + repeat)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(timings), 2),
+        'wall_ms_min': round(min(timings), 2),
+        'wall_ms_max': round(max(timings), 2),
+        'queries': queries,
+        'peak_kb': round(peak / 1024, 1),
+        'runs': repeat,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def build_result(cases, dataset):
+    return {
+        'version': RESULT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'dataset': dataset,
+        'cases': cases,
+    }
+
+
+def save_result(result, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, indent=2) + '\n')
+
+
+def load_result(path):
+    return json.loads(Path(path).read_text())
+
+
+def compare(result, baseline, threshold=0.2, query_threshold=0.0):
+    """
+    Compare a result with a baseline.
+
+    Returns (rows, regressions). A case regresses when its median wall time or
+    peak memory grows by more than `threshold` (fraction), or its query count
+    grows by more than `query_threshold`. Results against a different dataset
+    are not comparable and raise ValueError.
+    """
+    if baseline.get('dataset') != result.get('dataset'):
+        raise ValueError(f"Baseline dataset {baseline.get('dataset')} differs from {result.get('dataset')}")
+
+    rows, regressions = [], []
+    for name, current in result['cases'].items():
+        previous = baseline['cases'].get(name)
+        if previous is None:
+            rows.append((name, None, current, []))
+            continue
+        worse = []
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            limit = query_threshold if metric == 'queries' else threshold
+            if (new - old) / old > limit:
+                worse.append(f'{metric} {old} -> {new} (+{(new - old) / old:.0%})')
+        rows.append((name, previous, current, worse))
+        if worse:
+            regressions.append((name, worse))
+    return rows, regressions
@@ -0,0 +1,205 @@
+"""
+Benchmark suite for hot views and services.
+
+Seeds a fixed synthetic dataset (accounts/synthetic_data.py) into a dedicated
+database, runs every case in cases.py, and records median wall time, query
+count and peak Python memory per case as JSON. With a baseline it fails
+(exit code 1) when a case regresses beyond the threshold.
+
+    python tests/benchmarks/run.py                      # run, write results/latest.json
+    python tests/benchmarks/run.py --save-baseline      # also store as baseline.json
+    python tests/benchmarks/run.py --threshold 0.15 -k analytics
+
+The dataset lives in tests/benchmarks/bench.sqlite3 by default and is seeded
+on first use; results/datasets.json remembers which parameters each database
+was seeded with. Pass --database-url to benchmark against PostgreSQL instead. Each case runs inside a transaction that is rolled back,
+so bookings made by one case never leak into the next.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parents[1]
+
+DATASET = {
+    'patients': 1000,
+    'appointments': 10000,
+    'years': 2,
+    'attendants': 6,
+    'seed': 20240101,
+    'end_date': '2025-06-30',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help='Database to benchmark (default: tests/benchmarks/bench.sqlite3)')
+    parser.add_argument('--patients', type=int, default=DATASET['patients'])
+    parser.add_argument('--appointments', type=int, default=DATASET['appointments'])
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (default: 5)')
+    parser.add_argument('-k', dest='pattern', default='', help='Only run cases whose name contains this text')
+    parser.add_argument('--output', default=str(HERE / 'results' / 'latest.json'))
+    parser.add_argument('--baseline', default=str(HERE / 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative growth of wall time / peak memory (default: 0.2 = 20%%)')
+    parser.add_argument('--query-threshold', type=float, default=0.0,
+                        help='Allowed relative growth of the query count (default: 0)')
+    return parser.parse_args()
+
+
+def setup_django(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'beauty_clinic_django.settings')
+    # Keep per-request log lines and outgoing SMS/email out of the measurements
+    os.environ['QUERY_INSTRUMENTATION'] = 'False'
+    os.environ['SMS_ENABLED'] = 'False'
+    os.environ['EMAIL_BACKEND'] = 'django.core.mail.backends.locmem.EmailBackend'
+    sys.path.insert(0, str(ROOT))
+    import django
+    django.setup()
+
+
+def ensure_dataset(dataset, database_url):
+    """Create the schema and synthetic data unless the database already has this dataset"""
+    from django.apps import apps
+    from django.db import connection
+
+    from accounts.models import User
+    from accounts.synthetic_data import generate_dataset
+
+    # Which dataset each benchmark database holds
+    registry_path = HERE / 'results' / 'datasets.json'
+    registry = json.loads(registry_path.read_text()) if registry_path.exists() else {}
+    if User._meta.db_table in connection.introspection.table_names():
+        if registry.get(database_url) == dataset:
+            return False
+        raise SystemExit(f'{database_url} holds a different dataset; delete it or pass another --database-url')
+
+    # Schema straight from the models: benchmarks measure the current code,
+    # independent of migration history
+    with connection.schema_editor() as editor:
+        for model in apps.get_models():
+            if model._meta.managed and not model._meta.proxy:
+                editor.create_model(model)
+
+    print(f'Seeding benchmark dataset {dataset} ...')
+    generate_dataset(
+        patients=dataset['patients'],
+        appointments=dataset['appointments'],
+        years=dataset['years'],
+        attendants=dataset['attendants'],
+        seed=dataset['seed'],
+        end_date=date.fromisoformat(dataset['end_date']),
+    )
+    User.objects.create_user('synthetic_owner', 'owner@synthetic.example', 'synthetic123', user_type='owner')
+    User.objects.create_user('synthetic_admin', 'admin@synthetic.example', 'synthetic123', user_type='admin')
+
+    registry[database_url] = dataset
+    registry_path.parent.mkdir(parents=True, exist_ok=True)
+    registry_path.write_text(json.dumps(registry, indent=2) + '\n')
+    return True
+
+
+def build_context():
+    from accounts.models import Attendant, User
+    from accounts.synthetic_data import SYNTHETIC_PREFIX
+    from appointments.models import Notification
+    from services.models import Service
+
+    patient = User.objects.filter(user_type='patient', username__startswith=SYNTHETIC_PREFIX).order_by('id').first()
+    attendant_user = User.objects.filter(user_type='attendant', username__startswith=SYNTHETIC_PREFIX).order_by('id').first()
+    attendant = Attendant.objects.get(first_name=attendant_user.first_name, last_name=attendant_user.last_name)
+    # Book well after the dataset's future window, on a Monday
+    start = date.today() + timedelta(days=60)
+    return {
+        'patient': patient,
+        'owner': User.objects.get(username='synthetic_owner'),
+        'admin': User.objects.get(username='synthetic_admin'),
+        'service_id': Service.objects.filter(archived=False).order_by('id').values_list('id', flat=True).first(),
+        'attendant_id': attendant.id,
+        'first_booking_day': start + timedelta(days=(7 - start.weekday()) % 7),
+        'notification_ids': list(Notification.objects.filter(patient=patient).values_list('id', flat=True)[:50]) or [0],
+    }
+
+
+class _Rollback(Exception):
+    pass
+
+
+def run_cases(cases, ctx, repeat):
+    from django.db import transaction
+    from django.test.utils import override_settings
+
+    from harness import measure
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['*']):
+        for case in cases:
+            try:
+                with transaction.atomic():
+                    results[case.name] = measure(case.setup(ctx), repeat=repeat)
+                    raise _Rollback
+            except _Rollback:
+                pass
+            r = results[case.name]
+            print(f"  {case.name:<40} {r['wall_ms']:>9.1f} ms  {r['queries']:>6} queries  {r['peak_kb']:>9.1f} KB")
+    return results
+
+
+def main():
+    args = parse_args()
+    database_url = args.database_url or f"sqlite:///{HERE / 'bench.sqlite3'}"
+    setup_django(database_url)
+    sys.path.insert(0, str(HERE))
+
+    import harness
+    from cases import CASES
+
+    dataset = dict(DATASET, patients=args.patients, appointments=args.appointments)
+    ensure_dataset(dataset, database_url)
+    ctx = build_context()
+
+    selected = [case for case in CASES if args.pattern in case.name]
+    print(f'Running {len(selected)} case(s), {args.repeat} timed run(s) each')
+    result = harness.build_result(run_cases(selected, ctx, args.repeat), dataset)
+    harness.save_result(result, args.output)
+    print(f'Results written to {args.output}')
+
+    if args.save_baseline:
+        harness.save_result(result, args.baseline)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline to compare against (use --save-baseline).')
+        return 0
+
+    try:
+        rows, regressions = harness.compare(
+            result, harness.load_result(args.baseline), args.threshold, args.query_threshold,
+        )
+    except ValueError as e:
+        print(f'Cannot compare with baseline: {e}')
+        return 2
+    for name, previous, current, worse in rows:
+        if previous is None:
+            print(f'  {name:<40} new case')
+            continue
+        change = (current['wall_ms'] - previous['wall_ms']) / previous['wall_ms'] if previous['wall_ms'] else 0
+        print(f"  {name:<40} {previous['wall_ms']:>9.1f} -> {current['wall_ms']:>9.1f} ms ({change:+.0%})"
+              f"  {previous['queries']:>6} -> {current['queries']:>6} queries")
+    for name, worse in regressions:
+        print(f'REGRESSION {name}: ' + '; '.join(worse))
+    if regressions:
+        return 1
+    print(f'No regressions against {args.baseline} (threshold {args.threshold:.0%})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())